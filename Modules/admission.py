@@ -4,9 +4,19 @@ from datetime import datetime, date
 from database import db
 from auth import auth
 from utils import lang_manager, validate_email, validate_phone
-from config import ROLES
-import random
-import string
+from modules.id_allocator import id_allocator
+from modules.dedup import dedup_engine
+from modules.admission_queue import admission_queue, STATUSES, OPEN_STATUSES, PAGE_SIZE, APPLICATION_COLUMNS
+from modules.report_jobs import report_jobs
+from modules.reports import show_report_job
+
+# Report types and the background job that produces each
+ADMISSION_REPORTS = {
+    'admission_trends': 'admission_trends',
+    'class_wise_admissions': 'admission_class_wise',
+    'monthly_admissions': 'admission_monthly',
+    'gender_distribution': 'admission_gender'
+}
 
 class AdmissionModule:
     """Student admission module"""
@@ -38,32 +48,14 @@ class AdmissionModule:
             self.display_admission_reports()
     
     def generate_admission_number(self, year=None):
-        """Generate unique admission number"""
-        if year is None:
-            year = datetime.now().year
-        
-        # Try to generate unique number
-        for _ in range(10):
-            # Format: ADM-YYYY-XXXXX
-            random_part = ''.join(random.choices(string.digits, k=5))
-            admission_number = f"ADM-{year}-{random_part}"
-            
-            # Check if exists
-            check_query = "SELECT student_id FROM students WHERE admission_number = %s"
-            existing = db.execute_query(check_query, (admission_number,), fetch_one=True)
-            
-            if not existing:
-                return admission_number
-        
-        # Fallback with timestamp
-        timestamp = int(datetime.now().timestamp())
-        return f"ADM-{year}-{timestamp % 100000:05d}"
+        """Next admission number (ADM-YYYY-NNNNN) from the ID sequence"""
+        return id_allocator.next_id('ADM', year)
     
     def display_new_admission_form(self):
         """Display form for new student admission"""
         text = lang_manager.get_text
         
-        if not auth.has_permission(ROLES['ADMIN']):
+        if not auth.has_permission('manage_admissions'):
             st.warning(text('no_permission'))
             return
         
@@ -91,9 +83,8 @@ class AdmissionModule:
                 )
             
             with col2:
-                # Generate admission number
-                admission_number = self.generate_admission_number()
-                st.text_input(text('admission_number'), value=admission_number, disabled=True)
+                # The number is only allocated when the form is submitted
+                st.text_input(text('admission_number'), value=id_allocator.peek('ADM'), disabled=True)
                 
                 nationality = st.text_input(text('nationality'), value="", key="admission_nationality")
                 religion = st.text_input(text('religion'), value="", key="admission_religion")
@@ -164,14 +155,13 @@ class AdmissionModule:
             
             with col1:
                 # Get active classes
-                classes = db.execute_query("""
-                    SELECT class_id, class_name, grade_level 
+                classes = db.fetch_all("""
+                    SELECT id, class_name, grade_level 
                     FROM classes 
-                    WHERE is_active = TRUE 
                     ORDER BY grade_level, class_name
-                """, fetch_all=True)
+                """)
                 
-                class_options = {f"{c['class_name']} ({c['grade_level']})": c['class_id'] for c in classes}
+                class_options = {f"{c['class_name']} ({c['grade_level']})": c['id'] for c in classes}
                 admission_class = st.selectbox(
                     text('admission_class'),
                     options=list(class_options.keys()),
@@ -249,15 +239,16 @@ class AdmissionModule:
                 
                 # Prepare data
                 class_id = class_options[admission_class]
+                admission_number = self.generate_admission_number()
+                student_id = id_allocator.next_id('STU')
                 
                 # Insert student record
                 insert_query = """
                     INSERT INTO students (
-                        admission_number, first_name, last_name, date_of_birth,
+                        student_id, admission_number, full_name, date_of_birth,
                         gender, address, parent_name, parent_phone, parent_email,
-                        class_id, admission_date, is_active
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING student_id
+                        class_id, admission_date, status
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'Active')
                 """
                 
                 try:
@@ -266,19 +257,16 @@ class AdmissionModule:
                     primary_parent_phone = father_phone or mother_phone
                     primary_parent_email = father_email or mother_email
                     
-                    result = db.execute_query(
+                    new_id = db.execute_query(
                         insert_query,
                         (
-                            admission_number, first_name, last_name, date_of_birth,
+                            student_id, admission_number, f"{first_name} {last_name}".strip(), date_of_birth,
                             gender, address, primary_parent_name, primary_parent_phone,
-                            primary_parent_email, class_id, admission_date, True
-                        ),
-                        fetch_one=True
+                            primary_parent_email, class_id, admission_date
+                        )
                     )
                     
-                    if result:
-                        student_id = result['student_id']
-                        
+                    if new_id:
                         # Insert additional information (in a real system, you'd have additional tables)
                         # For now, we'll store in session or log
                         
@@ -294,6 +282,10 @@ class AdmissionModule:
                         {text('print_admission_form_message')}
                         """)
                         
+                        duplicates = dedup_engine.check_records('student', [new_id])
+                        if duplicates:
+                            st.warning(f"{len(duplicates)} {text('possible_duplicates_found')}")
+                        
                         # Print/Download button
                         col1, col2 = st.columns(2)
                         with col1:
@@ -345,45 +337,44 @@ class AdmissionModule:
                 SELECT 
                     s.student_id,
                     s.admission_number,
-                    s.first_name,
-                    s.last_name,
+                    s.full_name,
                     s.date_of_birth,
                     s.gender,
                     s.admission_date,
-                    s.is_active,
+                    s.status,
                     c.class_name,
                     c.grade_level,
-                    u.full_name as class_teacher
+                    t.full_name as class_teacher
                 FROM students s
-                LEFT JOIN classes c ON s.class_id = c.class_id
-                LEFT JOIN users u ON c.class_teacher_id = u.user_id
-                WHERE s.admission_date BETWEEN %s AND %s
+                LEFT JOIN classes c ON s.class_id = c.id
+                LEFT JOIN teachers t ON c.class_teacher_id = t.id
+                WHERE s.admission_date BETWEEN ? AND ?
             """
             
             params = [start_date, end_date]
             
             if class_filter != 'All Classes':
-                query += " AND c.class_name = %s"
+                query += " AND c.class_name = ?"
                 params.append(class_filter)
             
             if status_filter == text('active'):
-                query += " AND s.is_active = TRUE"
+                query += " AND s.status = 'Active'"
             elif status_filter == text('inactive'):
-                query += " AND s.is_active = FALSE"
+                query += " AND s.status != 'Active'"
             
             if search_term:
-                query += " AND (s.first_name ILIKE %s OR s.last_name ILIKE %s OR s.admission_number ILIKE %s)"
-                search_pattern = f"%{search_term}%"
-                params.extend([search_pattern, search_pattern, search_pattern])
+                # Exact ID matches use their indexes; names need a pattern match
+                query += f" AND (s.admission_number = ? OR s.student_id = ? OR {db.dialect.ilike('s.full_name')})"
+                params.extend([search_term, search_term, f"%{search_term}%"])
             
             query += " ORDER BY s.admission_date DESC"
             
-            records = db.execute_query(query, tuple(params), fetch_all=True)
+            records = [dict(r) for r in db.fetch_all(query, params)]
             
             if records:
                 # Display summary
                 total_students = len(records)
-                active_students = len([r for r in records if r['is_active']])
+                active_students = len([r for r in records if r['status'] == 'Active'])
                 
                 col1, col2 = st.columns(2)
                 with col1:
@@ -399,18 +390,18 @@ class AdmissionModule:
                 # Format columns
                 df['date_of_birth'] = pd.to_datetime(df['date_of_birth']).dt.strftime('%Y-%m-%d')
                 df['admission_date'] = pd.to_datetime(df['admission_date']).dt.strftime('%Y-%m-%d')
-                df['status'] = df['is_active'].apply(lambda x: '✅ ' + text('active') if x else '❌ ' + text('inactive'))
-                df['class_info'] = df['class_name'] + ' (' + df['grade_level'] + ')'
+                df['status'] = df['status'].apply(lambda x: '✅ ' + text('active') if x == 'Active' else '❌ ' + text('inactive'))
+                df['class_info'] = df['class_name'].fillna('') + ' (' + df['grade_level'].fillna('') + ')'
                 
                 # Select columns to display
                 display_cols = [
-                    'admission_number', 'first_name', 'last_name', 'date_of_birth',
+                    'admission_number', 'full_name', 'date_of_birth',
                     'gender', 'class_info', 'class_teacher', 'admission_date', 'status'
                 ]
                 
                 display_df = df[display_cols].copy()
                 display_df.columns = [
-                    text('admission_number'), text('first_name'), text('last_name'),
+                    text('admission_number'), text('student_name'),
                     text('date_of_birth'), text('gender'), text('class'),
                     text('class_teacher'), text('admission_date'), text('status')
                 ]
@@ -434,21 +425,22 @@ class AdmissionModule:
                 st.subheader(text('student_details'))
                 selected_student = st.selectbox(
                     text('select_student_for_details'),
-                    options=[f"{r['first_name']} {r['last_name']} ({r['admission_number']})" for r in records]
+                    options=[f"{r['full_name']} ({r['admission_number'] or r['student_id']})" for r in records]
                 )
                 
                 if selected_student:
                     admission_number = selected_student.split('(')[-1].rstrip(')')
-                    student_info = next(r for r in records if r['admission_number'] == admission_number)
+                    student_info = next(
+                        r for r in records if (r['admission_number'] or r['student_id']) == admission_number
+                    )
                     self.display_student_details(student_info['student_id'])
             else:
                 st.info(text('no_admission_records_found'))
     
     def get_class_list(self):
         """Get list of classes for filter"""
-        query = "SELECT DISTINCT class_name FROM classes WHERE is_active = TRUE ORDER BY class_name"
-        classes = db.execute_query(query, fetch_all=True)
-        return [c['class_name'] for c in classes] if classes else []
+        query = "SELECT DISTINCT class_name FROM classes ORDER BY class_name"
+        return [c['class_name'] for c in db.fetch_all(query)]
     
     def display_student_details(self, student_id):
         """Display detailed student information"""
@@ -460,21 +452,21 @@ class AdmissionModule:
                 c.class_name,
                 c.grade_level,
                 c.section,
-                u.full_name as class_teacher
+                t.full_name as class_teacher
             FROM students s
-            LEFT JOIN classes c ON s.class_id = c.class_id
-            LEFT JOIN users u ON c.class_teacher_id = u.user_id
-            WHERE s.student_id = %s
+            LEFT JOIN classes c ON s.class_id = c.id
+            LEFT JOIN teachers t ON c.class_teacher_id = t.id
+            WHERE s.student_id = ?
         """
         
-        student = db.execute_query(query, (student_id,), fetch_one=True)
+        student = db.fetch_one(query, (student_id,))
         
         if student:
             col1, col2 = st.columns(2)
             
             with col1:
                 st.write(f"**{text('admission_number')}:** {student['admission_number']}")
-                st.write(f"**{text('student_name')}:** {student['first_name']} {student['last_name']}")
+                st.write(f"**{text('student_name')}:** {student['full_name']}")
                 st.write(f"**{text('date_of_birth')}:** {student['date_of_birth']}")
                 st.write(f"**{text('gender')}:** {student['gender']}")
                 st.write(f"**{text('class')}:** {student['class_name']} ({student['grade_level']})")
@@ -484,7 +476,7 @@ class AdmissionModule:
                 st.write(f"**{text('class_teacher')}:** {student['class_teacher'] or 'Not Assigned'}")
                 st.write(f"**{text('parent_name')}:** {student['parent_name']}")
                 st.write(f"**{text('parent_phone')}:** {student['parent_phone']}")
-                st.write(f"**{text('status')}:** {'✅ ' + text('active') if student['is_active'] else '❌ ' + text('inactive')}")
+                st.write(f"**{text('status')}:** {'✅ ' + text('active') if student['status'] == 'Active' else '❌ ' + text('inactive')}")
             
             # Action buttons
             col1, col2, col3 = st.columns(3)
@@ -497,75 +489,204 @@ class AdmissionModule:
                     st.session_state['transfer_student_id'] = student_id
                     st.rerun()
             with col3:
-                new_status = not student['is_active']
-                status_text = text('deactivate') if student['is_active'] else text('activate')
+                is_active = student['status'] == 'Active'
+                new_status = not is_active
+                status_text = text('deactivate') if is_active else text('activate')
                 if st.button(status_text, key=f"status_{student_id}"):
                     self.update_student_status(student_id, new_status)
     
     def update_student_status(self, student_id, is_active):
         """Update student active status"""
-        query = "UPDATE students SET is_active = %s WHERE student_id = %s"
+        text = lang_manager.get_text
+        query = "UPDATE students SET status = ? WHERE student_id = ?"
         try:
-            db.execute_query(query, (is_active, student_id))
+            db.execute_query(query, ('Active' if is_active else 'Inactive', student_id))
             st.success(text('student_status_updated'))
             st.rerun()
         except Exception as e:
             st.error(f"{text('error_updating_status')}: {str(e)}")
     
     def display_pending_applications(self):
-        """Display pending admission applications"""
+        """Application queue with filters, paging and bulk decisions"""
         text = lang_manager.get_text
         
         st.subheader(text('pending_applications'))
         
-        # In a real system, you would have an applications table
-        # For now, we'll simulate with a placeholder
-        st.info(text('pending_applications_info'))
-        
-        # Simulated pending applications
-        pending_apps = [
-            {
-                'id': 1,
-                'name': 'John Smith',
-                'applied_date': '2024-01-15',
-                'applied_class': 'Grade 10',
-                'status': 'Under Review'
-            },
-            {
-                'id': 2,
-                'name': 'Sarah Johnson',
-                'applied_date': '2024-01-14',
-                'applied_class': 'Grade 8',
-                'status': 'Documents Pending'
-            }
-        ]
-        
-        for app in pending_apps:
-            with st.container():
-                col1, col2, col3, col4 = st.columns([3, 2, 2, 2])
-                
+        class_names = self.get_class_list()
+        
+        # Filters
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            status = st.multiselect(text('application_status'), STATUSES, default=OPEN_STATUSES)
+        with col2:
+            applied_class = st.selectbox(text('applied_class'), [''] + class_names)
+        with col3:
+            search = st.text_input(text('search_applications')).strip()
+        
+        from_date = to_date = None
+        if st.checkbox(text('filter_by_application_date')):
+            col1, col2 = st.columns(2)
+            with col1:
+                from_date = st.date_input(text('from_date'), value=date(date.today().year, 1, 1), key="applications_from")
+            with col2:
+                to_date = st.date_input(text('to_date'), value=date.today(), key="applications_to")
+        
+        filters = {
+            'status': status, 'applied_for_class': applied_class or None, 'search': search or None,
+            'start_date': from_date, 'end_date': to_date
+        }
+        total = admission_queue.count(**filters)
+        pages = max(1, -(-total // PAGE_SIZE))
+        
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            page = st.number_input(text('page'), min_value=1, max_value=pages, value=1)
+        with col2:
+            st.caption(f"{total} {text('applications_found')} - {text('page')} {page} / {pages}")
+        
+        page_df = admission_queue.get_page(page, **filters)
+        if page_df.empty:
+            st.info(text('no_applications'))
+        else:
+            select_all = st.checkbox(text('select_all_on_page'))
+            page_df.insert(0, 'selected', select_all)
+            edited = st.data_editor(
+                page_df,
+                column_config={'id': None},
+                disabled=[c for c in page_df.columns if c != 'selected'],
+                hide_index=True,
+                use_container_width=True,
+                key=f"applications_page_{page}"
+            )
+            selected_ids = [int(i) for i in edited.loc[edited['selected'], 'id']]
+            
+            # Bulk actions
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                waitlist_full = st.checkbox(text('waitlist_full_classes'), value=True)
+                if st.button(text('approve_selected'), type="primary"):
+                    if selected_ids:
+                        approved, skipped = admission_queue.approve(
+                            selected_ids, auth.get_current_user()['id'], waitlist_full=waitlist_full
+                        )
+                        st.session_state['application_decision'] = (approved, skipped)
+                        st.rerun()
+                    else:
+                        st.warning(text('no_applications_selected'))
+            with col2:
+                remarks = st.text_input(text('remarks'), key="rejection_remarks")
+                if st.button(text('reject_selected')):
+                    if selected_ids:
+                        rejected = admission_queue.reject(selected_ids, auth.get_current_user()['id'], remarks or None)
+                        st.success(f"{rejected} {text('applications_rejected')}")
+                    else:
+                        st.warning(text('no_applications_selected'))
+            with col3:
+                if st.button(text('mark_under_review')):
+                    if selected_ids:
+                        updated = admission_queue.set_status(selected_ids, 'Under Review', auth.get_current_user()['id'])
+                        st.success(f"{updated} {text('applications_updated')}")
+                    else:
+                        st.warning(text('no_applications_selected'))
+        
+        decision = st.session_state.pop('application_decision', None)
+        if decision:
+            approved, skipped = decision
+            if approved:
+                st.success(f"{len(approved)} {text('applications_approved')}")
+                st.dataframe(pd.DataFrame(approved, columns=['application_id', 'student_id']), use_container_width=True)
+            if skipped:
+                st.warning(f"{len(skipped)} {text('applications_not_approved')}")
+                st.dataframe(pd.DataFrame(skipped, columns=['application_id', 'reason']), use_container_width=True)
+        
+        with st.expander(text('class_capacity_overview')):
+            st.dataframe(admission_queue.class_summary(), use_container_width=True)
+        
+        with st.expander(text('new_application')):
+            with st.form("new_application_form"):
+                col1, col2 = st.columns(2)
                 with col1:
-                    st.write(f"**{app['name']}**")
-                
+                    student_name = st.text_input(text('student_name'))
+                    date_of_birth = st.date_input(
+                        text('date_of_birth'),
+                        min_value=date(1990, 1, 1),
+                        max_value=date.today(),
+                        key="application_dob"
+                    )
+                    gender = st.selectbox(text('gender'), ['Male', 'Female', 'Other'], key="application_gender")
+                    application_class = st.selectbox(text('applied_class'), class_names, key="application_class")
                 with col2:
-                    st.write(app['applied_date'])
-                
-                with col3:
-                    st.write(app['applied_class'])
+                    parent_name = st.text_input(text('parent_name'))
+                    parent_phone = st.text_input(text('parent_phone'))
+                    parent_email = st.text_input(text('parent_email'))
+                    address = st.text_area(text('address'), key="application_address")
                 
-                with col4:
-                    st.write(app['status'])
-                    
-                    # Action buttons
-                    col_a, col_b = st.columns(2)
-                    with col_a:
-                        if st.button(text('review'), key=f"review_{app['id']}"):
-                            st.session_state['review_app_id'] = app['id']
-                    with col_b:
-                        if st.button(text('process'), key=f"process_{app['id']}"):
-                            st.session_state['process_app_id'] = app['id']
-                
-                st.divider()
+                if st.form_submit_button(text('submit_application')):
+                    if not all([student_name, application_class]):
+                        st.error(text('required_fields_missing'))
+                    elif parent_email and not validate_email(parent_email):
+                        st.error(text('invalid_email'))
+                    else:
+                        application = {
+                            'student_name': student_name, 'date_of_birth': date_of_birth, 'gender': gender,
+                            'parent_name': parent_name, 'parent_phone': parent_phone,
+                            'parent_email': parent_email, 'address': address,
+                            'applied_for_class': application_class
+                        }
+                        duplicates = admission_queue.possible_duplicates(application)
+                        application_id = admission_queue.add_applications([application])[0]
+                        st.success(f"{text('application_submitted')}: {application_id}")
+                        if duplicates:
+                            st.warning(f"{len(duplicates)} {text('possible_duplicates_found')}")
+        
+        with st.expander(text('import_applications')):
+            st.caption(", ".join(APPLICATION_COLUMNS))
+            uploaded = st.file_uploader(text('import_applications'), type=['csv'], key="applications_csv")
+            if uploaded and st.button(text('import_applications')):
+                upload_df = pd.read_csv(uploaded, dtype=str)
+                upload_df = upload_df[[c for c in upload_df.columns if c in APPLICATION_COLUMNS]]
+                upload_df = upload_df.dropna(subset=['student_name']) if 'student_name' in upload_df else upload_df.iloc[0:0]
+                records = upload_df.where(upload_df.notna(), None).to_dict('records')
+                imported = admission_queue.add_applications(records)
+                st.success(f"{len(imported)} {text('applications_imported')}")
+        
+        with st.expander(text('possible_duplicates')):
+            self.display_duplicate_candidates()
+    
+    def display_duplicate_candidates(self):
+        """Review pairs flagged by the duplicate detector"""
+        text = lang_manager.get_text
+        
+        if st.button(text('run_duplicate_scan')):
+            with st.spinner(text('scanning_duplicates')):
+                result = dedup_engine.rebuild()
+            st.success(f"{result['candidates']} {text('possible_duplicates_found')} ({result['records']} {text('records_scanned')})")
+        
+        candidates = dedup_engine.get_candidates()
+        if candidates.empty:
+            st.info(text('no_duplicates'))
+            return
+        
+        candidates.insert(0, 'selected', False)
+        edited = st.data_editor(
+            candidates,
+            column_config={'id': None, 'record_id_a': None, 'record_id_b': None},
+            disabled=[c for c in candidates.columns if c != 'selected'],
+            hide_index=True,
+            use_container_width=True,
+            key="duplicate_candidates"
+        )
+        selected_ids = [int(i) for i in edited.loc[edited['selected'], 'id']]
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button(text('mark_not_duplicate')):
+                dedup_engine.set_candidate_status(selected_ids, 'dismissed', auth.get_current_user()['id'])
+                st.rerun()
+        with col2:
+            if st.button(text('confirm_duplicate')):
+                dedup_engine.set_candidate_status(selected_ids, 'confirmed', auth.get_current_user()['id'])
+                st.rerun()
     
     def display_admission_reports(self):
         """Display admission reports and analytics"""
@@ -576,12 +697,8 @@ class AdmissionModule:
         # Report type selection
         report_type = st.selectbox(
             text('select_report_type'),
-            [
-                text('admission_trends'),
-                text('class_wise_admissions'),
-                text('monthly_admissions'),
-                text('gender_distribution')
-            ]
+            list(ADMISSION_REPORTS),
+            format_func=text
         )
         
         # Date range
@@ -598,38 +715,30 @@ class AdmissionModule:
             )
         
         if st.button(text('generate_report'), type="primary"):
-            if report_type == text('admission_trends'):
-                self.generate_admission_trends_report(report_start_date, report_end_date)
-            elif report_type == text('class_wise_admissions'):
-                self.generate_class_wise_report(report_start_date, report_end_date)
-            elif report_type == text('monthly_admissions'):
-                self.generate_monthly_admissions_report(report_start_date, report_end_date)
-            elif report_type == text('gender_distribution'):
-                self.generate_gender_distribution_report(report_start_date, report_end_date)
+            # Reports run as background jobs; the page only polls for the result
+            st.session_state['admission_report_job'] = (report_type, report_jobs.enqueue(
+                ADMISSION_REPORTS[report_type],
+                {'start_date': report_start_date, 'end_date': report_end_date},
+                requested_by=auth.get_current_user()['id']
+            ))
+        
+        if 'admission_report_job' in st.session_state:
+            job_report_type, job_id = st.session_state['admission_report_job']
+            df = show_report_job(job_id)
+            
+            if df is not None and not df.empty:
+                self.display_admission_report(job_report_type, df)
+            elif df is not None:
+                st.info(text('no_data_for_period'))
     
-    def generate_admission_trends_report(self, start_date, end_date):
-        """Generate admission trends report"""
+    def display_admission_report(self, report_type, df):
+        """Chart and table for a finished admission report job"""
         text = lang_manager.get_text
         
-        query = """
-            SELECT 
-                DATE_TRUNC('month', admission_date) as month,
-                COUNT(*) as admissions,
-                COUNT(CASE WHEN gender = 'Male' THEN 1 END) as male,
-                COUNT(CASE WHEN gender = 'Female' THEN 1 END) as female
-            FROM students
-            WHERE admission_date BETWEEN %s AND %s
-            GROUP BY DATE_TRUNC('month', admission_date)
-            ORDER BY month
-        """
-        
-        data = db.execute_query(query, (start_date, end_date), fetch_all=True)
+        import plotly.express as px
+        import plotly.graph_objects as go
         
-        if data:
-            import plotly.express as px
-            import plotly.graph_objects as go
-            
-            df = pd.DataFrame(data)
+        if report_type == 'admission_trends':
             df['month'] = pd.to_datetime(df['month']).dt.strftime('%b %Y')
             
             # Create bar chart
@@ -647,10 +756,15 @@ class AdmissionModule:
                 yaxis_title=text('number_of_admissions'),
                 height=400
             )
-            
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # Display data table
-            st.dataframe(df, use_container_width=True)
+        elif report_type == 'class_wise_admissions':
+            fig = px.bar(df, x='class_name', y=['male', 'female'], title=text('class_wise_admissions'))
+        elif report_type == 'monthly_admissions':
+            df['month'] = pd.to_datetime(df['month']).dt.strftime('%b %Y')
+            fig = px.bar(df, x='month', y='admissions', color='class_name', title=text('monthly_admissions'))
         else:
-            st.info(text('no_data_for_period'))
\ No newline at end of file
+            fig = px.pie(df, values='admissions', names='gender', title=text('gender_distribution'))
+        
+        st.plotly_chart(fig, use_container_width=True)
+        
+        # Display data table
+        st.dataframe(df, use_container_width=True)
@@ -0,0 +1,278 @@
+# modules/admission_queue.py
+from datetime import date
+from database import db
+from modules.id_allocator import id_allocator
+from modules.dedup import dedup_engine
+
+STATUSES = ['Pending', 'Under Review', 'Waitlisted', 'Approved', 'Rejected']
+# Applications that can still be approved or rejected
+OPEN_STATUSES = ['Pending', 'Under Review', 'Waitlisted']
+PAGE_SIZE = 50
+# Ids per IN (...) list, below SQLite's bound parameter limit
+ID_CHUNK = 500
+
+APPLICATION_COLUMNS = [
+    'student_name', 'date_of_birth', 'gender', 'parent_name', 'parent_phone',
+    'parent_email', 'address', 'applied_for_class', 'application_date'
+]
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), ID_CHUNK):
+        yield ids[i:i + ID_CHUNK]
+
+
+class AdmissionQueue:
+    """Admission applications: paged listing, intake and bulk decisions"""
+
+    def _filters(self, status=None, applied_for_class=None, search=None, start_date=None, end_date=None):
+        where = []
+        params = []
+
+        if status:
+            statuses = [status] if isinstance(status, str) else list(status)
+            where.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(statuses)
+
+        if applied_for_class:
+            where.append("applied_for_class = ?")
+            params.append(applied_for_class)
+
+        if start_date:
+            where.append("application_date >= ?")
+            params.append(start_date)
+
+        if end_date:
+            where.append("application_date <= ?")
+            params.append(end_date)
+
+        if search:
+            where.append("(application_id = ? OR student_name LIKE ? OR parent_phone = ?)")
+            params.extend([search, f"%{search}%", search])
+
+        return (" WHERE " + " AND ".join(where)) if where else "", params
+
+    def count(self, **filters):
+        where, params = self._filters(**filters)
+        row = db.fetch_one(f"SELECT COUNT(*) as total FROM admission_applications{where}", params)
+        return row['total'] if row else 0
+
+    def get_page(self, page=1, page_size=PAGE_SIZE, **filters):
+        """One page of applications, oldest first"""
+        where, params = self._filters(**filters)
+        return db.get_dataframe(f'''
+            SELECT id, application_id, student_name, applied_for_class, application_date,
+                   status, parent_name, parent_phone, remarks
+            FROM admission_applications{where}
+            ORDER BY application_date, id
+            LIMIT ? OFFSET ?
+        ''', params + [page_size, (max(page, 1) - 1) * page_size])
+
+    def class_summary(self):
+        """Open applications per class next to its capacity and enrolment"""
+        return db.get_dataframe(f'''
+            SELECT c.class_name, c.capacity,
+                   (SELECT COUNT(*) FROM students s
+                    WHERE s.class_id = c.id AND s.status = 'Active') as enrolled,
+                   COUNT(a.id) as open_applications
+            FROM classes c
+            LEFT JOIN admission_applications a
+                ON a.applied_for_class = c.class_name
+                AND a.status IN ({', '.join('?' for _ in OPEN_STATUSES)})
+            GROUP BY c.id
+            ORDER BY c.class_name
+        ''', OPEN_STATUSES)
+
+    def add_applications(self, applications):
+        """Insert application dicts; returns the new application IDs"""
+        if not applications:
+            return []
+        application_ids = id_allocator.allocate('APP', len(applications))
+        rows = [
+            (application_id,) + tuple(
+                app.get(column) or (date.today().isoformat() if column == 'application_date' else None)
+                for column in APPLICATION_COLUMNS
+            ) + ('Pending',)
+            for application_id, app in zip(application_ids, applications)
+        ]
+        db.bulk_insert('admission_applications', ['application_id'] + APPLICATION_COLUMNS + ['status'], rows)
+
+        new_ids = []
+        for chunk in _chunks(application_ids):
+            new_ids.extend(row['id'] for row in db.fetch_all(f'''
+                SELECT id FROM admission_applications
+                WHERE application_id IN ({', '.join('?' for _ in chunk)})
+            ''', chunk))
+        dedup_engine.check_records('application', new_ids)
+        return application_ids
+
+    def possible_duplicates(self, application):
+        """Existing students and applications that look like this one"""
+        return dedup_engine.find_matches(
+            application.get('student_name'), application.get('date_of_birth'), application.get('parent_phone')
+        )
+
+    def _open_applications(self, ids):
+        statuses = ', '.join('?' for _ in OPEN_STATUSES)
+        applications = []
+        for chunk in _chunks(ids):
+            applications.extend(db.fetch_all(f'''
+                SELECT * FROM admission_applications
+                WHERE id IN ({', '.join('?' for _ in chunk)}) AND status IN ({statuses})
+            ''', chunk + OPEN_STATUSES))
+        return sorted(applications, key=lambda app: (str(app['application_date']), app['id']))
+
+    def approve(self, ids, processed_by=None, admission_date=None, waitlist_full=True):
+        """Enrol applications as students, first come first served.
+
+        Applications for unknown classes are skipped; those for full classes
+        are waitlisted (or skipped when waitlist_full is False), and those
+        approved or rejected by an overlapping call are skipped. Capacity is
+        counted inside the transaction that enrols the students, application
+        updates and waitlisting.
+        Returns (approved, skipped) where skipped holds (application_id, reason).
+        """
+        if not ids:
+            return [], []
+        applications = self._open_applications(ids)
+        classes = {
+            c['class_name']: dict(c) for c in db.fetch_all('''
+                SELECT c.id, c.class_name, c.capacity,
+                       (SELECT COUNT(*) FROM students s
+                        WHERE s.class_id = c.id AND s.status = 'Active') as enrolled
+                FROM classes c
+            ''')
+        }
+
+        # A first pass sizes the ID reservation; the transaction below decides
+        expected = 0
+        for app in applications:
+            cls = classes.get(app['applied_for_class'])
+            if cls is not None and not (cls['capacity'] and cls['enrolled'] >= cls['capacity']):
+                cls['enrolled'] += 1
+                expected += 1
+
+        # IDs are reserved up front; a failed transaction or a lost race only leaves gaps
+        student_ids = id_allocator.allocate('STU', expected)
+        admission_numbers = id_allocator.allocate('ADM', expected)
+        admission_date = admission_date or date.today()
+        processed_date = date.today()
+        statuses = ', '.join('?' for _ in OPEN_STATUSES)
+
+        accepted = []
+        skipped = []
+        with db.transaction() as cursor:
+            # Writing the class rows first makes overlapping approvals for the
+            # same classes wait here, so the enrolment counted below is current
+            class_ids = sorted({
+                classes[app['applied_for_class']]['id']
+                for app in applications if app['applied_for_class'] in classes
+            })
+            for class_id in class_ids:
+                cursor.execute("UPDATE classes SET capacity = capacity WHERE id = ?", (class_id,))
+            enrolled = dict.fromkeys(class_ids, 0)
+            for chunk in _chunks(class_ids):
+                cursor.execute(f'''
+                    SELECT class_id, COUNT(*) as enrolled FROM students
+                    WHERE status = 'Active' AND class_id IN ({', '.join('?' for _ in chunk)})
+                    GROUP BY class_id
+                ''', chunk)
+                enrolled.update((row['class_id'], row['enrolled']) for row in cursor.fetchall())
+
+            for app in applications:
+                cls = classes.get(app['applied_for_class'])
+                if cls is None:
+                    skipped.append((app['application_id'], "Unknown class"))
+                    continue
+                if cls['capacity'] and enrolled[cls['id']] >= cls['capacity']:
+                    skipped.append((app['application_id'], "Class full"))
+                    continue
+                if len(accepted) == len(student_ids):
+                    # Places freed since the first pass; the next approval takes them
+                    skipped.append((app['application_id'], "Try again"))
+                    continue
+
+                # Only an application still open is approved, so a double
+                # submit or a second admin cannot enrol it twice
+                cursor.execute(f'''
+                    UPDATE admission_applications
+                    SET status = 'Approved', processed_by = ?, processed_date = ?
+                    WHERE id = ? AND status IN ({statuses})
+                ''', [processed_by, processed_date, app['id']] + OPEN_STATUSES)
+                if cursor.rowcount != 1:
+                    skipped.append((app['application_id'], "Already processed"))
+                    continue
+
+                student_id = student_ids[len(accepted)]
+                cursor.execute('''
+                    INSERT INTO students
+                    (student_id, admission_number, full_name, date_of_birth, gender, address,
+                     parent_name, parent_phone, parent_email, class_id, admission_date, status)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'Active')
+                ''', (
+                    student_id, admission_numbers[len(accepted)], app['student_name'], app['date_of_birth'], app['gender'],
+                    app['address'], app['parent_name'], app['parent_phone'], app['parent_email'],
+                    cls['id'], admission_date
+                ))
+                cursor.execute(
+                    "UPDATE admission_applications SET student_id = ? WHERE id = ?", (cursor.lastrowid, app['id'])
+                )
+                enrolled[cls['id']] += 1
+                accepted.append((app, student_id))
+
+            full = [application_id for application_id, reason in skipped if reason == "Class full"]
+            if waitlist_full and full:
+                cursor.executemany(f'''
+                    UPDATE admission_applications
+                    SET status = 'Waitlisted', remarks = 'Class full', processed_by = ?, processed_date = ?
+                    WHERE application_id = ? AND status IN ({statuses})
+                ''', [[processed_by, processed_date, application_id] + OPEN_STATUSES for application_id in full])
+
+        # An approved application would only match its own student; the
+        # student is matched instead
+        dedup_engine.remove_records('application', [app['id'] for app, _ in accepted])
+        new_students = []
+        for chunk in _chunks([student_id for _, student_id in accepted]):
+            new_students.extend(row['id'] for row in db.fetch_all(f'''
+                SELECT id FROM students WHERE student_id IN ({', '.join('?' for _ in chunk)})
+            ''', chunk))
+        dedup_engine.check_records('student', new_students)
+
+        approved = [(app['application_id'], student_id) for app, student_id in accepted]
+        return approved, skipped
+
+    def reject(self, ids, processed_by=None, remarks=None):
+        """Reject open applications; returns the number rejected"""
+        statuses = ', '.join('?' for _ in OPEN_STATUSES)
+        rejected = 0
+        with db.transaction() as cursor:
+            for chunk in _chunks(ids):
+                cursor.execute(f'''
+                    UPDATE admission_applications
+                    SET status = 'Rejected', remarks = COALESCE(?, remarks),
+                        processed_by = ?, processed_date = ?
+                    WHERE id IN ({', '.join('?' for _ in chunk)}) AND status IN ({statuses})
+                ''', [remarks, processed_by, date.today()] + chunk + OPEN_STATUSES)
+                rejected += cursor.rowcount
+        dedup_engine.remove_records('application', ids)
+        return rejected
+
+    def set_status(self, ids, status, processed_by=None):
+        """Move open applications to another open status (e.g. Under Review)"""
+        if status not in OPEN_STATUSES:
+            raise ValueError(f"Use approve() or reject() for status {status}")
+        statuses = ', '.join('?' for _ in OPEN_STATUSES)
+        updated = 0
+        with db.transaction() as cursor:
+            for chunk in _chunks(ids):
+                cursor.execute(f'''
+                    UPDATE admission_applications SET status = ?, processed_by = ?
+                    WHERE id IN ({', '.join('?' for _ in chunk)}) AND status IN ({statuses})
+                ''', [status, processed_by] + chunk + OPEN_STATUSES)
+                updated += cursor.rowcount
+        return updated
+
+
+# Global queue instance
+admission_queue = AdmissionQueue()
@@ -3,19 +3,26 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, date, timedelta
 from database import db
+from modules.attendance_alerts import attendance_tracker
+from modules.school_calendar import school_calendar
+from modules.register_monitor import register_monitor, display_missing_registers_widget
 
 def show_attendance(translator, auth):
     """Display attendance management"""
     st.title(translator.t('attendance'))
     
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "Student Attendance",
         "Teacher Attendance",
         "Mark Attendance",
-        "Reports"
+        "Reports",
+        "Alerts"
     ])
     
     with tab1:
+        with st.expander("Missing Registers", expanded=False):
+            display_missing_registers_widget()
+        
         # Date selector
         selected_date = st.date_input("Select Date", value=date.today())
         
@@ -159,6 +166,12 @@ def show_attendance(translator, auth):
                         success_count += 1
                     
                     st.success(f"Attendance saved for {success_count} students!")
+                    register_monitor.invalidate()
+                    
+                    # Update rolling absence/lateness state for this register
+                    alerts = attendance_tracker.record_register(class_id, selected_date, attendance_data)
+                    if alerts:
+                        st.warning(f"{len(alerts)} new attendance alert(s) raised. See the Alerts tab.")
     
     with tab4:
         st.subheader("Attendance Reports")
@@ -168,27 +181,45 @@ def show_attendance(translator, auth):
         with col1:
             start_date = st.date_input("Start Date", value=date.today() - timedelta(days=30))
             end_date = st.date_input("End Date", value=date.today())
+            term_to_date = st.checkbox("Current term to date")
         
         with col2:
             report_type = st.selectbox(
                 "Report Type",
-                ["Daily Summary", "Student-wise", "Class-wise", "Monthly Summary"]
+                ["Daily Summary", "Student-wise", "Class-wise", "Monthly Summary", "Missing Registers"]
             )
         
+        if term_to_date:
+            term_start, term_end = school_calendar.term_to_date_range()
+            if term_start:
+                start_date, end_date = term_start, term_end
+                st.caption(f"Term to date: {start_date} to {end_date}")
+            else:
+                st.warning("No term is running today. Add terms under System Configuration.")
+        
         if st.button("Generate Report"):
+            # Rates are measured against expected school days, not recorded rows
             if report_type == "Daily Summary":
                 report_df = db.get_dataframe('''
                     SELECT date, 
                            COUNT(*) as total,
                            SUM(CASE WHEN status = 'Present' THEN 1 ELSE 0 END) as present,
-                           SUM(CASE WHEN status = 'Absent' THEN 1 ELSE 0 END) as absent,
-                           ROUND(SUM(CASE WHEN status = 'Present' THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2) as attendance_percentage
+                           SUM(CASE WHEN status = 'Absent' THEN 1 ELSE 0 END) as absent
                     FROM attendance
                     WHERE date BETWEEN ? AND ?
                     GROUP BY date
                     ORDER BY date
                 ''', (start_date, end_date))
                 
+                expected = school_calendar.expected_student_days(start_date, end_date, by='date')
+                expected_df = pd.DataFrame(
+                    {'date': list(expected.keys()), 'expected': list(expected.values())}
+                )
+                report_df = expected_df.merge(report_df, on='date', how='outer').fillna(0).sort_values('date')
+                report_df['attendance_percentage'] = (
+                    report_df['present'] * 100.0 / report_df['expected'].where(report_df['expected'] > 0)
+                ).round(2)
+                
                 if not report_df.empty:
                     st.dataframe(report_df, use_container_width=True)
                     
@@ -196,4 +227,107 @@ def show_attendance(translator, auth):
                     import plotly.express as px
                     fig = px.line(report_df, x='date', y='attendance_percentage',
                                  title='Daily Attendance Percentage')
-                    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+                    st.plotly_chart(fig, use_container_width=True)
+            
+            elif report_type == "Student-wise":
+                report_df = db.get_dataframe('''
+                    SELECT s.full_name, s.student_id, s.class_id, c.class_name,
+                           SUM(CASE WHEN a.status = 'Present' THEN 1 ELSE 0 END) as present_days,
+                           SUM(CASE WHEN a.status = 'Absent' THEN 1 ELSE 0 END) as absent_days,
+                           SUM(CASE WHEN a.status = 'Late' THEN 1 ELSE 0 END) as late_days
+                    FROM students s
+                    LEFT JOIN attendance a ON s.id = a.student_id AND a.date BETWEEN ? AND ?
+                    LEFT JOIN classes c ON s.class_id = c.id
+                    WHERE s.status = 'Active'
+                    GROUP BY s.id
+                    ORDER BY c.class_name, s.full_name
+                ''', (start_date, end_date))
+                
+                if not report_df.empty:
+                    school_days = {
+                        class_id: school_calendar.get_index(class_id).count(start_date, end_date)
+                        for class_id in report_df['class_id'].dropna().unique()
+                    }
+                    report_df['school_days'] = report_df['class_id'].map(school_days).fillna(0).astype(int)
+                    report_df['attendance_percentage'] = (
+                        report_df['present_days'] * 100.0 / report_df['school_days'].where(report_df['school_days'] > 0)
+                    ).round(2)
+                    st.dataframe(report_df.drop(columns=['class_id']), use_container_width=True)
+            
+            elif report_type == "Class-wise":
+                report_df = db.get_dataframe('''
+                    SELECT c.id as class_id, c.class_name,
+                           SUM(CASE WHEN a.status = 'Present' THEN 1 ELSE 0 END) as present,
+                           SUM(CASE WHEN a.status = 'Absent' THEN 1 ELSE 0 END) as absent
+                    FROM classes c
+                    LEFT JOIN attendance a ON a.class_id = c.id AND a.date BETWEEN ? AND ?
+                    GROUP BY c.id
+                    ORDER BY c.class_name
+                ''', (start_date, end_date))
+                
+                if not report_df.empty:
+                    class_sizes = school_calendar.get_class_sizes()
+                    report_df['expected'] = [
+                        class_sizes.get(class_id, 0) * school_calendar.get_index(class_id).count(start_date, end_date)
+                        for class_id in report_df['class_id']
+                    ]
+                    report_df['attendance_percentage'] = (
+                        report_df['present'] * 100.0 / report_df['expected'].where(report_df['expected'] > 0)
+                    ).round(2)
+                    st.dataframe(report_df.drop(columns=['class_id']), use_container_width=True)
+            
+            elif report_type == "Missing Registers":
+                missing = register_monitor.find_missing_registers(start_date, end_date)
+                
+                if missing:
+                    st.dataframe(
+                        pd.DataFrame(missing)[['date', 'class_name', 'status', 'marked', 'students']],
+                        use_container_width=True
+                    )
+                else:
+                    st.success("No missing or partial registers in this period")
+    
+    with tab5:
+        st.subheader("Attendance Alerts")
+        
+        classes = db.fetch_all("SELECT id, class_name FROM classes")
+        class_options = {"All Classes": None}
+        class_options.update({c['class_name']: c['id'] for c in classes})
+        alert_class = st.selectbox("Filter by Class", list(class_options.keys()), key="alert_class")
+        
+        thresholds = attendance_tracker.get_thresholds()
+        st.caption(
+            f"Alerts fire at {thresholds['absence_streak_threshold']} consecutive absences, "
+            f"{thresholds['absence_window_threshold']} absences or {thresholds['late_threshold']} late marks "
+            f"in the last {thresholds['absence_window_days']} school days."
+        )
+        
+        alerts_df = attendance_tracker.get_open_alerts(class_options[alert_class])
+        
+        if not alerts_df.empty:
+            alert_labels = {
+                'absence_streak': "Consecutive absences",
+                'absence_window': "Absences in window",
+                'late_window': "Late marks in window"
+            }
+            alerts_df['alert'] = alerts_df['alert_type'].map(alert_labels)
+            st.dataframe(
+                alerts_df[['full_name', 'student_id', 'class_name', 'alert',
+                          'alert_value', 'threshold', 'alert_date']],
+                use_container_width=True
+            )
+            
+            selected_alerts = st.multiselect(
+                "Acknowledge Alerts",
+                alerts_df['id'].tolist(),
+                format_func=lambda alert_id: "{full_name} - {alert} ({alert_date})".format(
+                    **alerts_df.set_index('id').loc[alert_id].to_dict()
+                )
+            )
+            
+            if st.button("Acknowledge Selected") and selected_alerts:
+                attendance_tracker.acknowledge_alerts(selected_alerts, auth.get_current_user()['id'])
+                st.success(f"{len(selected_alerts)} alert(s) acknowledged")
+                st.rerun()
+        else:
+            st.info("No open attendance alerts")
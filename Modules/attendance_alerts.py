@@ -0,0 +1,219 @@
+# modules/attendance_alerts.py
+from database import db
+from modules.school_calendar import school_calendar, to_date
+
+# Thresholds live in system_config; these are used until they are saved
+DEFAULT_THRESHOLDS = {
+    'absence_window_days': 20,
+    'absence_streak_threshold': 3,
+    'absence_window_threshold': 5,
+    'late_threshold': 5
+}
+
+# Bit 0 of a mask is the student's most recent school day, bit i is i school
+# days earlier. 62 bits keeps the mask inside SQLite's signed 64-bit INTEGER.
+MAX_WINDOW_DAYS = 62
+FULL_MASK = (1 << MAX_WINDOW_DAYS) - 1
+
+
+def _popcount(mask):
+    return bin(mask).count('1')
+
+
+def _trailing_ones(mask):
+    count = 0
+    while mask & 1 and count < MAX_WINDOW_DAYS:
+        count += 1
+        mask >>= 1
+    return count
+
+
+class AttendanceTracker:
+    """Incremental absence streak / lateness detector with an alert queue"""
+
+    def school_days_between(self, start, end, class_id=None):
+        """Number of school days after start up to and including end"""
+        return school_calendar.school_days_between(start, end, class_id)
+
+    def get_thresholds(self):
+        """Load alert thresholds from system configuration"""
+        thresholds = dict(DEFAULT_THRESHOLDS)
+        keys = list(DEFAULT_THRESHOLDS.keys())
+        placeholders = ', '.join('?' for _ in keys)
+        rows = db.fetch_all(
+            f"SELECT config_key, config_value FROM system_config WHERE config_key IN ({placeholders})",
+            keys
+        )
+        for row in rows:
+            try:
+                thresholds[row['config_key']] = int(row['config_value'])
+            except (TypeError, ValueError):
+                pass
+        thresholds['absence_window_days'] = max(1, min(thresholds['absence_window_days'], MAX_WINDOW_DAYS))
+        return thresholds
+
+    def _metrics(self, state, window_mask):
+        return {
+            'absence_streak': state['absence_streak'],
+            'absence_window': _popcount(state['absence_mask'] & window_mask),
+            'late_window': _popcount(state['late_mask'] & window_mask)
+        }
+
+    def _apply(self, state, class_id, att_date, status):
+        """Fold one attendance mark into a student's rolling state"""
+        absent = 1 if status == 'Absent' else 0
+        late = 1 if status == 'Late' else 0
+        last_date = to_date(state['last_date']) if state['last_date'] else None
+
+        if last_date is None or att_date > last_date:
+            shift = self.school_days_between(last_date, att_date, class_id) if last_date else MAX_WINDOW_DAYS
+            shift = max(shift, 1)
+            previous_streak = state['absence_streak'] if shift == 1 else 0
+            state['absence_mask'] = ((state['absence_mask'] << shift) & FULL_MASK) | absent
+            state['late_mask'] = ((state['late_mask'] << shift) & FULL_MASK) | late
+            state['absence_streak'] = previous_streak + 1 if absent else 0
+            state['last_date'] = att_date.isoformat()
+        elif att_date == last_date:
+            # Re-saving the latest register replaces bit 0
+            if state['absence_mask'] & 1:
+                previous_streak = state['absence_streak'] - 1
+            else:
+                previous_streak = _trailing_ones(state['absence_mask'] >> 1)
+            state['absence_mask'] = (state['absence_mask'] & ~1) | absent
+            state['late_mask'] = (state['late_mask'] & ~1) | late
+            state['absence_streak'] = previous_streak + 1 if absent else 0
+        else:
+            # Back-filling an older register only touches its bit in the window
+            offset = self.school_days_between(att_date, last_date, class_id)
+            if offset < MAX_WINDOW_DAYS:
+                bit = 1 << offset
+                state['absence_mask'] = (state['absence_mask'] & ~bit) | (bit if absent else 0)
+                state['late_mask'] = (state['late_mask'] & ~bit) | (bit if late else 0)
+                run = _trailing_ones(state['absence_mask'])
+                state['absence_streak'] = run if run < MAX_WINDOW_DAYS else max(run, state['absence_streak'])
+
+        state['class_id'] = class_id
+        return state
+
+    def record_register(self, class_id, att_date, records):
+        """Update rolling state for one saved class register.
+
+        records is a list of dicts with 'student_id' and 'status'. Only the
+        state rows of these students are read and written, so the cost is
+        proportional to the class size and history is never rescanned.
+        Returns the list of alerts raised.
+        """
+        if not records:
+            return []
+
+        att_date = to_date(att_date)
+        thresholds = self.get_thresholds()
+        window_mask = (1 << thresholds['absence_window_days']) - 1
+        limits = {
+            'absence_streak': thresholds['absence_streak_threshold'],
+            'absence_window': thresholds['absence_window_threshold'],
+            'late_window': thresholds['late_threshold']
+        }
+
+        student_ids = [r['student_id'] for r in records]
+        placeholders = ', '.join('?' for _ in student_ids)
+        existing = db.fetch_all(f'''
+            SELECT student_id, last_date, absence_streak, absence_mask, late_mask
+            FROM attendance_student_state
+            WHERE student_id IN ({placeholders})
+        ''', student_ids)
+        states = {row['student_id']: dict(row) for row in existing}
+
+        upserts = []
+        alerts = []
+        for record in records:
+            state = states.get(record['student_id']) or {
+                'student_id': record['student_id'],
+                'last_date': None,
+                'absence_streak': 0,
+                'absence_mask': 0,
+                'late_mask': 0
+            }
+            before = self._metrics(state, window_mask)
+            state = self._apply(state, class_id, att_date, record['status'])
+            after = self._metrics(state, window_mask)
+
+            for alert_type, limit in limits.items():
+                if limit > 0 and before[alert_type] < limit <= after[alert_type]:
+                    alerts.append((
+                        state['student_id'], class_id, alert_type,
+                        after[alert_type], limit, att_date.isoformat()
+                    ))
+
+            upserts.append((
+                state['student_id'], class_id, state['last_date'],
+                state['absence_streak'], state['absence_mask'], state['late_mask']
+            ))
+
+        with db.transaction() as cursor:
+            cursor.executemany('''
+                INSERT INTO attendance_student_state
+                (student_id, class_id, last_date, absence_streak, absence_mask, late_mask)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(student_id) DO UPDATE SET
+                    class_id = excluded.class_id,
+                    last_date = excluded.last_date,
+                    absence_streak = excluded.absence_streak,
+                    absence_mask = excluded.absence_mask,
+                    late_mask = excluded.late_mask,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', upserts)
+            if alerts:
+                cursor.executemany('''
+                    INSERT INTO attendance_alerts
+                    (student_id, class_id, alert_type, alert_value, threshold, alert_date)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', alerts)
+
+        return alerts
+
+    def get_student_state(self, student_id):
+        """Current streak, window absences and lateness for one student"""
+        row = db.fetch_one(
+            "SELECT * FROM attendance_student_state WHERE student_id = ?",
+            (student_id,)
+        )
+        if not row:
+            return None
+
+        state = dict(row)
+        thresholds = self.get_thresholds()
+        state.update(self._metrics(state, (1 << thresholds['absence_window_days']) - 1))
+        return state
+
+    def get_open_alerts(self, class_id=None):
+        """Alerts waiting to be acknowledged, newest first"""
+        query = '''
+            SELECT al.id, al.alert_type, al.alert_value, al.threshold, al.alert_date,
+                   s.full_name, s.student_id, c.class_name
+            FROM attendance_alerts al
+            JOIN students s ON al.student_id = s.id
+            LEFT JOIN classes c ON al.class_id = c.id
+            WHERE al.status = 'Open'
+        '''
+        params = []
+
+        if class_id:
+            query += " AND al.class_id = ?"
+            params.append(class_id)
+
+        query += " ORDER BY al.alert_date DESC, al.id DESC"
+        return db.get_dataframe(query, params)
+
+    def acknowledge_alerts(self, alert_ids, user_id):
+        """Close alerts once someone has followed up"""
+        if not alert_ids:
+            return 0
+        return db.execute_many(
+            "UPDATE attendance_alerts SET status = 'Acknowledged', acknowledged_by = ? WHERE id = ?",
+            [(user_id, alert_id) for alert_id in alert_ids]
+        )
+
+
+# Global tracker instance
+attendance_tracker = AttendanceTracker()
@@ -0,0 +1,179 @@
+# modules/credentials.py
+import base64
+import hashlib
+import hmac
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import APP_CONFIG
+
+PBKDF2 = 'pbkdf2_sha256'
+SCRYPT = 'scrypt'
+SALT_BYTES = 16
+KEY_BYTES = 32
+SCRYPT_R = 8
+SCRYPT_P = 1
+# Upper bound for one verification queued behind a login burst
+VERIFY_TIMEOUT = 30
+
+LEGACY_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    # hashlib's default 32 MiB limit is below what n=32768, r=8 needs
+    return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, maxmem=256 * n * r, dklen=KEY_BYTES)
+
+
+class PasswordHasher:
+    """Salted password hashes with a format prefix.
+
+    Stored values look like ``pbkdf2_sha256$<iterations>$<salt>$<hash>`` or
+    ``scrypt$<n>$<r>$<p>$<salt>$<hash>``, so the cost travels with each hash
+    and can be raised without invalidating existing passwords. Values from
+    older versions (unsalted sha256 hex digests, plaintext) still verify;
+    needs_rehash() tells the caller to store a new hash after a login.
+
+    Verification is deliberately slow, so it runs on a small thread pool:
+    a burst of logins queues there instead of occupying every script thread
+    and CPU at once. The KDFs release the GIL while they work.
+    """
+
+    def __init__(self, algorithm=None, iterations=None, scrypt_n=None, workers=None):
+        self.algorithm = algorithm or APP_CONFIG.get('password_algorithm', PBKDF2)
+        if self.algorithm not in (PBKDF2, SCRYPT):
+            raise ValueError(f"Unknown password algorithm: {self.algorithm}")
+        self.iterations = iterations or APP_CONFIG.get('password_iterations', 600000)
+        self.scrypt_n = scrypt_n or APP_CONFIG.get('password_scrypt_n', 32768)
+        self.workers = workers or APP_CONFIG.get('password_workers', 2)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._dummy = None
+
+    def hash(self, password):
+        salt = os.urandom(SALT_BYTES)
+        password = password.encode('utf-8')
+        if self.algorithm == SCRYPT:
+            key = _scrypt(password, salt, self.scrypt_n, SCRYPT_R, SCRYPT_P)
+            return f"{SCRYPT}${self.scrypt_n}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(key)}"
+        key = hashlib.pbkdf2_hmac('sha256', password, salt, self.iterations, KEY_BYTES)
+        return f"{PBKDF2}${self.iterations}${_b64(salt)}${_b64(key)}"
+
+    def verify(self, password, stored):
+        """Check password against a stored value of any supported format"""
+        if not stored:
+            return False
+        password = (password or '').encode('utf-8')
+        fields = stored.split('$')
+        try:
+            if fields[0] == PBKDF2 and len(fields) == 4:
+                expected = _unb64(fields[3])
+                key = hashlib.pbkdf2_hmac('sha256', password, _unb64(fields[2]), int(fields[1]), len(expected))
+            elif fields[0] == SCRYPT and len(fields) == 6:
+                expected = _unb64(fields[5])
+                n, r, p = int(fields[1]), int(fields[2]), int(fields[3])
+                key = _scrypt(password, _unb64(fields[4]), n, r, p)
+            elif LEGACY_SHA256.match(stored):
+                expected = stored.encode('ascii')
+                key = hashlib.sha256(password).hexdigest().encode('ascii')
+            elif len(fields) == 1:
+                # Plaintext from before passwords were hashed
+                expected = stored.encode('utf-8')
+                key = password
+            else:
+                # A malformed or unknown hash never matches its own text
+                return False
+        except (ValueError, TypeError):
+            return False
+        return hmac.compare_digest(key, expected)
+
+    def needs_rehash(self, stored):
+        """Whether stored uses an old format, another algorithm or a lower cost"""
+        fields = (stored or '').split('$')
+        if fields[0] != self.algorithm:
+            return True
+        try:
+            if self.algorithm == PBKDF2:
+                return len(fields) != 4 or int(fields[1]) < self.iterations
+            return len(fields) != 6 or int(fields[1]) < self.scrypt_n
+        except ValueError:
+            return True
+
+    def dummy_hash(self):
+        """A hash to verify against for unknown users, so a failed login
+        takes as long whether or not the username exists"""
+        if self._dummy is None:
+            self._dummy = self.hash(_b64(os.urandom(SALT_BYTES)))
+        return self._dummy
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password')
+            return self._executor
+
+    def verify_async(self, password, stored):
+        """Future of verify() on the verification pool"""
+        return self._pool().submit(self.verify, password, stored)
+
+    def check(self, password, stored, timeout=VERIFY_TIMEOUT):
+        """verify() on the verification pool, waiting for the result"""
+        return self.verify_async(password, stored).result(timeout)
+
+    def hash_async(self, password):
+        return self._pool().submit(self.hash, password)
+
+
+def benchmark(target_ms=250, algorithm=PBKDF2):
+    """Cost factor whose hash takes about target_ms on this machine.
+
+    Doubles the cost from a small start until one hash takes at least a
+    quarter of the target, then scales linearly. Returns (cost, ms per hash).
+    """
+    def measure(cost):
+        hasher = PasswordHasher(algorithm, iterations=cost, scrypt_n=cost, workers=1)
+        started = time.perf_counter()
+        hasher.hash('benchmark-password')
+        return (time.perf_counter() - started) * 1000
+
+    if algorithm == SCRYPT:
+        # n must be a power of two; memory grows with it (128 * r * n bytes)
+        cost = 1024
+        while measure(cost) < target_ms and cost < 2 ** 20:
+            cost *= 2
+        return cost, round(measure(cost), 1)
+
+    cost = 10000
+    elapsed = measure(cost)
+    while elapsed < target_ms / 4:
+        cost *= 2
+        elapsed = measure(cost)
+    cost = max(10000, int(cost * target_ms / elapsed) // 10000 * 10000)
+    return cost, round(measure(cost), 1)
+
+
+# Global hasher
+password_hasher = PasswordHasher()
+
+if __name__ == "__main__":
+    # Pick the cost for this hardware, e.g. before setting PASSWORD_ITERATIONS
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark password hashing cost")
+    parser.add_argument('--target-ms', type=float, default=250)
+    parser.add_argument('--algorithm', choices=[PBKDF2, SCRYPT], default=PBKDF2)
+    args = parser.parse_args()
+
+    cost, elapsed = benchmark(args.target_ms, args.algorithm)
+    setting = 'PASSWORD_SCRYPT_N' if args.algorithm == SCRYPT else 'PASSWORD_ITERATIONS'
+    print(f"{setting}={cost}  ({elapsed} ms per hash)")
+    for workers in (1, 2, 4):
+        print(f"  {workers} verification worker(s): about {int(workers * 1000 / elapsed)} logins/s")
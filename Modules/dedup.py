@@ -0,0 +1,444 @@
+# modules/dedup.py
+import re
+import unicodedata
+from itertools import combinations
+from database import db
+
+RECORD_STUDENT = 'student'
+RECORD_APPLICATION = 'application'
+
+# Applications still waiting for a decision take part in matching
+OPEN_APPLICATION_STATUSES = ('Pending', 'Under Review', 'Waitlisted')
+
+NAME_WEIGHT = 0.6
+DOB_WEIGHT = 0.25
+PHONE_WEIGHT = 0.15
+DUPLICATE_THRESHOLD = 0.85
+MIN_NAME_SIMILARITY = 0.88
+# Blocks larger than this (e.g. a school switchboard number) are too
+# common to discriminate and are skipped
+MAX_BLOCK_SIZE = 200
+PHONE_DIGITS = 7
+
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+ARABIC_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    'ک': 'ك', 'ی': 'ي', 'گ': 'ك'
+})
+# Connective name particles ignored when comparing
+NAME_PARTICLES = {'bin', 'ibn', 'bint', 'binti', 'abu', 'al', 'el', 'بن', 'ابن', 'بنت', 'ابو'}
+
+# Arabic consonants grouped by similar sound; long vowels are dropped
+ARABIC_PHONETIC = {
+    'ب': 'B', 'ف': 'F', 'و': '', 'ي': '', 'ا': '',
+    'ت': 'T', 'ط': 'T', 'ث': 'S', 'س': 'S', 'ص': 'S', 'ش': 'X',
+    'ج': 'J', 'ح': 'H', 'ه': 'H', 'خ': 'K', 'ك': 'K', 'ق': 'K',
+    'د': 'D', 'ض': 'D', 'ذ': 'Z', 'ز': 'Z', 'ظ': 'Z',
+    'ر': 'R', 'ل': 'L', 'م': 'M', 'ن': 'N', 'ع': '', 'ء': '', 'غ': 'G'
+}
+LATIN_PHONETIC = {}
+for letters, code in (('bfpv', '1'), ('cgjkqsxz', '2'), ('dt', '3'), ('l', '4'), ('mn', '5'), ('r', '6')):
+    LATIN_PHONETIC.update(dict.fromkeys(letters, code))
+
+
+def _is_arabic(token):
+    return any('\u0600' <= ch <= '\u06ff' for ch in token)
+
+
+def normalize_name(name):
+    """Lowercased name tokens with accents, Arabic diacritics and letter
+    variants folded and connective particles removed"""
+    if not name:
+        return []
+    name = unicodedata.normalize('NFKC', str(name))
+    name = ARABIC_DIACRITICS.sub('', name).translate(ARABIC_LETTERS)
+    # Strip Latin accents while keeping Arabic letters intact
+    name = ''.join(
+        ch for ch in unicodedata.normalize('NFKD', name)
+        if not (unicodedata.combining(ch) and ord(ch) < 0x0600)
+    ).lower()
+    tokens = re.split(r"[^\w]+", name)
+    tokens = [t[2:] if _is_arabic(t) and t.startswith('ال') and len(t) > 4 else t for t in tokens]
+    return [t for t in tokens if t and t not in NAME_PARTICLES]
+
+
+def phonetic_token(token):
+    """Sound-alike code for one normalized name token"""
+    if _is_arabic(token):
+        codes = [ARABIC_PHONETIC.get(ch, ch) for ch in token]
+        first = codes[0] or 'A'
+        rest = codes[1:]
+    else:
+        first = token[0].upper()
+        codes = [LATIN_PHONETIC.get(ch, '') for ch in token]
+        rest = codes[1:]
+        # A first letter's own code must not repeat as the next consonant
+        codes[0] = LATIN_PHONETIC.get(token[0], '')
+
+    result = [first]
+    previous = codes[0]
+    for code in rest:
+        if code and code != previous:
+            result.append(code)
+        previous = code
+    return ''.join(result)[:5]
+
+
+def normalize_phone(phone):
+    digits = re.sub(r'\D', '', str(phone or ''))
+    return digits[-PHONE_DIGITS:] if len(digits) >= 7 else ''
+
+
+def normalize_dob(value):
+    return str(value)[:10] if value else ''
+
+
+def jaro_winkler(s1, s2, prefix_scale=0.1):
+    if s1 == s2:
+        return 1.0
+    len1, len2 = len(s1), len(s2)
+    if not len1 or not len2:
+        return 0.0
+
+    window = max(max(len1, len2) // 2 - 1, 0)
+    matched1 = [False] * len1
+    matched2 = [False] * len2
+    matches = 0
+    for i, ch in enumerate(s1):
+        for j in range(max(0, i - window), min(i + window + 1, len2)):
+            if not matched2[j] and s2[j] == ch:
+                matched1[i] = matched2[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+
+    transpositions = 0
+    k = 0
+    for i in range(len1):
+        if matched1[i]:
+            while not matched2[k]:
+                k += 1
+            if s1[i] != s2[k]:
+                transpositions += 1
+            k += 1
+
+    jaro = (matches / len1 + matches / len2 + (matches - transpositions / 2) / matches) / 3
+    prefix = 0
+    for a, b in zip(s1[:4], s2[:4]):
+        if a != b:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_scale * (1 - jaro)
+
+
+def name_similarity(tokens1, tokens2):
+    """Best of whole-name and token-by-token similarity, so a missing
+    middle name or swapped order still scores high"""
+    if not tokens1 or not tokens2:
+        return 0.0
+    whole = jaro_winkler(' '.join(sorted(tokens1)), ' '.join(sorted(tokens2)))
+    shorter, longer = sorted((tokens1, tokens2), key=len)
+    # Each token pairs with its best unused counterpart
+    remaining = list(longer)
+    total = 0.0
+    for a in shorter:
+        best = max(range(len(remaining)), key=lambda j: jaro_winkler(a, remaining[j]))
+        total += jaro_winkler(a, remaining.pop(best))
+    by_token = total / len(shorter)
+    # Token matching ignores extra names, so it is trusted slightly less
+    return max(whole, by_token * 0.97 if len(shorter) < len(longer) else by_token)
+
+
+def dob_similarity(dob1, dob2):
+    if not dob1 or not dob2:
+        return 0.5
+    if dob1 == dob2:
+        return 1.0
+    y1, m1, d1 = dob1[:4], dob1[5:7], dob1[8:10]
+    y2, m2, d2 = dob2[:4], dob2[5:7], dob2[8:10]
+    # Day and month swapped, or one part mistyped
+    if y1 == y2 and (m1, d1) == (d2, m2):
+        return 0.8
+    if sum(a == b for a, b in ((y1, y2), (m1, m2), (d1, d2))) == 2:
+        return 0.6
+    return 0.0
+
+
+class Record:
+    __slots__ = ('record_type', 'record_id', 'tokens', 'dob', 'phone', 'linked_student')
+
+    def __init__(self, record_type, record_id, name, dob, phone, linked_student=None):
+        self.record_type = record_type
+        self.record_id = record_id
+        self.tokens = normalize_name(name)
+        self.dob = normalize_dob(dob)
+        self.phone = normalize_phone(phone)
+        self.linked_student = linked_student
+
+    @property
+    def key(self):
+        return (self.record_type, self.record_id)
+
+    def block_keys(self):
+        keys = set()
+        codes = [phonetic_token(t) for t in self.tokens]
+        if codes:
+            keys.add('n:' + ' '.join(sorted(codes)))
+            keys.add('f:' + ' '.join(sorted({codes[0], codes[-1]})))
+            if self.dob:
+                keys.add(f"d:{self.dob}|{codes[0]}")
+                keys.add(f"d:{self.dob}|{codes[-1]}")
+        if self.phone:
+            keys.add('p:' + self.phone)
+        return keys
+
+
+def score_pair(a, b, threshold=0.0):
+    """Duplicate score in [0, 1] and the name similarity behind it.
+
+    Date of birth and phone are compared first; when even identical names
+    could not reach threshold the name comparison is skipped and
+    (None, None) is returned.
+    """
+    phone = 1.0 if a.phone and a.phone == b.phone else (0.5 if not a.phone or not b.phone else 0.0)
+    partial = DOB_WEIGHT * dob_similarity(a.dob, b.dob) + PHONE_WEIGHT * phone
+    if partial + NAME_WEIGHT < threshold:
+        return None, None
+    name = name_similarity(a.tokens, b.tokens)
+    return round(NAME_WEIGHT * name + partial, 4), name
+
+
+class DedupEngine:
+    """Duplicate detection across students and open admission applications.
+
+    Each record gets a few blocking keys (phonetic name key, date of birth
+    with a name code, parent phone) kept in dedup_keys. Only records that
+    share a key are compared, so new records are checked with an indexed
+    lookup and a full scan compares pairs within blocks rather than all
+    pairs. Pairs scoring above the threshold go to duplicate_candidates
+    for review; dismissed pairs stay dismissed across rescans.
+    """
+
+    def _load(self, record_type, ids=None):
+        if record_type == RECORD_STUDENT:
+            query = "SELECT id, full_name as name, date_of_birth, parent_phone, NULL as student_id FROM students"
+            where = []
+        else:
+            statuses = ', '.join(f"'{s}'" for s in OPEN_APPLICATION_STATUSES)
+            query = '''
+                SELECT id, student_name as name, date_of_birth, parent_phone, student_id
+                FROM admission_applications
+            '''
+            where = [f"status IN ({statuses})"]
+
+        records = []
+        ids = list(ids) if ids is not None else None
+        chunks = [ids[i:i + 500] for i in range(0, len(ids), 500)] if ids is not None else [None]
+        for chunk in chunks:
+            clauses = where + ([f"id IN ({', '.join('?' for _ in chunk)})"] if chunk else [])
+            sql = query + (" WHERE " + " AND ".join(clauses) if clauses else "")
+            for r in db.fetch_all(sql, chunk or ()):
+                records.append(Record(record_type, r['id'], r['name'], r['date_of_birth'],
+                                      r['parent_phone'], r['student_id']))
+        return records
+
+    def _is_pair(self, a, b):
+        if a.key == b.key:
+            return False
+        # An approved application and the student it became are not duplicates
+        for x, y in ((a, b), (b, a)):
+            if x.record_type == RECORD_APPLICATION and y.record_type == RECORD_STUDENT and x.linked_student == y.record_id:
+                return False
+        return True
+
+    def _candidate_row(self, a, b, score):
+        a, b = sorted((a, b), key=lambda r: r.key)
+        return (a.record_type, a.record_id, b.record_type, b.record_id, score)
+
+    def _save_candidates(self, cursor, rows):
+        cursor.executemany('''
+            INSERT INTO duplicate_candidates
+            (record_type_a, record_id_a, record_type_b, record_id_b, score)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(record_type_a, record_id_a, record_type_b, record_id_b)
+            DO UPDATE SET score = excluded.score
+        ''', rows)
+
+    def _matches(self, a, b):
+        score, name = score_pair(a, b, DUPLICATE_THRESHOLD)
+        if score is None or score < DUPLICATE_THRESHOLD or name < MIN_NAME_SIMILARITY:
+            return None
+        return score
+
+    def check_records(self, record_type, ids):
+        """Index new or changed records and match them against everything
+        sharing a block; returns the candidate rows found"""
+        records = self._load(record_type, ids)
+        if not records:
+            return []
+
+        keys = {r.key: r.block_keys() for r in records}
+        all_keys = sorted(set().union(*keys.values()))
+        neighbours = {}
+        for i in range(0, len(all_keys), 500):
+            chunk = all_keys[i:i + 500]
+            for row in db.fetch_all(f'''
+                SELECT block_key, record_type, record_id FROM dedup_keys
+                WHERE block_key IN ({', '.join('?' for _ in chunk)})
+            ''', chunk):
+                neighbours.setdefault(row['block_key'], set()).add((row['record_type'], row['record_id']))
+
+        # The new records can also duplicate each other
+        for r in records:
+            for key in keys[r.key]:
+                neighbours.setdefault(key, set()).add(r.key)
+
+        loaded = {r.key: r for r in records}
+        wanted = {RECORD_STUDENT: set(), RECORD_APPLICATION: set()}
+        for members in neighbours.values():
+            if len(members) <= MAX_BLOCK_SIZE:
+                for record_key in members:
+                    if record_key not in loaded:
+                        wanted[record_key[0]].add(record_key[1])
+        for other_type, other_ids in wanted.items():
+            if other_ids:
+                loaded.update((r.key, r) for r in self._load(other_type, other_ids))
+
+        rows = {}
+        for r in records:
+            for key in keys[r.key]:
+                members = neighbours.get(key, ())
+                if len(members) > MAX_BLOCK_SIZE:
+                    continue
+                for other_key in members:
+                    other = loaded.get(other_key)
+                    if other is None or not self._is_pair(r, other):
+                        continue
+                    row = self._candidate_row(r, other, 0)
+                    if row[:4] in rows:
+                        continue
+                    score = self._matches(r, other)
+                    if score is not None:
+                        rows[row[:4]] = row[:4] + (score,)
+
+        with db.transaction() as cursor:
+            cursor.executemany(
+                "DELETE FROM dedup_keys WHERE record_type = ? AND record_id = ?",
+                [r.key for r in records]
+            )
+            cursor.executemany(
+                "INSERT OR IGNORE INTO dedup_keys (record_type, record_id, block_key) VALUES (?, ?, ?)",
+                [(r.record_type, r.record_id, key) for r in records for key in keys[r.key]]
+            )
+            self._save_candidates(cursor, list(rows.values()))
+        return list(rows.values())
+
+    def remove_records(self, record_type, ids):
+        """Drop records that no longer take part (e.g. decided applications)"""
+        ids = list(ids)
+        with db.transaction() as cursor:
+            cursor.executemany(
+                "DELETE FROM dedup_keys WHERE record_type = ? AND record_id = ?",
+                [(record_type, record_id) for record_id in ids]
+            )
+            for column in ('a', 'b'):
+                cursor.executemany(f'''
+                    DELETE FROM duplicate_candidates
+                    WHERE record_type_{column} = ? AND record_id_{column} = ? AND status = 'open'
+                ''', [(record_type, record_id) for record_id in ids])
+
+    def rebuild(self):
+        """Full batch scan: rebuild the blocking index and all open candidates"""
+        records = self._load(RECORD_STUDENT) + self._load(RECORD_APPLICATION)
+        blocks = {}
+        key_rows = []
+        for r in records:
+            for key in r.block_keys():
+                blocks.setdefault(key, []).append(r)
+                key_rows.append((r.record_type, r.record_id, key))
+
+        compared = set()
+        rows = []
+        for members in blocks.values():
+            if len(members) < 2 or len(members) > MAX_BLOCK_SIZE:
+                continue
+            for a, b in combinations(members, 2):
+                if not self._is_pair(a, b):
+                    continue
+                row = self._candidate_row(a, b, 0)
+                if row[:4] in compared:
+                    continue
+                compared.add(row[:4])
+                score = self._matches(a, b)
+                if score is not None:
+                    rows.append(row[:4] + (score,))
+
+        with db.transaction() as cursor:
+            cursor.execute("DELETE FROM dedup_keys")
+            db.bulk_insert('dedup_keys', ['record_type', 'record_id', 'block_key'], key_rows, cursor)
+            cursor.execute("DELETE FROM duplicate_candidates WHERE status = 'open'")
+            # Reviewed pairs keep their decision
+            cursor.executemany('''
+                INSERT OR IGNORE INTO duplicate_candidates
+                (record_type_a, record_id_a, record_type_b, record_id_b, score)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+        return {'records': len(records), 'comparisons': len(compared), 'candidates': len(rows)}
+
+    def find_matches(self, name, date_of_birth=None, parent_phone=None):
+        """Existing records matching details not yet saved, best first"""
+        probe = Record(None, None, name, date_of_birth, parent_phone)
+        keys = sorted(probe.block_keys())
+        if not keys:
+            return []
+        found = {RECORD_STUDENT: set(), RECORD_APPLICATION: set()}
+        for row in db.fetch_all(f'''
+            SELECT record_type, record_id FROM dedup_keys
+            WHERE block_key IN ({', '.join('?' for _ in keys)})
+        ''', keys):
+            found[row['record_type']].add(row['record_id'])
+
+        matches = []
+        for record_type, ids in found.items():
+            for r in self._load(record_type, ids) if ids else []:
+                score = self._matches(probe, r)
+                if score is not None:
+                    matches.append((record_type, r.record_id, score))
+        return sorted(matches, key=lambda m: -m[2])
+
+    def get_candidates(self, status='open', limit=200):
+        return db.get_dataframe('''
+            SELECT d.id, d.score,
+                   d.record_type_a, d.record_id_a,
+                   COALESCE(sa.full_name, aa.student_name) as name_a,
+                   COALESCE(sa.date_of_birth, aa.date_of_birth) as dob_a,
+                   COALESCE(sa.student_id, aa.application_id) as reference_a,
+                   d.record_type_b, d.record_id_b,
+                   COALESCE(sb.full_name, ab.student_name) as name_b,
+                   COALESCE(sb.date_of_birth, ab.date_of_birth) as dob_b,
+                   COALESCE(sb.student_id, ab.application_id) as reference_b
+            FROM duplicate_candidates d
+            LEFT JOIN students sa ON d.record_type_a = 'student' AND sa.id = d.record_id_a
+            LEFT JOIN admission_applications aa ON d.record_type_a = 'application' AND aa.id = d.record_id_a
+            LEFT JOIN students sb ON d.record_type_b = 'student' AND sb.id = d.record_id_b
+            LEFT JOIN admission_applications ab ON d.record_type_b = 'application' AND ab.id = d.record_id_b
+            WHERE d.status = ?
+            ORDER BY d.score DESC
+            LIMIT ?
+        ''', (status, limit))
+
+    def set_candidate_status(self, candidate_ids, status, reviewed_by=None):
+        db.execute_many(
+            "UPDATE duplicate_candidates SET status = ?, reviewed_by = ? WHERE id = ?",
+            [(status, reviewed_by, candidate_id) for candidate_id in candidate_ids]
+        )
+
+
+# Global engine
+dedup_engine = DedupEngine()
+
+if __name__ == "__main__":
+    # Full batch scan, e.g. nightly
+    print(dedup_engine.rebuild())
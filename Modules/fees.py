@@ -4,6 +4,15 @@ import pandas as pd
 import plotly.express as px
 from datetime import datetime, date, timedelta
 from database import db
+from modules.report_jobs import report_jobs
+from modules.reports import show_report_job
+
+FEE_REPORTS = {
+    "Collection Summary": 'fees_collection_summary',
+    "Fee Type Analysis": 'fees_type_analysis',
+    "Class-wise Collection": 'fees_class_collection',
+    "Overdue Report": 'fees_overdue'
+}
 
 def show_fees(translator, auth):
     """Display fees management"""
@@ -270,49 +279,35 @@ def show_fees(translator, auth):
         with col2:
             report_type = st.selectbox(
                 "Report Type",
-                ["Collection Summary", "Fee Type Analysis", "Class-wise Collection", "Overdue Report"]
+                list(FEE_REPORTS)
             )
         
         if st.button("Generate Report"):
-            if report_type == "Collection Summary":
-                report_df = db.get_dataframe('''
-                    SELECT 
-                        DATE(payment_date) as payment_date,
-                        COUNT(*) as transactions,
-                        SUM(paid_amount) as total_collected,
-                        AVG(paid_amount) as avg_payment
-                    FROM fees
-                    WHERE payment_date BETWEEN ? AND ?
-                        AND status IN ('Paid', 'Partial')
-                    GROUP BY DATE(payment_date)
-                    ORDER BY payment_date
-                ''', (start_date, end_date))
+            # The report runs in the background; this page only polls it
+            st.session_state.fees_report_job = (report_type, report_jobs.enqueue(
+                FEE_REPORTS[report_type],
+                {'start_date': start_date, 'end_date': end_date},
+                requested_by=auth.get_current_user()['id']
+            ))
+        
+        if 'fees_report_job' in st.session_state:
+            job_report_type, job_id = st.session_state.fees_report_job
+            report_df = show_report_job(job_id)
+            
+            if report_df is not None and not report_df.empty:
+                st.dataframe(report_df, use_container_width=True)
                 
-                if not report_df.empty:
-                    st.dataframe(report_df, use_container_width=True)
-                    
-                    # Chart
+                if job_report_type == "Collection Summary":
                     fig = px.line(report_df, x='payment_date', y='total_collected',
                                  title='Daily Fee Collection')
                     st.plotly_chart(fig, use_container_width=True)
-            
-            elif report_type == "Fee Type Analysis":
-                report_df = db.get_dataframe('''
-                    SELECT 
-                        fee_type,
-                        COUNT(*) as count,
-                        SUM(amount) as total_amount,
-                        SUM(paid_amount) as total_paid,
-                        SUM(amount - paid_amount) as total_due
-                    FROM fees
-                    WHERE due_date BETWEEN ? AND ?
-                    GROUP BY fee_type
-                    ORDER BY total_amount DESC
-                ''', (start_date, end_date))
-                
-                if not report_df.empty:
-                    st.dataframe(report_df, use_container_width=True)
-                    
+                elif job_report_type == "Fee Type Analysis":
                     fig = px.pie(report_df, values='total_amount', names='fee_type',
                                 title='Fee Distribution by Type')
-                    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+                    st.plotly_chart(fig, use_container_width=True)
+                elif job_report_type == "Class-wise Collection":
+                    fig = px.bar(report_df, x='class_name', y=['total_paid', 'total_due'],
+                                title='Collection by Class')
+                    st.plotly_chart(fig, use_container_width=True)
+            elif report_df is not None:
+                st.info("No data found for the selected period")
@@ -0,0 +1,75 @@
+# modules/grading.py
+from datetime import date
+import numpy as np
+from database import db
+
+# Used when no grading_system rows exist; matches the results entry form
+DEFAULT_SCALE = [
+    ('A+', 90, 100, 4.0),
+    ('A', 80, 90, 3.7),
+    ('B', 70, 80, 3.0),
+    ('C', 60, 70, 2.0),
+    ('D', 50, 60, 1.0),
+    ('E', 40, 50, 0.5),
+    ('F', 0, 40, 0.0)
+]
+
+
+def current_academic_year(on_date=None):
+    """Academic year of the latest term started by on_date, if any"""
+    row = db.fetch_one('''
+        SELECT academic_year FROM academic_terms
+        WHERE start_date <= ? AND academic_year IS NOT NULL
+        ORDER BY start_date DESC LIMIT 1
+    ''', ((on_date or date.today()).isoformat(),))
+    return row['academic_year'] if row else None
+
+
+def load_scale(academic_year=None):
+    """Grading bands of one academic year as (grade, min, max, grade_point), highest first.
+
+    Without academic_year the current year is used. A year with no bands
+    of its own falls back to the bands saved without a year, then to the
+    latest year that has bands, then to DEFAULT_SCALE.
+    """
+    rows = db.fetch_all('''
+        SELECT grade, min_percentage, max_percentage, grade_point, academic_year
+        FROM grading_system
+        ORDER BY min_percentage DESC
+    ''')
+    if not rows:
+        return list(DEFAULT_SCALE)
+
+    academic_year = academic_year or current_academic_year()
+    years = {r['academic_year'] or None for r in rows}
+    if academic_year not in years:
+        academic_year = None if None in years else max(years)
+    return [
+        (r['grade'], r['min_percentage'], r['max_percentage'], r['grade_point'] or 0.0)
+        for r in rows if (r['academic_year'] or None) == academic_year
+    ]
+
+
+def grade_percentages(percentages, scale=None):
+    """Vectorized (grades, grade_points) arrays for an array of percentages.
+
+    A percentage outside every band gets no grade (None) and 0 points.
+    Bands entered as whole numbers (80-89, 90-100) leave gaps under one
+    point; a value in such a gap takes the lower band.
+    """
+    scale = sorted(scale or load_scale(), key=lambda band: band[1])
+    mins = np.array([band[1] for band in scale], dtype=float)
+    maxs = np.array([band[2] for band in scale], dtype=float)
+    # Upper limit of each band, reaching up to the next band across a gap under one point
+    limits = maxs.copy()
+    for k in range(len(scale) - 1):
+        if maxs[k] < mins[k + 1] <= maxs[k] + 1:
+            limits[k] = np.nextafter(mins[k + 1], -np.inf)
+    values = np.nan_to_num(np.asarray(percentages, dtype=float), nan=0.0)
+    # Index of the highest band whose minimum is at or below the percentage
+    positions = np.searchsorted(mins, values, side='right') - 1
+    clipped = np.clip(positions, 0, len(scale) - 1)
+    matched = (positions >= 0) & (values <= limits[clipped])
+    grades = np.where(matched, np.array([band[0] for band in scale], dtype=object)[clipped], None)
+    points = np.where(matched, np.array([band[3] for band in scale], dtype=float)[clipped], 0.0)
+    return grades, points
@@ -0,0 +1,117 @@
+# modules/id_allocator.py
+import threading
+from datetime import datetime
+from database import db
+from tenancy import TenantScoped
+
+PREFIXES = ('ADM', 'STU', 'TCH', 'APP')
+BLOCK_SIZE = 20
+NUMBER_WIDTH = 5
+
+# Columns already holding IDs of each prefix; a new sequence starts above
+# the highest number found there so it never reissues an existing ID
+SEED_SOURCES = {
+    'ADM': [('students', 'admission_number')],
+    'STU': [('students', 'student_id')],
+    'TCH': [('teachers', 'teacher_id')],
+    'APP': [('admission_applications', 'application_id')]
+}
+
+
+# Reservations share the global connection, so they are serialized across
+# allocator instances as well as threads
+_reserve_lock = threading.Lock()
+
+
+def format_id(prefix, year, number):
+    return f"{prefix}-{year}-{number:0{NUMBER_WIDTH}d}"
+
+
+class IdAllocator:
+    """Sequential IDs such as STU-2025-00042 from the id_sequences table.
+
+    Numbers are reserved in blocks with one UPDATE and handed out from an
+    in-process cache, so most IDs need no query. Numbers left in a block
+    when the process stops are skipped; IDs stay unique but may have gaps.
+    """
+
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks = {}
+
+    def _seed(self, cursor, prefix, year):
+        """First number for a new sequence"""
+        pattern = f"{prefix}-{year}-"
+        highest = 0
+        for table, column in SEED_SOURCES.get(prefix, []):
+            if column not in [name for name, _ in db.dialect.table_columns(cursor, table)]:
+                continue
+            cursor.execute(f'''
+                SELECT MAX(CAST(substr({column}, ?) AS INTEGER)) FROM {table}
+                WHERE {column} LIKE ? || '%'
+            ''', (len(pattern) + 1, pattern))
+            highest = max(highest, cursor.fetchone()[0] or 0)
+        return highest + 1
+
+    def _reserve(self, prefix, year, count):
+        """Reserve count numbers in one transaction; returns the first"""
+        if prefix not in PREFIXES:
+            raise ValueError(f"Unknown ID prefix: {prefix}")
+        with _reserve_lock, db.transaction() as cursor:
+            cursor.execute(
+                "SELECT next_value FROM id_sequences WHERE prefix = ? AND year = ?", (prefix, year)
+            )
+            if cursor.fetchone() is None:
+                cursor.execute('''
+                    INSERT OR IGNORE INTO id_sequences (prefix, year, next_value) VALUES (?, ?, ?)
+                ''', (prefix, year, self._seed(cursor, prefix, year)))
+            cursor.execute('''
+                UPDATE id_sequences SET next_value = next_value + ?, updated_at = CURRENT_TIMESTAMP
+                WHERE prefix = ? AND year = ?
+            ''', (count, prefix, year))
+            cursor.execute(
+                "SELECT next_value FROM id_sequences WHERE prefix = ? AND year = ?", (prefix, year)
+            )
+            return cursor.fetchone()[0] - count
+
+    def next_id(self, prefix, year=None):
+        """One new ID, from the cached block when possible"""
+        year = year or datetime.now().year
+        key = (prefix, year)
+        with self._lock:
+            block = self._blocks.get(key)
+            if not block or block[0] >= block[1]:
+                first = self._reserve(prefix, year, self.block_size)
+                block = self._blocks[key] = [first, first + self.block_size]
+            number = block[0]
+            block[0] += 1
+        return format_id(prefix, year, number)
+
+    def allocate(self, prefix, count, year=None):
+        """count new IDs reserved with a single update, e.g. for bulk imports"""
+        if count <= 0:
+            return []
+        year = year or datetime.now().year
+        with self._lock:
+            first = self._reserve(prefix, year, count)
+        return [format_id(prefix, year, number) for number in range(first, first + count)]
+
+    def peek(self, prefix, year=None):
+        """The ID next_id would probably return; for display only"""
+        year = year or datetime.now().year
+        with self._lock:
+            block = self._blocks.get((prefix, year))
+            if block and block[0] < block[1]:
+                return format_id(prefix, year, block[0])
+        row = db.fetch_one(
+            "SELECT next_value FROM id_sequences WHERE prefix = ? AND year = ?", (prefix, year)
+        )
+        if row:
+            return format_id(prefix, year, row['next_value'])
+        with db.transaction() as cursor:
+            return format_id(prefix, year, self._seed(cursor, prefix, year))
+
+
+# Global allocator, one per tenant
+id_allocator = TenantScoped(IdAllocator)
@@ -0,0 +1,366 @@
+# modules/parquet_archive.py
+import bisect
+import glob
+import os
+import shutil
+from urllib.parse import quote, unquote
+from datetime import datetime
+import pandas as pd
+from database import db
+from tenancy import TenantScoped, tenant_path
+from modules.school_calendar import to_date
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+ARCHIVE_DIR = "archive"
+CHUNK_SIZE = 20000
+# Partitions with more part files than this are rewritten as one file
+COMPACT_AFTER = 32
+# Used for dates outside every academic term
+ACADEMIC_YEAR_START_MONTH = 9
+UNKNOWN = 'unknown'
+
+# Archived tables and the date column that places a row in a partition
+ARCHIVE_TABLES = {
+    'attendance': 'date',
+    'results': 'exam_date',
+    'fees': 'due_date'
+}
+
+
+def _arrow_type(declared):
+    declared = (declared or '').upper()
+    if declared == 'DATE':
+        return pa.date32()
+    if 'INT' in declared or declared == 'BOOLEAN':
+        return pa.int64()
+    if any(t in declared for t in ('REAL', 'FLOA', 'DOUB', 'NUMERIC')):
+        return pa.float64()
+    return pa.string()
+
+
+def _parse_date(value, cache):
+    if value is None or value == '':
+        return None
+    if value not in cache:
+        try:
+            cache[value] = to_date(value)
+        except ValueError:
+            cache[value] = None
+    return cache[value]
+
+
+class ParquetArchive:
+    """Columnar snapshots of attendance, results and fees.
+
+    Files are laid out as
+        archive/<table>/academic_year=<year>/month=<YYYY-MM>/part-<first id>-<last id>.parquet
+    so readers can prune partitions from the directory names and columns
+    from the file format, without touching the live database.
+
+    export() appends rows above each table's id watermark. Triggers record
+    the months of updated or deleted rows in archive_dirty, and those
+    months are rewritten from the database on the next export.
+    """
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self._schemas = {}
+
+    def _require(self):
+        if not PARQUET_AVAILABLE:
+            raise RuntimeError("pyarrow is required for the Parquet archive")
+
+    def _schema(self, table):
+        if table not in self._schemas:
+            self._schemas[table] = pa.schema([
+                (name, _arrow_type(declared)) for name, declared in db.table_columns(table)
+            ])
+        return self._schemas[table]
+
+    def _academic_year_lookup(self):
+        """Function mapping a date to its academic year label"""
+        terms = [
+            (to_date(t['start_date']), to_date(t['end_date']), t['academic_year'])
+            for t in db.fetch_all('''
+                SELECT start_date, end_date, academic_year FROM academic_terms
+                WHERE academic_year IS NOT NULL AND academic_year != ''
+                ORDER BY start_date
+            ''')
+        ]
+        starts = [t[0] for t in terms]
+        cache = {}
+
+        def academic_year(d):
+            if d is None:
+                return UNKNOWN
+            if d not in cache:
+                i = bisect.bisect_right(starts, d) - 1
+                if i >= 0 and d <= terms[i][1]:
+                    cache[d] = terms[i][2]
+                else:
+                    year = d.year if d.month >= ACADEMIC_YEAR_START_MONTH else d.year - 1
+                    cache[d] = f"{year}-{year + 1}"
+            return cache[d]
+
+        return academic_year
+
+    def _partition_dir(self, table, academic_year, month):
+        # Values are URI-encoded so labels such as 2023/24 stay one directory
+        return os.path.join(self.root, table, f"academic_year={quote(academic_year, safe='')}", f"month={month}")
+
+    def _write(self, table, academic_year, month, rows, name):
+        """Write rows to one file in a partition, visible only once complete"""
+        schema = self._schema(table)
+        columns = list(zip(*rows))
+        arrays = [pa.array(list(values), type=field.type) for field, values in zip(schema, columns)]
+        directory = self._partition_dir(table, academic_year, month)
+        os.makedirs(directory, exist_ok=True)
+        # Names starting with '_' are skipped by dataset discovery
+        temp_path = os.path.join(directory, f"_{name}")
+        pq.write_table(pa.Table.from_arrays(arrays, schema=schema), temp_path)
+        os.replace(temp_path, os.path.join(directory, name))
+
+    def _export_rows(self, table, query, params, name_for):
+        """Stream rows ordered by date into partition files; returns the row count"""
+        schema = self._schema(table)
+        date_column = ARCHIVE_TABLES[table]
+        date_positions = [i for i, field in enumerate(schema) if field.type == pa.date32()]
+        date_index = schema.get_field_index(date_column)
+        academic_year = self._academic_year_lookup()
+        parsed_dates = {}
+
+        buffers = {}
+        current_month = None
+        count = 0
+
+        def flush():
+            for (year, month), rows in buffers.items():
+                self._write(table, year, month, rows, name_for(rows))
+            buffers.clear()
+
+        # The tenant's database must stay open until the last row is read
+        with db.lease() as database:
+            cursor = database.stream_cursor(chunk_size=CHUNK_SIZE)
+            cursor.execute(query, params)
+            while True:
+                chunk = cursor.fetchmany(CHUNK_SIZE)
+                if not chunk:
+                    break
+                for row in chunk:
+                    row = list(row)
+                    for i in date_positions:
+                        row[i] = _parse_date(row[i], parsed_dates)
+                    d = row[date_index]
+                    month = d.strftime('%Y-%m') if d else UNKNOWN
+                    if month != current_month:
+                        # Rows arrive in date order, so a finished month is never revisited
+                        flush()
+                        current_month = month
+                    buffers.setdefault((academic_year(d), month), []).append(row)
+                count += len(chunk)
+            flush()
+            cursor.close()
+        return count
+
+    def _part_files(self, table, month='*'):
+        return glob.glob(os.path.join(self.root, table, 'academic_year=*', f"month={month}", 'part-*.parquet'))
+
+    def _month_bounds(self, month):
+        start = datetime.strptime(month, '%Y-%m').date()
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+        return start.isoformat(), end.isoformat()
+
+    def _rewrite_months(self, table, months, max_id):
+        """Replace the partitions of the given months with fresh copies from the database"""
+        date_column = ARCHIVE_TABLES[table]
+        written = 0
+        for month in sorted(months):
+            for path in glob.glob(os.path.join(self.root, table, 'academic_year=*', f"month={month}")):
+                shutil.rmtree(path)
+            if month == UNKNOWN:
+                where, params = f"{date_column} IS NULL", [max_id]
+            else:
+                start, end = self._month_bounds(month)
+                where, params = f"{date_column} >= ? AND {date_column} < ?", [start, end, max_id]
+            written += self._export_rows(
+                table,
+                f"SELECT * FROM {table} WHERE {where} AND id <= ? ORDER BY {date_column}, id",
+                params,
+                lambda rows: f"part-0-{max_id}.parquet"
+            )
+        return written
+
+    def export_table(self, table):
+        """Bring one table's archive up to date; returns (appended, rewritten) row counts"""
+        self._require()
+        date_column = ARCHIVE_TABLES[table]
+        watermark = db.fetch_one("SELECT last_id FROM archive_watermarks WHERE table_name = ?", (table,))
+        last_id = watermark['last_id'] if watermark else 0
+        if not os.path.isdir(os.path.join(self.root, table)):
+            # Archive moved or deleted: export everything again
+            last_id = 0
+
+        # Part files past the watermark come from an interrupted export
+        for path in self._part_files(table):
+            first_id = int(os.path.basename(path).split('-')[1])
+            if first_id > last_id:
+                os.remove(path)
+
+        latest = db.fetch_one(f"SELECT MAX(id) as max_id, MAX(created_at) as created_at FROM {table}")
+        max_id = latest['max_id'] or 0
+        dirty_mark = db.fetch_one(
+            "SELECT MAX(id) as max_id FROM archive_dirty WHERE table_name = ?", (table,)
+        )['max_id'] or 0
+
+        appended = 0
+        if max_id > last_id:
+            appended = self._export_rows(
+                table,
+                f"SELECT * FROM {table} WHERE id > ? AND id <= ? ORDER BY {date_column}, id",
+                (last_id, max_id),
+                lambda rows: f"part-{min(r[0] for r in rows)}-{max(r[0] for r in rows)}.parquet"
+            )
+
+        months = {
+            r['month'] for r in db.fetch_all(
+                "SELECT DISTINCT month FROM archive_dirty WHERE table_name = ? AND id <= ?", (table, dirty_mark)
+            )
+        }
+        # Partitions fragmented by many small appends are compacted
+        file_counts = {}
+        for path in self._part_files(table):
+            month = os.path.basename(os.path.dirname(path)).split('=', 1)[1]
+            file_counts[month] = file_counts.get(month, 0) + 1
+        months.update(month for month, files in file_counts.items() if files > COMPACT_AFTER)
+
+        rewritten = self._rewrite_months(table, months, max_id) if months else 0
+
+        with db.transaction() as cursor:
+            cursor.execute("DELETE FROM archive_dirty WHERE table_name = ? AND id <= ?", (table, dirty_mark))
+            cursor.execute('''
+                INSERT INTO archive_watermarks (table_name, last_id, last_created_at, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(table_name) DO UPDATE SET
+                    last_id = excluded.last_id,
+                    last_created_at = excluded.last_created_at,
+                    updated_at = excluded.updated_at
+            ''', (table, max_id, latest['created_at'], datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        return appended, rewritten
+
+    def export(self, tables=None):
+        """Update the archive for the given tables (all by default)"""
+        return {table: self.export_table(table) for table in (tables or ARCHIVE_TABLES)}
+
+    def status(self):
+        return db.get_dataframe('''
+            SELECT w.table_name, w.last_id, w.last_created_at, w.updated_at,
+                   (SELECT COUNT(DISTINCT month) FROM archive_dirty d
+                    WHERE d.table_name = w.table_name) as changed_months
+            FROM archive_watermarks w
+            ORDER BY w.table_name
+        ''')
+
+    # Reading
+
+    def dataset(self, table):
+        """pyarrow dataset over a table's archive, with the partition columns"""
+        self._require()
+        if table not in ARCHIVE_TABLES:
+            raise ValueError(f"Table is not archived: {table}")
+        path = os.path.join(self.root, table)
+        if not os.path.isdir(path):
+            return None
+        partitioning = ds.partitioning(
+            pa.schema([('academic_year', pa.string()), ('month', pa.string())]), flavor='hive'
+        )
+        return ds.dataset(path, format='parquet', partitioning=partitioning, schema=self._dataset_schema(table))
+
+    def _dataset_schema(self, table):
+        return pa.schema(list(self._schema(table)) + [
+            pa.field('academic_year', pa.string()), pa.field('month', pa.string())
+        ])
+
+    def read(self, table, columns=None, filters=None, academic_years=None):
+        """Archived rows as a DataFrame.
+
+        columns limits the columns read from disk; filters uses pyarrow's
+        [(column, op, value), ...] form and is pushed down to partition
+        pruning and row group statistics.
+        """
+        dataset = self.dataset(table)
+        if dataset is None:
+            return pd.DataFrame(columns=columns or [])
+
+        filters = list(filters or [])
+        if academic_years:
+            filters.append(('academic_year', 'in', list(academic_years)))
+        expression = pq.filters_to_expression(filters) if filters else None
+        return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+    def academic_years(self, table):
+        """Academic years present in a table's archive"""
+        path = os.path.join(self.root, table)
+        if not os.path.isdir(path):
+            return []
+        return sorted(
+            unquote(name.split('=', 1)[1]) for name in os.listdir(path)
+            if name.startswith('academic_year=') and not name.endswith(f"={UNKNOWN}")
+        )
+
+    # Year-over-year reports, read from the archive only
+
+    def attendance_by_year(self, class_id=None):
+        filters = [('class_id', '=', class_id)] if class_id else None
+        df = self.read('attendance', columns=['academic_year', 'status'], filters=filters)
+        if df.empty:
+            return df
+        report = df.groupby(['academic_year', 'status']).size().unstack(fill_value=0)
+        report['total'] = report.sum(axis=1)
+        present = report['Present'] if 'Present' in report else 0
+        report['attendance_rate'] = (present * 100.0 / report['total']).round(2)
+        return report.reset_index()
+
+    def results_by_year(self, class_id=None, pass_mark=40.0):
+        filters = [('class_id', '=', class_id)] if class_id else None
+        df = self.read('results', columns=['academic_year', 'exam_type', 'percentage', 'student_id'], filters=filters)
+        if df.empty:
+            return df
+        df['passed'] = df['percentage'] >= pass_mark
+        report = df.groupby(['academic_year', 'exam_type']).agg(
+            students=('student_id', 'nunique'),
+            results=('percentage', 'count'),
+            average=('percentage', 'mean'),
+            pass_rate=('passed', 'mean')
+        ).reset_index()
+        report['average'] = report['average'].round(2)
+        report['pass_rate'] = (report['pass_rate'] * 100).round(2)
+        return report
+
+    def fees_by_year(self):
+        df = self.read('fees', columns=['academic_year', 'fee_type', 'amount', 'paid_amount'])
+        if df.empty:
+            return df
+        report = df.groupby(['academic_year', 'fee_type']).agg(
+            fees=('amount', 'count'),
+            total_amount=('amount', 'sum'),
+            total_paid=('paid_amount', 'sum')
+        ).reset_index()
+        report['total_due'] = report['total_amount'] - report['total_paid']
+        report['collection_rate'] = (report['total_paid'] * 100.0 / report['total_amount']).round(2)
+        return report
+
+
+# Global archive instance, one per tenant
+parquet_archive = TenantScoped(lambda: ParquetArchive(tenant_path(ARCHIVE_DIR)))
+
+if __name__ == "__main__":
+    # Nightly export, e.g. from cron
+    for table, (appended, rewritten) in parquet_archive.export().items():
+        print(f"{table}: {appended} rows appended, {rewritten} rows rewritten")
@@ -0,0 +1,131 @@
+# modules/permissions.py
+import threading
+from collections import namedtuple
+from database import db
+from tenancy import TenantScoped
+
+# A user's permission bitset as kept in the session
+CompiledPermissions = namedtuple('CompiledPermissions', ['user_id', 'version', 'mask', 'role'])
+
+
+class PermissionRegistry:
+    """Roles, permissions and per-user grants compiled into bitsets.
+
+    Every permission has a fixed bit (permissions.bit). A user's mask is
+    their role's permissions plus their own grants minus their revocations,
+    so a permission check is a single bit test. Compiled masks carry a
+    version: changing a user's role or grants bumps that user's version and
+    editing a role bumps the generation, which tells sessions holding an
+    older mask to compile it again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bits = None
+        self._role_masks = None
+        self._generation = 0
+        self._user_versions = {}
+
+    def _load(self):
+        bits = {row['code']: row['bit'] for row in db.fetch_all("SELECT code, bit FROM permissions")}
+        role_masks = {row['name']: 0 for row in db.fetch_all("SELECT name FROM roles")}
+        for row in db.fetch_all("SELECT role, permission FROM role_permissions"):
+            if row['permission'] in bits:
+                role_masks[row['role']] = role_masks.get(row['role'], 0) | (1 << bits[row['permission']])
+        self._bits, self._role_masks = bits, role_masks
+
+    def _catalog(self):
+        with self._lock:
+            if self._bits is None:
+                self._load()
+            return self._bits, self._role_masks
+
+    def bit(self, code):
+        """Bit of a permission, None for an unknown one"""
+        return self._catalog()[0].get(code)
+
+    def version(self, user_id):
+        return self._generation, self._user_versions.get(user_id, 0)
+
+    def compile(self, user_id):
+        """CompiledPermissions for a user; inactive and unknown users get no permissions"""
+        version = self.version(user_id)
+        user = db.fetch_one("SELECT role, is_active FROM users WHERE id = ?", (user_id,))
+        if not user or not user['is_active']:
+            return CompiledPermissions(user_id, version, 0, user['role'] if user else None)
+
+        bits, role_masks = self._catalog()
+        mask = role_masks.get(user['role'], 0)
+        for row in db.fetch_all("SELECT permission, granted FROM user_permissions WHERE user_id = ?", (user_id,)):
+            bit = bits.get(row['permission'])
+            if bit is None:
+                continue
+            if row['granted']:
+                mask |= 1 << bit
+            else:
+                mask &= ~(1 << bit)
+        return CompiledPermissions(user_id, version, mask, user['role'])
+
+    def allows(self, mask, code):
+        bit = self.bit(code)
+        return bit is not None and bool(mask >> bit & 1)
+
+    def names(self, mask):
+        """Permission codes set in mask"""
+        return sorted(code for code, bit in self._catalog()[0].items() if mask >> bit & 1)
+
+    def invalidate_user(self, user_id):
+        """Recompile this user's mask on their next check, e.g. after a role change"""
+        with self._lock:
+            self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+
+    def invalidate_all(self):
+        """Reload roles and recompile every mask, e.g. after a role is edited"""
+        with self._lock:
+            self._bits = None
+            self._role_masks = None
+            self._generation += 1
+
+    def get_permissions(self):
+        return db.fetch_all("SELECT code, description FROM permissions ORDER BY bit")
+
+    def get_roles(self):
+        return db.fetch_all("SELECT name, level, description FROM roles ORDER BY level DESC, name")
+
+    def role_permissions(self, role):
+        return [row['permission'] for row in db.fetch_all(
+            "SELECT permission FROM role_permissions WHERE role = ? ORDER BY permission", (role,)
+        )]
+
+    def set_role_permissions(self, role, permissions):
+        """Replace a role's permissions (creating the role if needed)"""
+        with db.transaction() as cursor:
+            cursor.execute("SELECT name FROM roles WHERE name = ?", (role,))
+            if cursor.fetchone() is None:
+                cursor.execute("INSERT INTO roles (name, level) VALUES (?, 0)", (role,))
+            cursor.execute("DELETE FROM role_permissions WHERE role = ?", (role,))
+            cursor.executemany(
+                "INSERT INTO role_permissions (role, permission) VALUES (?, ?)",
+                [(role, permission) for permission in permissions]
+            )
+        self.invalidate_all()
+
+    def user_overrides(self, user_id):
+        """{permission: granted} set for this user on top of their role"""
+        return {row['permission']: bool(row['granted']) for row in db.fetch_all(
+            "SELECT permission, granted FROM user_permissions WHERE user_id = ?", (user_id,)
+        )}
+
+    def set_user_overrides(self, user_id, overrides):
+        """Replace the user's grants (True) and revocations (False)"""
+        with db.transaction() as cursor:
+            cursor.execute("DELETE FROM user_permissions WHERE user_id = ?", (user_id,))
+            cursor.executemany(
+                "INSERT INTO user_permissions (user_id, permission, granted) VALUES (?, ?, ?)",
+                [(user_id, permission, 1 if granted else 0) for permission, granted in overrides.items()]
+            )
+        self.invalidate_user(user_id)
+
+
+# Global registry, one per tenant
+permission_registry = TenantScoped(PermissionRegistry)
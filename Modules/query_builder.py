@@ -0,0 +1,295 @@
+# modules/query_builder.py
+import threading
+from collections import OrderedDict
+from sqlalchemy import inspect
+from database import db
+from tenancy import TenantScoped
+
+# Tables offered to the custom report generator
+REPORT_TABLES = ["students", "teachers", "attendance", "fees", "results", "classes", "subjects"]
+# (column, table, column) links declared in database.py, for backends whose
+# schema does not carry them (foreign keys are dropped on PostgreSQL)
+REPORT_FOREIGN_KEYS = {
+    "students": [("class_id", "classes", "id")],
+    "attendance": [("student_id", "students", "id"), ("class_id", "classes", "id")],
+    "fees": [("student_id", "students", "id")],
+    "results": [("student_id", "students", "id"), ("class_id", "classes", "id"), ("subject_id", "subjects", "id")],
+    "classes": [("class_teacher_id", "teachers", "id")],
+    "subjects": [("class_id", "classes", "id"), ("teacher_id", "teachers", "id")]
+}
+
+OPERATORS = ["equals", "range", "in", "prefix"]
+SORT_ORDERS = ["ASC", "DESC"]
+PLAN_CACHE_SIZE = 256
+
+
+class QueryBuilderError(ValueError):
+    """Raised for report specs that reference unknown tables, columns or operators"""
+
+
+class SchemaCatalog:
+    """Tables, column types, foreign keys and indexed columns, loaded once"""
+
+    def __init__(self, tables=None):
+        self.allowed_tables = tables or REPORT_TABLES
+        self._lock = threading.Lock()
+        self._schema = None
+
+    def invalidate(self):
+        with self._lock:
+            self._schema = None
+
+    def _load(self):
+        with self._lock:
+            if self._schema is not None:
+                return self._schema
+
+            inspector = inspect(db.backend.engine)
+            existing = set(inspector.get_table_names())
+            schema = {}
+            for table in self.allowed_tables:
+                if table not in existing:
+                    continue
+                columns = OrderedDict(
+                    (c['name'], str(c['type']).upper() or 'TEXT')
+                    for c in inspector.get_columns(table)
+                )
+                foreign_keys = [
+                    (fk['constrained_columns'][0], fk['referred_table'], (fk['referred_columns'] or ['id'])[0])
+                    for fk in inspector.get_foreign_keys(table)
+                    if fk['referred_table'] in self.allowed_tables
+                ] or [
+                    fk for fk in REPORT_FOREIGN_KEYS.get(table, [])
+                    if fk[0] in columns and fk[1] in self.allowed_tables
+                ]
+                # Leading index columns can serve equality, range and prefix filters
+                indexed = {'id'}
+                indexed.update(
+                    index['column_names'][0] for index in inspector.get_indexes(table)
+                    if index['column_names'] and index['column_names'][0]
+                )
+                indexed.update(
+                    constraint['column_names'][0] for constraint in inspector.get_unique_constraints(table)
+                    if constraint['column_names']
+                )
+                schema[table] = {'columns': columns, 'foreign_keys': foreign_keys, 'indexed': indexed}
+
+            self._schema = schema
+            return schema
+
+    def tables(self):
+        return list(self._load().keys())
+
+    def columns(self, table):
+        return list(self.table(table)['columns'].keys())
+
+    def table(self, table):
+        schema = self._load()
+        if table not in schema:
+            raise QueryBuilderError(f"Unknown table: {table}")
+        return schema[table]
+
+    def column_type(self, ref):
+        table, column = self.split(ref)
+        return self.table(table)['columns'][column]
+
+    def is_indexed(self, ref):
+        table, column = self.split(ref)
+        return column in self.table(table)['indexed']
+
+    def split(self, ref):
+        """Validate a 'table.column' reference and return its parts"""
+        if ref.count('.') != 1:
+            raise QueryBuilderError(f"Column must be written as table.column: {ref}")
+        table, column = ref.split('.')
+        if column not in self.table(table)['columns']:
+            raise QueryBuilderError(f"Unknown column: {ref}")
+        return table, column
+
+    def join_condition(self, left, right):
+        """ON clause linking two tables through a foreign key in either direction"""
+        for column, target, target_column in self.table(left)['foreign_keys']:
+            if target == right:
+                return f"{left}.{column} = {right}.{target_column}"
+        for column, target, target_column in self.table(right)['foreign_keys']:
+            if target == left:
+                return f"{right}.{column} = {left}.{target_column}"
+        return None
+
+    def related_tables(self, table):
+        """Tables that can be joined directly to table"""
+        return [t for t in self.tables() if t != table and self.join_condition(table, t)]
+
+
+def _coerce(value, column_type):
+    """Convert user input to the column's storage type so comparisons match"""
+    if value is None or value == '':
+        return None
+    if 'INT' in column_type:
+        return int(float(value))
+    if any(t in column_type for t in ('REAL', 'FLOA', 'DOUB', 'NUMERIC')):
+        return float(value)
+    if isinstance(value, (int, float)) and column_type == 'BOOLEAN':
+        return int(value)
+    return str(value)
+
+
+def _prefix_upper_bound(prefix):
+    """Smallest string greater than every string starting with prefix"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class QueryBuilder:
+    """Compiles report specs into parameterized SQL.
+
+    A spec is a dict:
+        table:    base table
+        joins:    related tables joined through foreign keys
+        columns:  ['table.column', ...]
+        filters:  [('table.column', operator, value), ...] where operator is
+                  equals (value), range ((low, high), either may be None),
+                  in (list) or prefix (text)
+        sort:     [('table.column', 'ASC' | 'DESC'), ...]
+        limit:    optional row limit
+
+    Every identifier is checked against the schema catalog and all values
+    are bound as parameters. Prefix filters compile to a half-open range
+    rather than LIKE so an index on the column can be used. The SQL text
+    depends only on the spec's shape, so it is cached under that shape
+    and reused with new values.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        self._plans = OrderedDict()
+
+    def _shape(self, spec):
+        filters = []
+        for ref, op, value in spec.get('filters', []):
+            if op == 'in':
+                filters.append((ref, op, len(value)))
+            elif op == 'range':
+                filters.append((ref, op, value[0] is not None, value[1] is not None))
+            else:
+                filters.append((ref, op))
+        return (
+            spec['table'],
+            tuple(spec.get('joins', [])),
+            tuple(spec['columns']),
+            tuple(filters),
+            tuple(tuple(s) for s in spec.get('sort', [])),
+            bool(spec.get('limit'))
+        )
+
+    def _compile(self, spec):
+        catalog = self.catalog
+        base = spec['table']
+        catalog.table(base)
+
+        joined = [base]
+        join_sql = []
+        for table in spec.get('joins', []):
+            condition = None
+            for existing in joined:
+                condition = catalog.join_condition(existing, table)
+                if condition:
+                    break
+            if not condition:
+                raise QueryBuilderError(f"No relationship between {table} and {', '.join(joined)}")
+            join_sql.append(f"LEFT JOIN {table} ON {condition}")
+            joined.append(table)
+
+        if not spec['columns']:
+            raise QueryBuilderError("Select at least one column")
+        selected = []
+        for ref in spec['columns']:
+            table, column = catalog.split(ref)
+            if table not in joined:
+                raise QueryBuilderError(f"Column {ref} needs {table} to be joined")
+            selected.append(f'{table}.{column} AS "{table}.{column}"')
+
+        where = []
+        for ref, op, value in spec.get('filters', []):
+            table, column = catalog.split(ref)
+            if table not in joined:
+                raise QueryBuilderError(f"Filter on {ref} needs {table} to be joined")
+            name = f"{table}.{column}"
+            if op == 'equals':
+                where.append(f"{name} = ?")
+            elif op == 'range':
+                if value[0] is not None:
+                    where.append(f"{name} >= ?")
+                if value[1] is not None:
+                    where.append(f"{name} <= ?")
+            elif op == 'in':
+                if not value:
+                    raise QueryBuilderError(f"Empty value list for {ref}")
+                where.append(f"{name} IN ({', '.join('?' for _ in value)})")
+            elif op == 'prefix':
+                where.append(f"{name} >= ? AND {name} < ?")
+            else:
+                raise QueryBuilderError(f"Unknown operator: {op}")
+
+        order = []
+        for ref, direction in spec.get('sort', []):
+            table, column = catalog.split(ref)
+            if direction not in SORT_ORDERS:
+                raise QueryBuilderError(f"Unknown sort order: {direction}")
+            order.append(f"{table}.{column} {direction}")
+
+        sql = f"SELECT {', '.join(selected)} FROM {base}"
+        if join_sql:
+            sql += " " + " ".join(join_sql)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if order:
+            sql += " ORDER BY " + ", ".join(order)
+        if spec.get('limit'):
+            sql += " LIMIT ?"
+        return sql
+
+    def _params(self, spec):
+        params = []
+        for ref, op, value in spec.get('filters', []):
+            column_type = self.catalog.column_type(ref)
+            if op == 'equals':
+                params.append(_coerce(value, column_type))
+            elif op == 'range':
+                params.extend(_coerce(v, column_type) for v in value if v is not None)
+            elif op == 'in':
+                params.extend(_coerce(v, column_type) for v in value)
+            elif op == 'prefix':
+                if not value:
+                    raise QueryBuilderError(f"Empty prefix for {ref}")
+                params.extend([str(value), _prefix_upper_bound(str(value))])
+        if spec.get('limit'):
+            params.append(int(spec['limit']))
+        return params
+
+    def build(self, spec):
+        """(sql, params) for a spec; raises QueryBuilderError for invalid specs"""
+        shape = self._shape(spec)
+        with self._lock:
+            sql = self._plans.get(shape)
+            if sql is not None:
+                self._plans.move_to_end(shape)
+
+        if sql is None:
+            sql = self._compile(spec)
+            with self._lock:
+                self._plans[shape] = sql
+                if len(self._plans) > PLAN_CACHE_SIZE:
+                    self._plans.popitem(last=False)
+
+        try:
+            return sql, self._params(spec)
+        except (TypeError, ValueError) as e:
+            if isinstance(e, QueryBuilderError):
+                raise
+            raise QueryBuilderError(f"Invalid filter value: {e}")
+
+
+# Global catalog (one per tenant) and builder
+schema_catalog = TenantScoped(SchemaCatalog)
+query_builder = QueryBuilder(schema_catalog)
@@ -0,0 +1,132 @@
+# modules/register_monitor.py
+import threading
+import streamlit as st
+import pandas as pd
+from datetime import datetime, date, timedelta
+from database import db
+from tenancy import TenantScoped
+from modules.school_calendar import school_calendar, to_date, DAYS
+
+
+class RegisterMonitor:
+    """Finds classes whose attendance register is missing or incomplete"""
+
+    def __init__(self):
+        self.last_result = None
+        self.last_run = None
+        self._lock = threading.Lock()
+
+    def expected_registers(self, start, end):
+        """Set of (class_id, ISO date) pairs that should have a register.
+
+        Every class is expected on its school days; classes that have a
+        timetable are only expected on the weekdays they have lessons.
+        """
+        class_ids = [c['id'] for c in db.fetch_all("SELECT id FROM classes")]
+
+        timetable_days = {}
+        for row in db.fetch_all("SELECT DISTINCT class_id, day_of_week FROM timetable"):
+            timetable_days.setdefault(row['class_id'], set()).add(row['day_of_week'])
+
+        expected = set()
+        for class_id, days in school_calendar.expected_register_dates(start, end, class_ids).items():
+            lesson_days = timetable_days.get(class_id)
+            for d in days:
+                if lesson_days is None or DAYS[d.weekday()] in lesson_days:
+                    expected.add((class_id, d.isoformat()))
+        return expected
+
+    def find_missing_registers(self, start=None, end=None):
+        """Missing and partial registers in [start, end] (defaults to today).
+
+        Expected and recorded (class, date) keys are each fetched with one
+        query and compared as sets, so the cost does not grow with the
+        number of per-class round trips.
+        """
+        end = to_date(end or date.today())
+        start = to_date(start or end)
+
+        expected = self.expected_registers(start, end)
+
+        recorded = {
+            (r['class_id'], str(r['date'])): r['marked']
+            for r in db.fetch_all('''
+                SELECT class_id, date, COUNT(*) as marked
+                FROM attendance
+                WHERE date BETWEEN ? AND ?
+                GROUP BY date, class_id
+            ''', (start.isoformat(), end.isoformat()))
+        }
+        class_sizes = school_calendar.get_class_sizes()
+        class_names = {c['id']: c['class_name'] for c in db.fetch_all("SELECT id, class_name FROM classes")}
+
+        rows = []
+        for class_id, day in expected - recorded.keys():
+            if class_sizes.get(class_id, 0) == 0:
+                continue
+            rows.append({
+                'class_id': class_id, 'class_name': class_names.get(class_id), 'date': day,
+                'status': 'Missing', 'marked': 0, 'students': class_sizes[class_id]
+            })
+
+        for (class_id, day), marked in recorded.items():
+            if (class_id, day) in expected and marked < class_sizes.get(class_id, 0):
+                rows.append({
+                    'class_id': class_id, 'class_name': class_names.get(class_id), 'date': day,
+                    'status': 'Partial', 'marked': marked, 'students': class_sizes[class_id]
+                })
+
+        rows.sort(key=lambda r: (r['date'], r['class_name'] or ''), reverse=True)
+        return rows
+
+    def run_job(self, days_back=0):
+        """Refresh the cached snapshot used by the dashboard widget; the
+        widget refreshes a stale one itself and saving a register clears it"""
+        end = date.today()
+        result = self.find_missing_registers(end - timedelta(days=days_back), end)
+        with self._lock:
+            self.last_result = result
+            self.last_run = datetime.now()
+        return result
+
+    def invalidate(self):
+        """Drop the cached snapshot, e.g. after a register is saved"""
+        with self._lock:
+            self.last_run = None
+
+    def get_snapshot(self, max_age_minutes=5):
+        """Latest result, recomputed if older than max_age_minutes"""
+        with self._lock:
+            fresh = self.last_run and datetime.now() - self.last_run < timedelta(minutes=max_age_minutes)
+            if fresh:
+                return self.last_result, self.last_run
+        return self.run_job(), self.last_run
+
+
+def display_missing_registers_widget():
+    """Dashboard widget listing today's missing and partial registers"""
+    rows, checked_at = register_monitor.get_snapshot()
+
+    st.markdown("**Registers Not Submitted Today**")
+    if rows:
+        missing = sum(1 for r in rows if r['status'] == 'Missing')
+        partial = len(rows) - missing
+        col1, col2 = st.columns(2)
+        col1.metric("Missing Registers", missing)
+        col2.metric("Partial Registers", partial)
+        st.dataframe(
+            pd.DataFrame(rows)[['class_name', 'date', 'status', 'marked', 'students']],
+            use_container_width=True
+        )
+    else:
+        st.success("All expected registers have been submitted")
+    st.caption(f"Last checked {checked_at.strftime('%H:%M')}")
+
+
+# Global monitor instance, one per tenant
+register_monitor = TenantScoped(RegisterMonitor)
+
+if __name__ == "__main__":
+    # Cron entry point: print today's missing and partial registers
+    for row in register_monitor.run_job():
+        print(f"{row['date']}  {row['class_name']}: {row['status']} ({row['marked']}/{row['students']})")
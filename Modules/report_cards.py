@@ -0,0 +1,277 @@
+# modules/report_cards.py
+import os
+import html
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from database import db
+from tenancy import tenant_path
+from modules.grading import load_scale, grade_percentages
+from modules.school_calendar import school_calendar
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+    PDF_AVAILABLE = True
+except ImportError:
+    PDF_AVAILABLE = False
+
+OUTPUT_DIR = "report_cards"
+CHUNK_SIZE = 50
+
+
+def load_report_data(class_id=None, exam_type=None, start_date=None, end_date=None):
+    """All result rows for the batch in one query"""
+    query = '''
+        SELECT r.student_id as student_pk, s.student_id, s.full_name,
+               r.class_id, c.class_name, sub.subject_name,
+               r.exam_type, r.marks_obtained, r.total_marks
+        FROM results r
+        JOIN students s ON r.student_id = s.id
+        JOIN classes c ON r.class_id = c.id
+        JOIN subjects sub ON r.subject_id = sub.id
+        WHERE 1=1
+    '''
+    params = []
+
+    if class_id:
+        query += " AND r.class_id = ?"
+        params.append(class_id)
+
+    if exam_type:
+        query += " AND r.exam_type = ?"
+        params.append(exam_type)
+
+    if start_date and end_date:
+        query += " AND r.exam_date BETWEEN ? AND ?"
+        params.extend([str(start_date), str(end_date)])
+
+    return db.get_dataframe(query, params)
+
+
+def load_attendance(start_date=None, end_date=None, class_id=None):
+    """Present/absent/late counts per student in one grouped query"""
+    query = '''
+        SELECT student_id as student_pk,
+               SUM(CASE WHEN status = 'Present' THEN 1 ELSE 0 END) as present,
+               SUM(CASE WHEN status = 'Absent' THEN 1 ELSE 0 END) as absent,
+               SUM(CASE WHEN status = 'Late' THEN 1 ELSE 0 END) as late
+        FROM attendance
+        WHERE 1=1
+    '''
+    params = []
+
+    if start_date and end_date:
+        query += " AND date BETWEEN ? AND ?"
+        params.extend([str(start_date), str(end_date)])
+
+    if class_id:
+        query += " AND class_id = ?"
+        params.append(class_id)
+
+    query += " GROUP BY student_id"
+    return db.get_dataframe(query, params)
+
+
+def build_cards(results_df, attendance_df=None, scale=None, school_days=None):
+    """Turn raw result rows into one card dict per student.
+
+    Marks are summed per subject across the exams in scope, then subject
+    percentages, grades, subject positions, averages and class ranks are
+    computed with grouped pandas operations rather than per student.
+    """
+    if results_df.empty:
+        return []
+
+    scale = scale or load_scale()
+    subjects = results_df.groupby(
+        ['student_pk', 'student_id', 'full_name', 'class_id', 'class_name', 'subject_name'],
+        as_index=False
+    )[['marks_obtained', 'total_marks']].sum()
+    subjects['percentage'] = (subjects['marks_obtained'] / subjects['total_marks'].where(subjects['total_marks'] > 0) * 100).fillna(0).round(2)
+    subjects['grade'], _ = grade_percentages(subjects['percentage'], scale)
+    # Marks outside every band of the scale get no grade
+    subjects['grade'] = subjects['grade'].fillna('-')
+    subjects['position'] = subjects.groupby(['class_id', 'subject_name'])['percentage'].rank(method='min', ascending=False).astype(int)
+
+    students = subjects.groupby(
+        ['student_pk', 'student_id', 'full_name', 'class_id', 'class_name'], as_index=False
+    ).agg(
+        total_marks_obtained=('marks_obtained', 'sum'),
+        total_marks=('total_marks', 'sum'),
+        average=('percentage', 'mean'),
+        subject_count=('subject_name', 'count')
+    )
+    students['average'] = students['average'].round(2)
+    students['grade'], _ = grade_percentages(students['average'], scale)
+    students['grade'] = students['grade'].fillna('-')
+    students['rank'] = students.groupby('class_id')['average'].rank(method='min', ascending=False).astype(int)
+    students['class_size'] = students.groupby('class_id')['student_pk'].transform('count')
+
+    if attendance_df is not None and not attendance_df.empty:
+        students = students.merge(attendance_df, on='student_pk', how='left')
+    for column in ('present', 'absent', 'late'):
+        if column not in students.columns:
+            students[column] = 0
+        students[column] = students[column].fillna(0).astype(int)
+    students['school_days'] = students['class_id'].map(school_days or {}).fillna(0).astype(int)
+
+    # One to_dict over all rows; per-group conversion is far slower
+    subject_rows = {}
+    columns = ['student_pk', 'subject_name', 'marks_obtained', 'total_marks', 'percentage', 'grade', 'position']
+    for row in subjects.sort_values('subject_name')[columns].to_dict('records'):
+        subject_rows.setdefault(row.pop('student_pk'), []).append(row)
+
+    cards = students.to_dict('records')
+    for card in cards:
+        card['subjects'] = subject_rows.get(card['student_pk'], [])
+    return cards
+
+
+def render_card_html(card, school_name, title):
+    """Standalone printable HTML report card"""
+    e = html.escape
+    rows = ''.join(
+        f"<tr><td>{e(str(s['subject_name']))}</td><td>{s['marks_obtained']:g}</td><td>{s['total_marks']:g}</td>"
+        f"<td>{s['percentage']:.1f}%</td><td>{e(str(s['grade']))}</td><td>{s['position']}</td></tr>"
+        for s in card['subjects']
+    )
+    attendance = f"{card['present'] + card['late']} of {card['school_days']} days" if card['school_days'] else f"{card['present'] + card['late']} days"
+
+    return f'''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{e(card['full_name'])} - {e(title)}</title>
+<style>
+    body {{ font-family: Arial, sans-serif; margin: 30px; }}
+    h1, h2 {{ text-align: center; margin: 4px; }}
+    table {{ border-collapse: collapse; width: 100%; margin-top: 15px; }}
+    th, td {{ border: 1px solid #999; padding: 6px; text-align: left; }}
+    .summary td {{ border: none; }}
+</style>
+</head>
+<body>
+<h1>{e(school_name)}</h1>
+<h2>{e(title)}</h2>
+<table class="summary">
+    <tr><td><b>Student:</b> {e(card['full_name'])}</td><td><b>ID:</b> {e(str(card['student_id']))}</td></tr>
+    <tr><td><b>Class:</b> {e(str(card['class_name']))}</td><td><b>Position:</b> {card['rank']} of {card['class_size']}</td></tr>
+    <tr><td><b>Average:</b> {card['average']:.2f}% ({e(str(card['grade']))})</td><td><b>Attendance:</b> {attendance}</td></tr>
+</table>
+<table>
+    <tr><th>Subject</th><th>Marks</th><th>Out of</th><th>Percentage</th><th>Grade</th><th>Position</th></tr>
+    {rows}
+</table>
+<p>Absent: {card['absent']} &nbsp; Late: {card['late']}</p>
+</body>
+</html>'''
+
+
+def render_card_pdf(card, school_name, title, path):
+    styles = getSampleStyleSheet()
+    story = [
+        Paragraph(school_name, styles['Title']),
+        Paragraph(title, styles['Heading2']),
+        Paragraph(f"{card['full_name']} ({card['student_id']}) - {card['class_name']}", styles['Normal']),
+        Paragraph(
+            f"Average {card['average']:.2f}% ({card['grade']}), position {card['rank']} of {card['class_size']}, "
+            f"present {card['present'] + card['late']}, absent {card['absent']}, late {card['late']}",
+            styles['Normal']
+        ),
+        Spacer(1, 12),
+        Table(
+            [['Subject', 'Marks', 'Out of', '%', 'Grade', 'Position']] + [
+                [s['subject_name'], f"{s['marks_obtained']:g}", f"{s['total_marks']:g}",
+                 f"{s['percentage']:.1f}", s['grade'], s['position']]
+                for s in card['subjects']
+            ]
+        )
+    ]
+    SimpleDocTemplate(path, pagesize=A4).build(story)
+
+
+def card_filename(card, fmt):
+    return f"{card['class_name']}_{card['student_id']}.{fmt}".replace('/', '-').replace(' ', '_')
+
+
+def _render_chunk(cards, output_dir, school_name, title, fmt):
+    """Worker: render a chunk of cards to files, return how many were written"""
+    for card in cards:
+        path = os.path.join(output_dir, card_filename(card, fmt))
+        tmp_path = path + '.part'
+        if fmt == 'pdf':
+            render_card_pdf(card, school_name, title, tmp_path)
+        else:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(render_card_html(card, school_name, title))
+        # Only complete files get the final name, so a resumed batch never keeps half a card
+        os.replace(tmp_path, path)
+    return len(cards)
+
+
+def generate_report_cards(batch_name, class_id=None, exam_type=None, start_date=None, end_date=None,
+                          title="Report Card", fmt='html', workers=None, progress_callback=None,
+                          restart=False):
+    """Render report cards for a class or whole school into a zip archive.
+
+    Cards already rendered for the same batch_name are skipped, so an
+    interrupted batch resumes where it stopped; restart=True re-renders
+    everything. progress_callback is
+    called with (done, total). Returns the zip path and card count.
+    """
+    if fmt == 'pdf' and not PDF_AVAILABLE:
+        fmt = 'html'
+
+    results_df = load_report_data(class_id, exam_type, start_date, end_date)
+    attendance_df = load_attendance(start_date, end_date, class_id)
+    school_days = {}
+    if start_date and end_date:
+        school_days = {
+            cid: school_calendar.get_index(cid).count(start_date, end_date)
+            for cid in results_df['class_id'].unique().tolist()
+        } if not results_df.empty else {}
+    # Grade on the scale of the year being reported
+    term = school_calendar.get_current_term(end_date or start_date)
+    scale = load_scale(term['academic_year'] if term else None)
+    cards = build_cards(results_df, attendance_df, scale=scale, school_days=school_days)
+
+    row = db.fetch_one("SELECT config_value FROM system_config WHERE config_key = 'school_name'")
+    school_name = row['config_value'] if row else "School"
+
+    safe_batch = ''.join(ch if ch.isalnum() or ch in '-_' else '_' for ch in batch_name)
+    output_dir = os.path.join(tenant_path(OUTPUT_DIR), safe_batch)
+    os.makedirs(output_dir, exist_ok=True)
+    if restart:
+        for name in os.listdir(output_dir):
+            os.remove(os.path.join(output_dir, name))
+
+    pending = [c for c in cards if not os.path.exists(os.path.join(output_dir, card_filename(c, fmt)))]
+    total = len(cards)
+    done = total - len(pending)
+    if progress_callback:
+        progress_callback(done, total)
+
+    chunks = [pending[i:i + CHUNK_SIZE] for i in range(0, len(pending), CHUNK_SIZE)]
+    if chunks:
+        workers = workers or min(len(chunks), os.cpu_count() or 1)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_render_chunk, chunk, output_dir, school_name, title, fmt) for chunk in chunks]
+                for future in as_completed(futures):
+                    done += future.result()
+                    if progress_callback:
+                        progress_callback(done, total)
+        else:
+            for chunk in chunks:
+                done += _render_chunk(chunk, output_dir, school_name, title, fmt)
+                if progress_callback:
+                    progress_callback(done, total)
+
+    zip_path = output_dir + '.zip'
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for card in cards:
+            name = card_filename(card, fmt)
+            archive.write(os.path.join(output_dir, name), name)
+
+    return zip_path, total
@@ -0,0 +1,95 @@
+# modules/report_export.py
+import csv
+import os
+import tempfile
+from contextlib import ExitStack
+from openpyxl import Workbook
+from database import db
+
+CHUNK_SIZE = 5000
+# Excel's row limit, less the header row
+EXCEL_MAX_ROWS = 1048575
+
+
+def stream_query(query, params=(), chunk_size=CHUNK_SIZE, conn=None):
+    """Run a query and return (columns, chunks).
+
+    chunks is a generator of fetchmany() batches, so only chunk_size rows
+    are held in memory at a time (a server-side cursor on PostgreSQL).
+    conn defaults to the shared connection of the current tenant, which is
+    then kept open until the chunks have been read.
+    """
+    stack = ExitStack()
+    try:
+        database = db if conn is not None else stack.enter_context(db.lease())
+        cursor = database.stream_cursor(conn, chunk_size)
+        cursor.execute(query, params)
+    except Exception:
+        stack.close()
+        raise
+    columns = [d[0] for d in cursor.description]
+
+    def chunks():
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+            stack.close()
+
+    return columns, chunks()
+
+
+def _temp_path(prefix, suffix):
+    handle, path = tempfile.mkstemp(prefix=prefix, suffix=suffix)
+    os.close(handle)
+    return path
+
+
+def export_csv(query, params=(), prefix="report_", conn=None, path=None):
+    """Stream a query to a CSV file (a temporary one unless path is given);
+    returns (path, row_count)"""
+    path = path or _temp_path(prefix, ".csv")
+    columns, chunks = stream_query(query, params, conn=conn)
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows(tuple(row) for row in rows)
+            count += len(rows)
+    return path, count
+
+
+def export_excel(query, params=(), prefix="report_", sheet_name="Report", conn=None, path=None):
+    """Stream a query to an .xlsx (a temporary one unless path is given)
+    using openpyxl's write-only mode.
+
+    Rows beyond Excel's sheet limit continue on further sheets.
+    Returns (path, row_count).
+    """
+    path = path or _temp_path(prefix, ".xlsx")
+    columns, chunks = stream_query(query, params, conn=conn)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append(columns)
+    sheet_rows = 0
+    sheet_number = 1
+    count = 0
+
+    for rows in chunks:
+        for row in rows:
+            if sheet_rows >= EXCEL_MAX_ROWS:
+                sheet_number += 1
+                sheet = workbook.create_sheet(f"{sheet_name} {sheet_number}")
+                sheet.append(columns)
+                sheet_rows = 0
+            sheet.append(tuple(row))
+            sheet_rows += 1
+        count += len(rows)
+
+    workbook.save(path)
+    return path, count
@@ -0,0 +1,477 @@
+# modules/report_jobs.py
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+import pandas as pd
+from database import db
+from storage import Error
+from tenancy import bind_tenant, current_tenant, tenant_path, list_tenants, use_tenant
+from modules.query_builder import query_builder
+from modules.report_export import export_csv, export_excel
+from modules.tenant_reports import tenant_connection
+from modules.user_directory import directory_query
+
+OUTPUT_DIR = "report_jobs"
+REPORT_WORKERS = 2
+SCHEDULER_INTERVAL = 30
+JOB_RETENTION_DAYS = 30
+DEFAULT_PERIOD_DAYS = 30
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+FREQUENCIES = ['daily', 'weekly', 'monthly']
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _timestamp(value=None):
+    return (value or datetime.now()).strftime(TIMESTAMP_FORMAT)
+
+
+def _date_range(params):
+    """(start, end) from explicit dates, or the last period_days up to the run date"""
+    if params.get('start_date') and params.get('end_date'):
+        return str(params['start_date']), str(params['end_date'])
+    end = date.today()
+    start = end - timedelta(days=int(params.get('period_days', DEFAULT_PERIOD_DAYS)))
+    return start.isoformat(), end.isoformat()
+
+
+# Report definitions: each turns the job's params into (query, params)
+
+def _fees_collection_summary(params):
+    return '''
+        SELECT
+            DATE(payment_date) as payment_date,
+            COUNT(*) as transactions,
+            SUM(paid_amount) as total_collected,
+            AVG(paid_amount) as avg_payment
+        FROM fees
+        WHERE payment_date BETWEEN ? AND ?
+            AND status IN ('Paid', 'Partial')
+        GROUP BY DATE(payment_date)
+        ORDER BY payment_date
+    ''', _date_range(params)
+
+
+def _fees_type_analysis(params):
+    return '''
+        SELECT
+            fee_type,
+            COUNT(*) as count,
+            SUM(amount) as total_amount,
+            SUM(paid_amount) as total_paid,
+            SUM(amount - paid_amount) as total_due
+        FROM fees
+        WHERE due_date BETWEEN ? AND ?
+        GROUP BY fee_type
+        ORDER BY total_amount DESC
+    ''', _date_range(params)
+
+
+def _fees_class_collection(params):
+    return '''
+        SELECT
+            c.class_name,
+            COUNT(DISTINCT f.student_id) as students,
+            SUM(f.amount) as total_amount,
+            SUM(f.paid_amount) as total_paid,
+            SUM(f.amount - f.paid_amount) as total_due
+        FROM fees f
+        JOIN students s ON f.student_id = s.id
+        LEFT JOIN classes c ON s.class_id = c.id
+        WHERE f.due_date BETWEEN ? AND ?
+        GROUP BY c.class_name
+        ORDER BY c.class_name
+    ''', _date_range(params)
+
+
+def _fees_overdue(params):
+    start, end = _date_range(params)
+    today = date.today().isoformat()
+    return f'''
+        SELECT
+            s.student_id,
+            s.full_name,
+            c.class_name,
+            f.fee_type,
+            f.amount,
+            f.paid_amount,
+            f.amount - f.paid_amount as balance,
+            f.due_date,
+            {db.dialect.date_diff('?', 'f.due_date')} as days_overdue
+        FROM fees f
+        JOIN students s ON f.student_id = s.id
+        LEFT JOIN classes c ON s.class_id = c.id
+        WHERE f.status IN ('Unpaid', 'Partial')
+            AND f.due_date BETWEEN ? AND ?
+            AND f.due_date < ?
+        ORDER BY days_overdue DESC
+    ''', (today, start, end, today)
+
+
+def _admission_trends(params):
+    month = db.dialect.date_trunc('month', 'admission_date')
+    return f'''
+        SELECT
+            {month} as month,
+            COUNT(*) as admissions,
+            COUNT(CASE WHEN gender = 'Male' THEN 1 END) as male,
+            COUNT(CASE WHEN gender = 'Female' THEN 1 END) as female
+        FROM students
+        WHERE admission_date BETWEEN ? AND ?
+        GROUP BY {month}
+        ORDER BY month
+    ''', _date_range(params)
+
+
+def _admission_class_wise(params):
+    return '''
+        SELECT
+            COALESCE(c.class_name, 'Unassigned') as class_name,
+            COUNT(*) as admissions,
+            COUNT(CASE WHEN s.gender = 'Male' THEN 1 END) as male,
+            COUNT(CASE WHEN s.gender = 'Female' THEN 1 END) as female
+        FROM students s
+        LEFT JOIN classes c ON s.class_id = c.id
+        WHERE s.admission_date BETWEEN ? AND ?
+        GROUP BY c.class_name
+        ORDER BY admissions DESC
+    ''', _date_range(params)
+
+
+def _admission_monthly(params):
+    month = db.dialect.date_trunc('month', 's.admission_date')
+    return f'''
+        SELECT
+            {month} as month,
+            COALESCE(c.class_name, 'Unassigned') as class_name,
+            COUNT(*) as admissions
+        FROM students s
+        LEFT JOIN classes c ON s.class_id = c.id
+        WHERE s.admission_date BETWEEN ? AND ?
+        GROUP BY {month}, c.class_name
+        ORDER BY month, class_name
+    ''', _date_range(params)
+
+
+def _admission_gender(params):
+    return '''
+        SELECT
+            COALESCE(gender, 'Unknown') as gender,
+            COUNT(*) as admissions
+        FROM students
+        WHERE admission_date BETWEEN ? AND ?
+        GROUP BY COALESCE(gender, 'Unknown')
+        ORDER BY admissions DESC
+    ''', _date_range(params)
+
+
+def _user_directory(params):
+    return directory_query(params.get('role'), params.get('is_active'), params.get('search'))
+
+
+def _custom_report(params):
+    # The spec is compiled again so only whitelisted identifiers reach SQL
+    return query_builder.build(params['spec'])
+
+
+# permission is needed to run, schedule, list or download a report's jobs
+REPORTS = {
+    'fees_collection_summary': {'label': "Fees: Collection Summary", 'build': _fees_collection_summary,
+                                'permission': 'manage_fees'},
+    'fees_type_analysis': {'label': "Fees: Fee Type Analysis", 'build': _fees_type_analysis,
+                           'permission': 'manage_fees'},
+    'fees_class_collection': {'label': "Fees: Class-wise Collection", 'build': _fees_class_collection,
+                              'permission': 'manage_fees'},
+    'fees_overdue': {'label': "Fees: Overdue Report", 'build': _fees_overdue, 'permission': 'manage_fees'},
+    'admission_trends': {'label': "Admissions: Trends", 'build': _admission_trends,
+                         'permission': 'manage_admissions'},
+    'admission_class_wise': {'label': "Admissions: Class-wise", 'build': _admission_class_wise,
+                             'permission': 'manage_admissions'},
+    'admission_monthly': {'label': "Admissions: Monthly by Class", 'build': _admission_monthly,
+                          'permission': 'manage_admissions'},
+    'admission_gender': {'label': "Admissions: Gender Distribution", 'build': _admission_gender,
+                         'permission': 'manage_admissions'},
+    'user_directory': {'label': "Users: Directory", 'build': _user_directory, 'permission': 'manage_users'},
+    'custom': {'label': "Custom Report", 'build': _custom_report, 'permission': 'view_reports'}
+}
+
+
+def _name_filter(column, report_names):
+    """SQL condition limiting column to report_names; an empty list matches nothing"""
+    return f"{column} IN ({', '.join('?' for _ in report_names) or 'NULL'})", list(report_names)
+
+
+def next_run(frequency, run_time, run_day, after):
+    """First time strictly after `after` matching the schedule.
+
+    run_time is 'HH:MM'; run_day is the weekday (0 = Monday) for weekly
+    schedules and the day of the month (1-28) for monthly ones.
+    """
+    hour, minute = (int(part) for part in run_time.split(':'))
+    candidate = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+    if frequency == 'daily':
+        if candidate <= after:
+            candidate += timedelta(days=1)
+    elif frequency == 'weekly':
+        candidate += timedelta(days=(int(run_day) - candidate.weekday()) % 7)
+        if candidate <= after:
+            candidate += timedelta(days=7)
+    elif frequency == 'monthly':
+        candidate = candidate.replace(day=int(run_day))
+        if candidate <= after:
+            year, month = (candidate.year + 1, 1) if candidate.month == 12 else (candidate.year, candidate.month + 1)
+            candidate = candidate.replace(year=year, month=month)
+    else:
+        raise ValueError(f"Unknown frequency: {frequency}")
+    return candidate
+
+
+class ReportJobQueue:
+    """Persistent report jobs run by a background thread pool.
+
+    The UI enqueues a job (a row in report_jobs) and polls its status; a
+    worker renders the report to a file under report_jobs/ and records the
+    path, row count and size. A scheduler thread enqueues jobs for due
+    report_schedules rows. One worker pool and one scheduler serve every
+    school: each job runs under its school's tenant (bind_tenant) and
+    writes under its report_jobs directory (tenant_path), and the scheduler
+    visits the schools in turn. Both use short-lived connections of their
+    own (tenant_connection), so they never share a transaction with the
+    script thread and schools not in use stay out of the tenant pool.
+    Jobs left running by a previous process are queued again when the
+    scheduler first visits their school.
+    """
+
+    def __init__(self, workers=REPORT_WORKERS):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._stop = threading.Event()
+        self._recovered = set()
+
+    def start(self):
+        """Start the worker pool and scheduler once per process"""
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._stop.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='report-job')
+            threading.Thread(target=self._scheduler_loop, name='report-scheduler', daemon=True).start()
+
+    def stop(self):
+        with self._lock:
+            self._stop.set()
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def _submit(self, job_id):
+        self.start()
+        self._executor.submit(bind_tenant(self._run), job_id)
+
+    def enqueue(self, report_name, params=None, fmt='csv', requested_by=None, schedule_id=None, conn=None):
+        """Queue a report; returns the job id"""
+        if report_name not in REPORTS:
+            raise ValueError(f"Unknown report: {report_name}")
+        if fmt not in ('csv', 'xlsx'):
+            raise ValueError(f"Unknown format: {fmt}")
+
+        insert = ('''
+            INSERT INTO report_jobs (report_name, params, format, status, requested_by, schedule_id, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (report_name, json.dumps(params or {}, default=str), fmt, STATUS_QUEUED,
+              requested_by, schedule_id, _timestamp()))
+        if conn is None:
+            with db.transaction() as cursor:
+                cursor.execute(*insert)
+        else:
+            cursor = conn.execute(*insert)
+            conn.commit()
+        job_id = cursor.lastrowid
+
+        self._submit(job_id)
+        return job_id
+
+    def _run(self, job_id):
+        with tenant_connection(current_tenant()) as conn:
+            claimed = conn.execute('''
+                UPDATE report_jobs SET status = ?, started_at = ? WHERE id = ? AND status = ?
+            ''', (STATUS_RUNNING, _timestamp(), job_id, STATUS_QUEUED))
+            conn.commit()
+            if claimed.rowcount != 1:
+                return
+
+            job = conn.execute("SELECT * FROM report_jobs WHERE id = ?", (job_id,)).fetchone()
+            part_path = None
+            try:
+                query, query_params = REPORTS[job['report_name']]['build'](json.loads(job['params'] or '{}'))
+
+                output_dir = tenant_path(OUTPUT_DIR)
+                os.makedirs(output_dir, exist_ok=True)
+                path = os.path.join(output_dir, f"{job_id}_{job['report_name']}.{job['format']}")
+                part_path = path + '.part'
+                export = export_excel if job['format'] == 'xlsx' else export_csv
+                _, count = export(query, query_params, conn=conn, path=part_path)
+                os.replace(part_path, path)
+
+                conn.execute('''
+                    UPDATE report_jobs
+                    SET status = ?, file_path = ?, row_count = ?, file_size = ?, finished_at = ?
+                    WHERE id = ?
+                ''', (STATUS_DONE, path, count, os.path.getsize(path), _timestamp(), job_id))
+            except Exception as e:
+                if part_path and os.path.exists(part_path):
+                    os.remove(part_path)
+                conn.execute('''
+                    UPDATE report_jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?
+                ''', (STATUS_FAILED, str(e), _timestamp(), job_id))
+            conn.commit()
+
+    def _scheduler_loop(self):
+        while True:
+            for tenant in list_tenants():
+                try:
+                    with use_tenant(tenant):
+                        self.run_tenant_tick()
+                except (Error + (KeyError,)):
+                    # Locked or busy database, or a school removed since
+                    # it was listed; try again on the next tick
+                    pass
+            if self._stop.wait(SCHEDULER_INTERVAL):
+                break
+
+    def run_tenant_tick(self, now=None):
+        """Scheduler work for the current school on one short-lived connection"""
+        with tenant_connection(current_tenant()) as conn:
+            if current_tenant() not in self._recovered:
+                self._recover(conn)
+                self._recovered.add(current_tenant())
+            self.run_due_schedules(now, conn=conn)
+            self.purge_old_jobs(conn=conn)
+
+    def _recover(self, conn):
+        """Queue again the jobs a previous process left queued or running"""
+        conn.execute("UPDATE report_jobs SET status = ? WHERE status = ?", (STATUS_QUEUED, STATUS_RUNNING))
+        conn.commit()
+        for job in conn.execute("SELECT id FROM report_jobs WHERE status = ? ORDER BY id", (STATUS_QUEUED,)).fetchall():
+            self._submit(job['id'])
+
+    def run_due_schedules(self, now=None, conn=None):
+        """Enqueue a job for every due schedule; returns the number enqueued"""
+        if conn is None:
+            with tenant_connection(current_tenant()) as conn:
+                return self.run_due_schedules(now, conn)
+
+        now = now or datetime.now()
+        due = conn.execute('''
+            SELECT * FROM report_schedules WHERE is_active = 1 AND next_run_at <= ?
+        ''', (_timestamp(now),)).fetchall()
+
+        enqueued = 0
+        for schedule in due:
+            # Missed runs collapse into one; the next run is counted from now
+            following = next_run(schedule['frequency'], schedule['run_time'], schedule['run_day'], now)
+            claimed = conn.execute('''
+                UPDATE report_schedules SET next_run_at = ?, last_run_at = ?
+                WHERE id = ? AND next_run_at = ?
+            ''', (_timestamp(following), _timestamp(now), schedule['id'], schedule['next_run_at']))
+            conn.commit()
+            if claimed.rowcount == 1:
+                self.enqueue(schedule['report_name'], json.loads(schedule['params'] or '{}'), schedule['format'],
+                             schedule['created_by'], schedule['id'], conn=conn)
+                enqueued += 1
+        return enqueued
+
+    def purge_old_jobs(self, days=JOB_RETENTION_DAYS, conn=None):
+        """Delete finished jobs older than days together with their files"""
+        if conn is None:
+            with tenant_connection(current_tenant()) as conn:
+                return self.purge_old_jobs(days, conn)
+
+        cutoff = _timestamp(datetime.now() - timedelta(days=days))
+        old = conn.execute('''
+            SELECT id, file_path FROM report_jobs
+            WHERE status IN (?, ?) AND created_at < ?
+        ''', (STATUS_DONE, STATUS_FAILED, cutoff)).fetchall()
+
+        for job in old:
+            if job['file_path'] and os.path.exists(job['file_path']):
+                os.remove(job['file_path'])
+        conn.executemany("DELETE FROM report_jobs WHERE id = ?", [(job['id'],) for job in old])
+        conn.commit()
+        return len(old)
+
+    def get_job(self, job_id, report_names=None):
+        """A job row; with report_names, only a job of one of those reports"""
+        query, params = "SELECT * FROM report_jobs WHERE id = ?", [job_id]
+        if report_names is not None:
+            condition, names = _name_filter('report_name', report_names)
+            query += f" AND {condition}"
+            params.extend(names)
+        return db.fetch_one(query, params)
+
+    def recent_jobs(self, report_names=None, limit=50):
+        query = '''
+            SELECT j.id, j.report_name, j.format, j.status, u.full_name as requested_by,
+                   j.schedule_id, j.row_count, j.file_size, j.created_at, j.finished_at, j.error
+            FROM report_jobs j
+            LEFT JOIN users u ON j.requested_by = u.id
+        '''
+        params = []
+        if report_names is not None:
+            condition, params = _name_filter('j.report_name', report_names)
+            query += f" WHERE {condition}"
+        query += " ORDER BY j.id DESC LIMIT ?"
+        params.append(limit)
+        return db.get_dataframe(query, params)
+
+    def load_result(self, job_id, nrows=None):
+        """A finished CSV job's output as a DataFrame"""
+        job = self.get_job(job_id)
+        if not job or job['status'] != STATUS_DONE or job['format'] != 'csv':
+            return None
+        return pd.read_csv(job['file_path'], nrows=nrows)
+
+    def add_schedule(self, report_name, params, frequency, run_time, run_day=0, fmt='csv', created_by=None):
+        """Create a recurring job; returns the schedule id"""
+        if report_name not in REPORTS:
+            raise ValueError(f"Unknown report: {report_name}")
+        first_run = next_run(frequency, run_time, run_day, datetime.now())
+        return db.execute_query('''
+            INSERT INTO report_schedules
+            (report_name, params, format, frequency, run_time, run_day, next_run_at, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (report_name, json.dumps(params or {}, default=str), fmt, frequency, run_time, run_day,
+              _timestamp(first_run), created_by))
+
+    def set_schedule_active(self, schedule_id, active):
+        if active:
+            schedule = db.fetch_one("SELECT * FROM report_schedules WHERE id = ?", (schedule_id,))
+            following = next_run(schedule['frequency'], schedule['run_time'], schedule['run_day'], datetime.now())
+            db.execute_query('''
+                UPDATE report_schedules SET is_active = 1, next_run_at = ? WHERE id = ?
+            ''', (_timestamp(following), schedule_id))
+        else:
+            db.execute_query("UPDATE report_schedules SET is_active = 0 WHERE id = ?", (schedule_id,))
+
+    def delete_schedule(self, schedule_id):
+        db.execute_query("DELETE FROM report_schedules WHERE id = ?", (schedule_id,))
+
+    def get_schedules(self):
+        return db.get_dataframe('''
+            SELECT id, report_name, frequency, run_time, run_day, format, params,
+                   next_run_at, last_run_at, is_active
+            FROM report_schedules
+            ORDER BY next_run_at
+        ''')
+
+
+# Global job queue, shared by every tenant
+report_jobs = ReportJobQueue()
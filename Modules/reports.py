@@ -1,21 +1,40 @@
 # modules/reports.py
+import os
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, date, timedelta
 from database import db
+from auth import auth
+from tenancy import list_tenants
+from modules.school_calendar import school_calendar
+from modules.summary_cube import summary_cube
+from modules.parquet_archive import parquet_archive, PARQUET_AVAILABLE
+from modules.results_analytics import results_analytics
+from modules.report_jobs import report_jobs, REPORTS, FREQUENCIES, STATUS_QUEUED, STATUS_RUNNING, STATUS_FAILED
+from modules.query_builder import schema_catalog, query_builder, QueryBuilderError, OPERATORS, SORT_ORDERS
+from modules.tenant_reports import CROSS_TENANT_REPORTS, run_cross_tenant_report
+
+PREVIEW_ROWS = 1000
 
 def show_reports(translator, auth):
     """Display reports and analytics"""
     st.title(translator.t('reports'))
     
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab_names = [
         "Dashboard Analytics",
         "Student Reports",
         "Financial Reports",
-        "Custom Reports"
-    ])
+        "Custom Reports",
+        "Report Jobs",
+        "Year over Year"
+    ]
+    # Reports over every school this process serves
+    all_schools = len(list_tenants()) > 1 and auth.has_permission('cross_school_reports')
+    if all_schools:
+        tab_names.append("All Schools")
+    tabs = st.tabs(tab_names)
+    tab1, tab2, tab3, tab4, tab5, tab6 = tabs[:6]
     
     with tab1:
         st.subheader("System Analytics")
@@ -27,100 +46,79 @@ def show_reports(translator, auth):
         with col2:
             end_date = st.date_input("End Date", value=date.today())
         
+        # All dashboard figures come from the pre-aggregated summary cube
+        totals = summary_cube.totals(start_date, end_date)
+        
+        def fact_sum(fact, position, dimensions=None):
+            return sum(
+                values[position] for (name, dimension), values in totals.items()
+                if name == fact and (dimensions is None or dimension in dimensions)
+            )
+        
         # Key metrics
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
             # Total students
             total_students = db.fetch_one("SELECT COUNT(*) FROM students")[0]
-            new_students = db.fetch_one(
-                "SELECT COUNT(*) FROM students WHERE admission_date BETWEEN ? AND ?",
-                (start_date, end_date)
-            )[0]
+            new_students = fact_sum('admissions', 0)
             st.metric("Total Students", total_students, f"+{new_students}")
         
         with col2:
-            # Attendance rate
-            attendance_data = db.fetch_one('''
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN status = 'Present' THEN 1 ELSE 0 END) as present
-                FROM attendance 
-                WHERE date BETWEEN ? AND ?
-            ''', (start_date, end_date))
+            # Attendance rate against expected student school days
+            present = fact_sum('attendance', 0, ['Present'])
+            expected_days = school_calendar.expected_student_days(start_date, end_date)
             
-            if attendance_data['total'] > 0:
-                attendance_rate = (attendance_data['present'] / attendance_data['total']) * 100
+            if expected_days > 0:
+                attendance_rate = (present / expected_days) * 100
                 st.metric("Attendance Rate", f"{attendance_rate:.1f}%")
             else:
                 st.metric("Attendance Rate", "N/A")
         
         with col3:
             # Fee collection rate
-            fees_data = db.fetch_one('''
-                SELECT 
-                    SUM(amount) as total_amount,
-                    SUM(paid_amount) as total_paid
-                FROM fees 
-                WHERE due_date BETWEEN ? AND ?
-            ''', (start_date, end_date))
+            total_amount = fact_sum('fees_due', 1)
             
-            if fees_data['total_amount'] and fees_data['total_amount'] > 0:
-                collection_rate = (fees_data['total_paid'] / fees_data['total_amount']) * 100
+            if total_amount > 0:
+                collection_rate = (fact_sum('fees_due', 2) / total_amount) * 100
                 st.metric("Fee Collection", f"{collection_rate:.1f}%")
             else:
                 st.metric("Fee Collection", "N/A")
         
         with col4:
             # Pass percentage
-            results_data = db.fetch_one('''
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN percentage >= 40 THEN 1 ELSE 0 END) as passed
-                FROM results 
-                WHERE exam_date BETWEEN ? AND ?
-            ''', (start_date, end_date))
+            total_results = fact_sum('results', 0)
             
-            if results_data['total'] > 0:
-                pass_percentage = (results_data['passed'] / results_data['total']) * 100
+            if total_results > 0:
+                pass_percentage = (fact_sum('results', 1) / total_results) * 100
                 st.metric("Pass Percentage", f"{pass_percentage:.1f}%")
             else:
                 st.metric("Pass Percentage", "N/A")
         
         # Charts
+        monthly = summary_cube.monthly(['attendance', 'fees_paid'], start_date, end_date)
         col1, col2 = st.columns(2)
         
         with col1:
             # Monthly attendance trend
-            monthly_attendance = db.get_dataframe('''
-                SELECT 
-                    strftime('%Y-%m', date) as month,
-                    COUNT(*) as total_attendance,
-                    AVG(CASE WHEN status = 'Present' THEN 100.0 ELSE 0 END) as attendance_rate
-                FROM attendance
-                WHERE date BETWEEN ? AND ?
-                GROUP BY strftime('%Y-%m', date)
-                ORDER BY month
-            ''', (start_date, end_date))
+            monthly_attendance = monthly[(monthly['fact'] == 'attendance') & (monthly['dimension'] == 'Present')]
             
             if not monthly_attendance.empty:
+                monthly_attendance = monthly_attendance.rename(columns={'row_count': 'present'})
+                expected_by_month = school_calendar.expected_student_days(start_date, end_date, by='month')
+                expected = monthly_attendance['month'].map(expected_by_month)
+                monthly_attendance['attendance_rate'] = monthly_attendance['present'] * 100.0 / expected.where(expected > 0)
+                
                 fig = px.line(monthly_attendance, x='month', y='attendance_rate',
                              title='Monthly Attendance Rate')
                 st.plotly_chart(fig, use_container_width=True)
         
         with col2:
             # Fee collection trend
-            monthly_fees = db.get_dataframe('''
-                SELECT 
-                    strftime('%Y-%m', payment_date) as month,
-                    SUM(paid_amount) as total_collected,
-                    COUNT(*) as transactions
-                FROM fees
-                WHERE payment_date BETWEEN ? AND ?
-                    AND status IN ('Paid', 'Partial')
-                GROUP BY strftime('%Y-%m', payment_date)
-                ORDER BY month
-            ''', (start_date, end_date))
+            monthly_fees = monthly[monthly['fact'] == 'fees_paid'].groupby('month', as_index=False).agg(
+                total_collected=('value1', 'sum'),
+                transactions=('row_count', 'sum')
+            )
             
             if not monthly_fees.empty:
                 fig = px.bar(monthly_fees, x='month', y='total_collected',
@@ -158,26 +156,53 @@ def show_reports(translator, auth):
                 st.plotly_chart(fig, use_container_width=True)
         
         elif report_type == "Attendance Summary":
-            # Student-wise attendance
-            attendance_summary = db.get_dataframe('''
-                SELECT 
-                    s.full_name,
-                    s.student_id,
-                    c.class_name,
-                    COUNT(a.id) as total_days,
-                    SUM(CASE WHEN a.status = 'Present' THEN 1 ELSE 0 END) as present_days,
-                    ROUND(SUM(CASE WHEN a.status = 'Present' THEN 1 ELSE 0 END) * 100.0 / COUNT(a.id), 2) as attendance_percentage
-                FROM students s
-                LEFT JOIN attendance a ON s.id = a.student_id AND a.date BETWEEN ? AND ?
-                LEFT JOIN classes c ON s.class_id = c.id
-                WHERE s.status = 'Active'
-                GROUP BY s.id
-                HAVING total_days > 0
-                ORDER BY attendance_percentage DESC
-            ''', (date.today() - timedelta(days=30), date.today()))
+            # Student-wise attendance over each class's last 20 school days
+            window_days = 20
+            windows = {}
+            for class_id in school_calendar.get_class_sizes():
+                first_day, last_day = school_calendar.get_index(class_id).last_n_school_days(window_days)
+                if first_day:
+                    windows[class_id] = (first_day, last_day)
             
-            if not attendance_summary.empty:
-                st.dataframe(attendance_summary, use_container_width=True)
+            if windows:
+                range_start = min(first for first, _ in windows.values())
+                range_end = max(last for _, last in windows.values())
+                
+                attendance_summary = db.get_dataframe('''
+                    SELECT 
+                        s.full_name,
+                        s.student_id,
+                        s.class_id,
+                        c.class_name,
+                        a.date,
+                        a.status
+                    FROM students s
+                    JOIN attendance a ON s.id = a.student_id AND a.date BETWEEN ? AND ?
+                    LEFT JOIN classes c ON s.class_id = c.id
+                    WHERE s.status = 'Active'
+                ''', (range_start, range_end))
+                
+                if not attendance_summary.empty:
+                    first_days = attendance_summary['class_id'].map({k: v[0].isoformat() for k, v in windows.items()})
+                    attendance_summary = attendance_summary[attendance_summary['date'] >= first_days]
+                    attendance_summary['present'] = attendance_summary['status'] == 'Present'
+                    attendance_summary = attendance_summary.groupby(
+                        ['full_name', 'student_id', 'class_id', 'class_name'], as_index=False
+                    ).agg(recorded_days=('date', 'count'), present_days=('present', 'sum'))
+                    
+                    school_days = {
+                        k: school_calendar.get_index(k).count(first, last) for k, (first, last) in windows.items()
+                    }
+                    attendance_summary['school_days'] = attendance_summary['class_id'].map(school_days)
+                    attendance_summary['attendance_percentage'] = (
+                        attendance_summary['present_days'] * 100.0 / attendance_summary['school_days']
+                    ).round(2)
+                    attendance_summary = attendance_summary.drop(columns=['class_id']).sort_values(
+                        'attendance_percentage', ascending=False
+                    )
+                    
+                    st.caption(f"Last {window_days} school days per class")
+                    st.dataframe(attendance_summary, use_container_width=True)
     
     with tab3:
         st.subheader("Financial Reports")
@@ -214,70 +239,316 @@ def show_reports(translator, auth):
     with tab4:
         st.subheader("Custom Reports Generator")
         
+        tables = schema_catalog.tables()
         col1, col2 = st.columns(2)
         
         with col1:
-            tables = ["students", "teachers", "attendance", "fees", "results", "classes"]
             selected_table = st.selectbox("Select Table", tables)
+            related = schema_catalog.related_tables(selected_table)
+            joins = st.multiselect("Join Related Tables", related)
             
-            if selected_table:
-                # Get columns for selected table
-                columns = db.get_dataframe(f"PRAGMA table_info({selected_table})")
-                column_names = columns['name'].tolist()
-                
-                selected_columns = st.multiselect(
-                    "Select Columns",
-                    column_names,
-                    default=column_names[:5] if len(column_names) > 5 else column_names
-                )
+            # Columns are offered as table.column for the base table and its joins
+            column_refs = [
+                f"{table}.{column}"
+                for table in [selected_table] + joins
+                for column in schema_catalog.columns(table)
+            ]
+            base_columns = [ref for ref in column_refs if ref.startswith(f"{selected_table}.")]
+            selected_columns = st.multiselect(
+                "Select Columns",
+                column_refs,
+                default=base_columns[:5]
+            )
         
         with col2:
-            filter_column = st.selectbox("Filter Column (Optional)", [""] + column_names)
-            filter_value = st.text_input("Filter Value")
-            
-            sort_column = st.selectbox("Sort By (Optional)", [""] + column_names)
-            sort_order = st.radio("Sort Order", ["ASC", "DESC"], horizontal=True)
+            sort_column = st.selectbox("Sort By (Optional)", [""] + column_refs)
+            sort_order = st.radio("Sort Order", SORT_ORDERS, horizontal=True)
+            filter_count = st.number_input("Number of Filters", min_value=0, max_value=5, value=0)
+        
+        filters = []
+        for i in range(int(filter_count)):
+            fcol1, fcol2, fcol3 = st.columns([2, 1, 2])
+            with fcol1:
+                ref = st.selectbox(
+                    f"Filter {i + 1} Column",
+                    column_refs,
+                    format_func=lambda r: f"{r} (indexed)" if schema_catalog.is_indexed(r) else r,
+                    key=f"custom_filter_column_{i}"
+                )
+            with fcol2:
+                op = st.selectbox("Operator", OPERATORS, key=f"custom_filter_op_{i}")
+            with fcol3:
+                if op == 'range':
+                    low = st.text_input("From", key=f"custom_filter_low_{i}")
+                    high = st.text_input("To", key=f"custom_filter_high_{i}")
+                    if low or high:
+                        filters.append((ref, op, (low or None, high or None)))
+                elif op == 'in':
+                    values = st.text_input("Values (comma separated)", key=f"custom_filter_value_{i}")
+                    values = [v.strip() for v in values.split(',') if v.strip()]
+                    if values:
+                        filters.append((ref, op, values))
+                else:
+                    value = st.text_input("Value", key=f"custom_filter_value_{i}")
+                    if value:
+                        filters.append((ref, op, value))
         
         if st.button("Generate Report"):
             if selected_columns:
-                # Build query
-                query = f"SELECT {', '.join(selected_columns)} FROM {selected_table}"
-                params = []
-                
-                if filter_column and filter_value:
-                    query += f" WHERE {filter_column} LIKE ?"
-                    params.append(f"%{filter_value}%")
-                
-                if sort_column:
-                    query += f" ORDER BY {sort_column} {sort_order}"
+                spec = {
+                    'table': selected_table,
+                    'joins': joins,
+                    'columns': selected_columns,
+                    'filters': filters,
+                    'sort': [(sort_column, sort_order)] if sort_column else []
+                }
+                try:
+                    preview_query, preview_params = query_builder.build(dict(spec, limit=PREVIEW_ROWS))
+                except QueryBuilderError as e:
+                    st.error(str(e))
+                else:
+                    st.session_state.custom_report = {
+                        'spec': spec,
+                        'preview_query': preview_query, 'preview_params': preview_params,
+                        'table': selected_table
+                    }
+                    st.session_state.custom_report_jobs = {}
+            else:
+                st.error("Please select at least one column")
+        
+        report = st.session_state.get('custom_report')
+        if report:
+            # Only a preview is loaded here; full exports run as background jobs
+            preview_df = db.get_dataframe(report['preview_query'], report['preview_params'])
+            
+            if not preview_df.empty:
+                st.caption(f"Showing the first {len(preview_df)} rows")
+                st.dataframe(preview_df, use_container_width=True)
                 
-                report_df = db.get_dataframe(query, params)
+                jobs = st.session_state.setdefault('custom_report_jobs', {})
+                col1, col2 = st.columns(2)
                 
-                if not report_df.empty:
-                    st.dataframe(report_df, use_container_width=True)
-                    
-                    # Export options
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        csv = report_df.to_csv(index=False)
-                        st.download_button(
-                            label="Download CSV",
-                            data=csv,
-                            file_name=f"report_{selected_table}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                            mime="text/csv"
-                        )
-                    
-                    with col2:
-                        excel_buffer = io.BytesIO()
-                        with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                            report_df.to_excel(writer, index=False, sheet_name='Report')
-                        
-                        st.download_button(
-                            label="Download Excel",
-                            data=excel_buffer.getvalue(),
-                            file_name=f"report_{selected_table}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
+                for column, fmt, label in ((col1, 'csv', "Export CSV"), (col2, 'xlsx', "Export Excel")):
+                    with column:
+                        if st.button(label):
+                            jobs[fmt] = report_jobs.enqueue(
+                                'custom', {'spec': report['spec']}, fmt,
+                                requested_by=auth.get_current_user()['id']
+                            )
+                        if fmt in jobs:
+                            show_report_job(jobs[fmt], preview_rows=0)
+            else:
+                st.info("No data found for the selected criteria")
+    
+    with tab5:
+        st.subheader("Report Jobs")
+        
+        permitted = permitted_reports()
+        jobs_df = report_jobs.recent_jobs(permitted)
+        if not jobs_df.empty:
+            jobs_df['report_name'] = jobs_df['report_name'].map(lambda name: REPORTS[name]['label'] if name in REPORTS else name)
+            st.dataframe(jobs_df, use_container_width=True)
+            
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                job_id = st.selectbox("Job", jobs_df['id'].tolist())
+            with col2:
+                st.button("Refresh Jobs")
+            show_report_job(job_id, preview_rows=0)
+        else:
+            st.info("No report jobs yet")
+        
+        st.markdown("---")
+        st.subheader("Scheduled Reports")
+        
+        with st.form("report_schedule_form"):
+            report_options = [name for name in permitted if name != 'custom']
+            if report and 'custom' in permitted:
+                report_options.append('custom')
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                report_name = st.selectbox(
+                    "Report",
+                    report_options,
+                    format_func=lambda name: "Current Custom Report" if name == 'custom' else REPORTS[name]['label']
+                )
+                period_days = st.number_input("Covering the last (days)", min_value=1, max_value=366, value=30)
+                fmt = st.selectbox("Format", ['csv', 'xlsx'])
+            
+            with col2:
+                frequency = st.selectbox("Frequency", FREQUENCIES)
+                run_time = st.time_input("Run At", value=datetime.strptime("02:00", "%H:%M").time())
+                run_day = st.number_input(
+                    "Day (weekday 0-6 for weekly, day of month 1-28 for monthly)",
+                    min_value=0, max_value=28, value=1
+                )
+            
+            if st.form_submit_button("Add Schedule"):
+                if frequency == 'monthly' and run_day < 1:
+                    st.error("Monthly schedules need a day of month between 1 and 28")
+                elif frequency == 'weekly' and run_day > 6:
+                    st.error("Weekly schedules need a weekday between 0 (Monday) and 6 (Sunday)")
                 else:
-                    st.info("No data found for the selected criteria")
\ No newline at end of file
+                    params = {'spec': report['spec']} if report_name == 'custom' else {'period_days': int(period_days)}
+                    report_jobs.add_schedule(
+                        report_name, params, frequency, run_time.strftime('%H:%M'), int(run_day), fmt,
+                        created_by=auth.get_current_user()['id']
+                    )
+                    st.success("Schedule added!")
+                    st.rerun()
+        
+        schedules = report_jobs.get_schedules()
+        schedules = schedules[schedules['report_name'].isin(permitted)]
+        if not schedules.empty:
+            for _, schedule in schedules.iterrows():
+                col1, col2, col3 = st.columns([4, 1, 1])
+                with col1:
+                    label = REPORTS.get(schedule['report_name'], {}).get('label', schedule['report_name'])
+                    st.write(f"**{label}** - {schedule['frequency']} at {schedule['run_time']} "
+                             f"({schedule['format']}), next run {schedule['next_run_at']}")
+                with col2:
+                    active = bool(schedule['is_active'])
+                    if st.button("Pause" if active else "Resume", key=f"toggle_schedule_{schedule['id']}"):
+                        report_jobs.set_schedule_active(int(schedule['id']), not active)
+                        st.rerun()
+                with col3:
+                    if st.button("Delete", key=f"delete_schedule_{schedule['id']}"):
+                        report_jobs.delete_schedule(int(schedule['id']))
+                        st.rerun()
+        else:
+            st.info("No scheduled reports")
+
+    
+    with tab6:
+        st.subheader("Year over Year")
+        
+        if not PARQUET_AVAILABLE:
+            st.info("Install pyarrow to enable the Parquet archive")
+        else:
+            # These reports read the Parquet archive only, never the live tables
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                status_df = parquet_archive.status()
+                if not status_df.empty:
+                    st.dataframe(status_df, use_container_width=True)
+                else:
+                    st.info("The archive has not been built yet")
+            with col2:
+                if st.button("Update Archive"):
+                    with st.spinner("Exporting to Parquet..."):
+                        exported = parquet_archive.export()
+                    st.success(", ".join(
+                        f"{table}: {appended + rewritten} rows" for table, (appended, rewritten) in exported.items()
+                    ))
+            
+            yoy_report = st.selectbox("Report", ["Attendance", "Results", "Fees"])
+            
+            if yoy_report == "Attendance":
+                yoy_df = parquet_archive.attendance_by_year()
+                if not yoy_df.empty:
+                    st.dataframe(yoy_df, use_container_width=True)
+                    fig = px.bar(yoy_df, x='academic_year', y='attendance_rate',
+                                title='Attendance Rate by Academic Year')
+                    st.plotly_chart(fig, use_container_width=True)
+            
+            elif yoy_report == "Results":
+                yoy_df = parquet_archive.results_by_year(pass_mark=results_analytics.get_pass_mark())
+                if not yoy_df.empty:
+                    st.dataframe(yoy_df, use_container_width=True)
+                    fig = px.line(yoy_df, x='academic_year', y='average', color='exam_type', markers=True,
+                                 title='Average Percentage by Academic Year')
+                    st.plotly_chart(fig, use_container_width=True)
+            
+            else:
+                yoy_df = parquet_archive.fees_by_year()
+                if not yoy_df.empty:
+                    st.dataframe(yoy_df, use_container_width=True)
+                    fig = px.bar(yoy_df, x='academic_year', y='total_paid', color='fee_type',
+                                title='Fees Collected by Academic Year')
+                    st.plotly_chart(fig, use_container_width=True)
+            
+            if yoy_df.empty:
+                st.info("No archived data yet")
+    
+    if all_schools:
+        with tabs[6]:
+            show_cross_school_reports()
+
+
+def show_cross_school_reports():
+    """Aggregate reports run against every school's database in parallel"""
+    st.subheader("All Schools")
+    
+    report_name = st.selectbox(
+        "Report", list(CROSS_TENANT_REPORTS),
+        format_func=lambda name: CROSS_TENANT_REPORTS[name]['label'],
+        key='cross_school_report'
+    )
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input("Start Date", value=date.today() - timedelta(days=30), key='cross_school_start')
+    with col2:
+        end_date = st.date_input("End Date", value=date.today(), key='cross_school_end')
+    
+    if st.button("Run Report", key='cross_school_run'):
+        with st.spinner("Querying schools..."):
+            df, errors = run_cross_tenant_report(report_name, {'start_date': start_date, 'end_date': end_date})
+        
+        for school, error in errors.items():
+            st.warning(f"{school}: {error}")
+        if df.empty:
+            st.info("No data found")
+            return
+        
+        st.dataframe(df, use_container_width=True)
+        if report_name == 'school_overview':
+            fig = px.bar(df, x='school', y='students', title='Active Students by School')
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            numeric = df.select_dtypes('number').columns
+            st.dataframe(df.groupby(df.columns[1])[list(numeric)].sum(), use_container_width=True)
+        st.download_button(
+            "Download CSV", df.to_csv(index=False).encode('utf-8'),
+            file_name=f"{report_name}_all_schools.csv", mime='text/csv'
+        )
+
+
+def permitted_reports():
+    """Names of the job reports the session user may run, list and download"""
+    return [name for name, report in REPORTS.items() if auth.has_permission(report['permission'])]
+
+
+def show_report_job(job_id, preview_rows=PREVIEW_ROWS):
+    """Show a background report job's status and download; returns the
+    first preview_rows of its output once a CSV job has finished"""
+    job = report_jobs.get_job(job_id, permitted_reports())
+    if not job:
+        return None
+    
+    if job['status'] in (STATUS_QUEUED, STATUS_RUNNING):
+        st.info(f"Report job #{job_id} is {job['status']}...")
+        st.button("Refresh", key=f"refresh_job_{job_id}")
+        return None
+    
+    if job['status'] == STATUS_FAILED:
+        st.error(f"Report job #{job_id} failed: {job['error']}")
+        return None
+    
+    if not job['file_path'] or not os.path.exists(job['file_path']):
+        st.warning(f"The output of report job #{job_id} is no longer available")
+        return None
+    
+    mime = "text/csv" if job['format'] == 'csv' else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    with open(job['file_path'], 'rb') as f:
+        st.download_button(
+            label=f"Download {job['format'].upper()} ({job['row_count']} rows)",
+            data=f,
+            file_name=os.path.basename(job['file_path']),
+            mime=mime,
+            key=f"download_job_{job_id}"
+        )
+    
+    if preview_rows:
+        return report_jobs.load_result(job_id, nrows=preview_rows)
+    return None
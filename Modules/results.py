@@ -1,19 +1,25 @@
 # modules/results.py
+import os
 import streamlit as st
 import pandas as pd
 import numpy as np
 from datetime import datetime, date
 from database import db
+from modules.results_analytics import results_analytics
+from modules.transcripts import transcript_engine, SCOPE_CUMULATIVE, SCOPE_TERM, SCOPE_EXAM
+from modules.report_cards import generate_report_cards, PDF_AVAILABLE
 
 def show_results(translator, auth):
     """Display results management"""
     st.title(translator.t('results'))
     
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
         "View Results",
         "Add Results",
         "Bulk Upload",
-        "Grading System"
+        "Grading System",
+        "Report Cards",
+        "Transcripts"
     ])
     
     with tab1:
@@ -77,6 +83,36 @@ def show_results(translator, auth):
                           'exam_type', 'marks_obtained', 'total_marks', 'percentage', 'grade']],
                 use_container_width=True
             )
+            
+            analytics = results_analytics.get_analytics(
+                class_options.get(selected_class_name),
+                None if selected_exam_type == "All" else selected_exam_type
+            )
+            if analytics:
+                st.subheader("Class Statistics")
+                summary = analytics['summary']
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Mean", f"{summary['average']:.2f}%")
+                with col2:
+                    st.metric("Median", f"{summary['median']:.2f}%")
+                with col3:
+                    st.metric(f"Pass Rate (>= {summary['pass_mark']:g}%)", f"{summary['pass_rate']:.1f}%")
+                
+                st.markdown("**Subject Statistics**")
+                st.dataframe(analytics['subjects'], use_container_width=True)
+                
+                top_n = st.number_input("Top N Students", min_value=1, max_value=100, value=10)
+                st.markdown("**Rankings**")
+                st.dataframe(
+                    results_analytics.top_students(
+                        class_options.get(selected_class_name),
+                        None if selected_exam_type == "All" else selected_exam_type,
+                        int(top_n)
+                    )[['rank', 'student_name', 'student_id', 'class_name', 'average', 'percentile',
+                       'subjects', 'subjects_passed']],
+                    use_container_width=True
+                )
         else:
             st.info("No results found")
     
@@ -158,11 +194,14 @@ def show_results(translator, auth):
                         (student_id,)
                     )
                     
-                    db.execute_query(query, (
+                    result_id = db.execute_query(query, (
                         student_id, student_data['class_id'], subject_id, exam_type,
                         marks_obtained, total_marks, percentage, grade, remarks,
                         exam_date, auth.get_current_user()['id']
                     ))
+                    results_analytics.invalidate(student_data['class_id'], exam_type)
+                    if result_id:
+                        transcript_engine.record_results([result_id])
                     
                     st.success("Result added successfully!")
                 else:
@@ -183,6 +222,7 @@ def show_results(translator, auth):
                 if st.button("Import Results"):
                     success_count = 0
                     errors = []
+                    result_ids = []
                     
                     for idx, row in df.iterrows():
                         try:
@@ -230,17 +270,21 @@ def show_results(translator, auth):
                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                             '''
                             
-                            db.execute_query(query, (
+                            result_id = db.execute_query(query, (
                                 student['id'], student['class_id'], subject['id'],
                                 row['exam_type'], row['marks_obtained'], row['total_marks'],
                                 percentage, grade, date.today(), auth.get_current_user()['id']
                             ))
                             
+                            results_analytics.invalidate(student['class_id'], row['exam_type'])
+                            if result_id:
+                                result_ids.append(result_id)
                             success_count += 1
                             
                         except Exception as e:
                             errors.append(f"Row {idx}: {str(e)}")
                     
+                    transcript_engine.record_results(result_ids)
                     st.success(f"Successfully imported {success_count} results")
                     
                     if errors:
@@ -288,7 +332,140 @@ def show_results(translator, auth):
                         description, academic_year
                     ))
                     
+                    # Grade points changed, so every GPA must be rebuilt
+                    transcript_engine.recompute_all()
                     st.success("Grade added to grading system!")
                     st.rerun()
                 else:
-                    st.error("Please fill required fields correctly")
\ No newline at end of file
+                    st.error("Please fill required fields correctly")
+    
+    with tab5:
+        st.subheader("Report Cards")
+        
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            classes = db.fetch_all("SELECT id, class_name FROM classes")
+            class_options = {c['class_name']: c['id'] for c in classes}
+            card_class = st.selectbox("Class", ["All"] + list(class_options.keys()), key="card_class")
+        
+        with col2:
+            terms = db.fetch_all("SELECT term_name, academic_year, start_date, end_date FROM academic_terms ORDER BY start_date DESC")
+            term_options = {f"{t['term_name']} {t['academic_year'] or ''}".strip(): t for t in terms}
+            card_term = st.selectbox("Term", ["All Results"] + list(term_options.keys()), key="card_term")
+        
+        with col3:
+            exam_types = db.fetch_all("SELECT DISTINCT exam_type FROM results")
+            card_exam = st.selectbox("Exam Type", ["All"] + [e[0] for e in exam_types if e[0]], key="card_exam")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            card_format = st.selectbox("Format", ["HTML", "PDF"] if PDF_AVAILABLE else ["HTML"])
+            if not PDF_AVAILABLE:
+                st.caption("PDF report cards need the reportlab package")
+        with col2:
+            start_over = st.checkbox("Start over (discard cards already generated for this batch)")
+        
+        if st.button("Generate Report Cards"):
+            term = term_options.get(card_term)
+            batch_name = f"{card_term}_{card_class}_{card_exam}"
+            progress = st.progress(0.0, text="Preparing report cards...")
+            
+            def update_progress(done, total):
+                progress.progress(done / total if total else 1.0, text=f"{done} of {total} report cards ready")
+            
+            zip_path, total = generate_report_cards(
+                batch_name,
+                class_id=class_options.get(card_class),
+                exam_type=None if card_exam == "All" else card_exam,
+                start_date=term['start_date'] if term else None,
+                end_date=term['end_date'] if term else None,
+                title=f"Report Card - {card_term}" if term else "Report Card",
+                fmt=card_format.lower(),
+                progress_callback=update_progress,
+                restart=start_over
+            )
+            
+            if total:
+                st.session_state.report_card_zip = zip_path
+                st.success(f"Generated {total} report cards")
+            else:
+                st.info("No results found for this selection")
+        
+        zip_path = st.session_state.get('report_card_zip')
+        if zip_path:
+            with open(zip_path, 'rb') as f:
+                st.download_button(
+                    label="Download Report Cards (ZIP)",
+                    data=f.read(),
+                    file_name=os.path.basename(zip_path),
+                    mime="application/zip"
+                )
+    
+    with tab6:
+        st.subheader("Student Transcript")
+        
+        students = db.fetch_all("SELECT id, full_name, student_id FROM students ORDER BY full_name")
+        student_options = {f"{s['full_name']} ({s['student_id']})": s['id'] for s in students}
+        transcript_student = st.selectbox("Student", list(student_options.keys()), key="transcript_student")
+        
+        if transcript_student:
+            transcript_df = transcript_engine.get_transcript(student_options[transcript_student])
+            if not transcript_df.empty:
+                cumulative = transcript_df[transcript_df['scope_type'] == SCOPE_CUMULATIVE]
+                if not cumulative.empty and pd.notna(cumulative['gpa'].iloc[0]):
+                    st.metric("Cumulative GPA", f"{cumulative['gpa'].iloc[0]:.2f}")
+                st.dataframe(transcript_df, use_container_width=True)
+            else:
+                st.info("No results recorded for this student")
+        
+        st.subheader("Honor Roll")
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            scope_names = {"Cumulative": SCOPE_CUMULATIVE, "Term": SCOPE_TERM, "Exam": SCOPE_EXAM}
+            honor_scope = st.selectbox("Scope", list(scope_names.keys()))
+            scope_type = scope_names[honor_scope]
+        
+        with col2:
+            scopes = transcript_engine.get_scopes(scope_type)
+            scope_options = {s['scope_label']: s['scope_key'] for s in scopes}
+            honor_period = st.selectbox("Period", list(scope_options.keys()))
+        
+        with col3:
+            min_gpa = st.number_input("Minimum GPA", min_value=0.0, max_value=5.0, value=3.5, step=0.1)
+        
+        if honor_period:
+            honor_df = transcript_engine.honor_roll(scope_type, scope_options[honor_period], min_gpa)
+            if not honor_df.empty:
+                st.dataframe(honor_df, use_container_width=True)
+            else:
+                st.info("No students meet this GPA")
+        
+        with st.expander("Subject Weights"):
+            weights_df = db.get_dataframe('''
+                SELECT s.id, c.class_name, s.subject_name, s.credit_hours
+                FROM subjects s
+                LEFT JOIN classes c ON s.class_id = c.id
+                ORDER BY c.class_name, s.subject_name
+            ''')
+            if not weights_df.empty:
+                edited_weights = st.data_editor(
+                    weights_df,
+                    disabled=['id', 'class_name', 'subject_name'],
+                    hide_index=True,
+                    use_container_width=True,
+                    key="subject_weights_editor"
+                )
+                if st.button("Save Weights and Recompute GPAs"):
+                    db.execute_many(
+                        "UPDATE subjects SET credit_hours = ? WHERE id = ?",
+                        [(float(row['credit_hours']) if pd.notna(row['credit_hours']) else 1.0, int(row['id']))
+                         for _, row in edited_weights.iterrows()]
+                    )
+                    rows = transcript_engine.recompute_all()
+                    st.success(f"Weights saved and {rows} GPA records recomputed")
+        
+        if st.button("Recompute All GPAs"):
+            rows = transcript_engine.recompute_all()
+            st.success(f"Recomputed {rows} GPA records")
@@ -0,0 +1,121 @@
+# modules/results_analytics.py
+import threading
+from database import db
+from tenancy import TenantScoped
+
+DEFAULT_PASS_MARK = 40.0
+
+
+class ResultsAnalytics:
+    """Ranks and statistics per (class, exam type), cached until results change"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def invalidate(self, class_id=None, exam_type=None):
+        """Drop cached analytics for one key, or everything when no key is given"""
+        with self._lock:
+            if class_id is None and exam_type is None:
+                self._cache = {}
+                return
+            for key in list(self._cache):
+                if key[0] in (class_id, None) and key[1] in (exam_type, None):
+                    del self._cache[key]
+
+    def get_pass_mark(self):
+        row = db.fetch_one("SELECT config_value FROM system_config WHERE config_key = 'pass_percentage'")
+        try:
+            return float(row['config_value']) if row else DEFAULT_PASS_MARK
+        except (TypeError, ValueError):
+            return DEFAULT_PASS_MARK
+
+    def get_analytics(self, class_id=None, exam_type=None):
+        """Cached analytics for a class and exam type (None means all)"""
+        key = (class_id, exam_type)
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+
+        analytics = self._compute(class_id, exam_type)
+        with self._lock:
+            self._cache[key] = analytics
+        return analytics
+
+    def _compute(self, class_id, exam_type):
+        query = '''
+            SELECT r.student_id as student_pk, s.student_id, s.full_name as student_name,
+                   r.class_id, c.class_name, sub.subject_name, r.percentage
+            FROM results r
+            JOIN students s ON r.student_id = s.id
+            JOIN classes c ON r.class_id = c.id
+            JOIN subjects sub ON r.subject_id = sub.id
+            WHERE 1=1
+        '''
+        params = []
+
+        if class_id:
+            query += " AND r.class_id = ?"
+            params.append(class_id)
+
+        if exam_type:
+            query += " AND r.exam_type = ?"
+            params.append(exam_type)
+
+        df = db.get_dataframe(query, params)
+        if df.empty:
+            return None
+
+        pass_mark = self.get_pass_mark()
+        df['passed'] = df['percentage'] >= pass_mark
+
+        # Per student: average, subjects passed, rank and percentile within class
+        students = df.groupby(
+            ['student_pk', 'student_id', 'student_name', 'class_id', 'class_name'], as_index=False
+        ).agg(
+            average=('percentage', 'mean'),
+            subjects=('subject_name', 'nunique'),
+            subjects_passed=('passed', 'sum')
+        )
+        students['average'] = students['average'].round(2)
+        by_class = students.groupby('class_id')['average']
+        students['rank'] = by_class.rank(method='dense', ascending=False).astype(int)
+        students['percentile'] = (by_class.rank(method='max', pct=True) * 100).round(1)
+        students = students.sort_values(['class_name', 'rank', 'student_name']).reset_index(drop=True)
+
+        # Per subject: spread and pass rate
+        subjects = df.groupby('subject_name').agg(
+            students=('student_pk', 'nunique'),
+            mean=('percentage', 'mean'),
+            median=('percentage', 'median'),
+            std=('percentage', 'std'),
+            highest=('percentage', 'max'),
+            lowest=('percentage', 'min'),
+            pass_rate=('passed', 'mean')
+        ).reset_index()
+        subjects['pass_rate'] = subjects['pass_rate'] * 100
+        subjects[['mean', 'median', 'std', 'pass_rate']] = subjects[['mean', 'median', 'std', 'pass_rate']].round(2)
+
+        return {
+            'students': students,
+            'subjects': subjects,
+            'summary': {
+                'students': len(students),
+                'average': round(float(df['percentage'].mean()), 2),
+                'median': round(float(df['percentage'].median()), 2),
+                'pass_rate': round(float((students['average'] >= pass_mark).mean()) * 100, 2),
+                'pass_mark': pass_mark
+            }
+        }
+
+    def top_students(self, class_id=None, exam_type=None, n=10):
+        """The n best students by average (ties share a rank, so more may be returned)"""
+        analytics = self.get_analytics(class_id, exam_type)
+        if analytics is None:
+            return None
+        students = analytics['students']
+        return students[students['rank'] <= n].sort_values(['rank', 'student_name'])
+
+
+# Global analytics instance, one per tenant
+results_analytics = TenantScoped(ResultsAnalytics)
@@ -0,0 +1,235 @@
+# modules/school_calendar.py
+import bisect
+from datetime import datetime, date, timedelta
+from database import db
+from tenancy import TenantScoped
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+DEFAULT_SCHOOL_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+
+
+def to_date(value):
+    """Normalize a date, datetime or ISO string to a date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+
+
+class WorkingDayIndex:
+    """Precomputed date -> ordinal school day mapping for one schedule.
+
+    Ordinals are 1-based and only advance on school days, so the number of
+    school days in any range is a difference of two lookups.
+    """
+
+    def __init__(self, school_days):
+        self.days = school_days
+        self.ordinals = {d: i + 1 for i, d in enumerate(school_days)}
+
+    def is_school_day(self, d):
+        return to_date(d) in self.ordinals
+
+    def ordinal(self, d):
+        """Ordinal of the last school day on or before d (0 if none)"""
+        d = to_date(d)
+        if d in self.ordinals:
+            return self.ordinals[d]
+        return bisect.bisect_right(self.days, d)
+
+    def count(self, start, end):
+        """School days in the inclusive range [start, end]"""
+        start, end = to_date(start), to_date(end)
+        if end < start:
+            return 0
+        return self.ordinal(end) - self.ordinal(start - timedelta(days=1))
+
+    def school_days_between(self, start, end):
+        """School days after start up to and including end"""
+        return self.ordinal(end) - self.ordinal(start)
+
+    def school_days(self, start, end):
+        """List of school days in the inclusive range [start, end]"""
+        start, end = to_date(start), to_date(end)
+        return self.days[bisect.bisect_left(self.days, start):bisect.bisect_right(self.days, end)]
+
+    def last_n_school_days(self, n, end=None):
+        """(first, last) dates of the n school days ending on or before end"""
+        last = self.ordinal(end or date.today())
+        if last == 0:
+            return None, None
+        first = max(last - n + 1, 1)
+        return self.days[first - 1], self.days[last - 1]
+
+
+class SchoolCalendar:
+    """Terms, holidays and per-class school weeks with cached day indexes"""
+
+    def __init__(self):
+        self._data = None
+        self._indexes = {}
+
+    def invalidate(self):
+        """Drop cached calendar data after terms, holidays or schedules change"""
+        self._data = None
+        self._indexes = {}
+
+    def _load(self):
+        if self._data is not None:
+            return self._data
+
+        terms = [
+            (to_date(t['start_date']), to_date(t['end_date']))
+            for t in db.fetch_all("SELECT start_date, end_date FROM academic_terms ORDER BY start_date")
+        ]
+
+        holidays = {}
+        for h in db.fetch_all("SELECT start_date, end_date, class_id FROM holidays"):
+            holidays.setdefault(h['class_id'], []).append(
+                (to_date(h['start_date']), to_date(h['end_date']))
+            )
+
+        schedules = {}
+        for s in db.fetch_all("SELECT class_id, day_of_week FROM class_schedules"):
+            schedules.setdefault(s['class_id'], set()).add(s['day_of_week'])
+
+        row = db.fetch_one("SELECT config_value FROM system_config WHERE config_key = 'school_week_days'")
+        school_week = [d.strip() for d in row['config_value'].split(',')] if row and row['config_value'] else DEFAULT_SCHOOL_WEEK
+
+        today = date.today()
+        range_start = date(today.year - 2, 1, 1)
+        range_end = date(today.year + 1, 12, 31)
+        if terms:
+            range_start = min(range_start, terms[0][0])
+            range_end = max(range_end, max(end for _, end in terms))
+
+        self._data = {
+            'terms': terms,
+            'holidays': holidays,
+            'schedules': schedules,
+            'school_week': set(school_week),
+            'range': (range_start, range_end)
+        }
+        return self._data
+
+    def get_index(self, class_id=None):
+        """Working-day index for a class (or the default school week)"""
+        if class_id in self._indexes:
+            return self._indexes[class_id]
+
+        data = self._load()
+        weekdays = {DAYS.index(d) for d in data['schedules'].get(class_id, data['school_week']) if d in DAYS}
+        closed = set()
+        for start, end in data['holidays'].get(None, []) + (data['holidays'].get(class_id, []) if class_id else []):
+            for offset in range((end - start).days + 1):
+                closed.add(start + timedelta(days=offset))
+
+        range_start, range_end = data['range']
+        school_days = []
+        current = range_start
+        while current <= range_end:
+            if current.weekday() in weekdays and current not in closed:
+                school_days.append(current)
+            current += timedelta(days=1)
+
+        # Outside term dates the school is on break
+        if data['terms']:
+            starts = [start for start, _ in data['terms']]
+            in_term = []
+            for d in school_days:
+                i = bisect.bisect_right(starts, d) - 1
+                if i >= 0 and d <= data['terms'][i][1]:
+                    in_term.append(d)
+            school_days = in_term
+
+        index = WorkingDayIndex(school_days)
+        self._indexes[class_id] = index
+        return index
+
+    def school_days_between(self, start, end, class_id=None):
+        return self.get_index(class_id).school_days_between(start, end)
+
+    def get_current_term(self, on_date=None):
+        """The academic_terms row containing on_date, if any"""
+        on_date = to_date(on_date or date.today())
+        return db.fetch_one('''
+            SELECT * FROM academic_terms
+            WHERE start_date <= ? AND end_date >= ?
+            ORDER BY start_date DESC
+        ''', (on_date.isoformat(), on_date.isoformat()))
+
+    def term_to_date_range(self, on_date=None):
+        """(term start, on_date) for the running term, or (None, None)"""
+        on_date = to_date(on_date or date.today())
+        term = self.get_current_term(on_date)
+        if not term:
+            return None, None
+        return to_date(term['start_date']), on_date
+
+    def expected_register_dates(self, start, end, class_ids):
+        """{class_id: [school days]} on which each class should take a register"""
+        return {class_id: self.get_index(class_id).school_days(start, end) for class_id in class_ids}
+
+    def get_class_sizes(self):
+        """Active students per class"""
+        rows = db.fetch_all('''
+            SELECT class_id, COUNT(*) as students
+            FROM students
+            WHERE status = 'Active' AND class_id IS NOT NULL
+            GROUP BY class_id
+        ''')
+        return {r['class_id']: r['students'] for r in rows}
+
+    def expected_student_days(self, start, end, by='total'):
+        """Student-days that should have been recorded in [start, end].
+
+        by='total' returns a number, by='date' or by='month' returns a dict
+        keyed by ISO date or 'YYYY-MM'. Uses current class sizes.
+        """
+        totals = {}
+        for class_id, size in self.get_class_sizes().items():
+            index = self.get_index(class_id)
+            if by == 'total':
+                totals['total'] = totals.get('total', 0) + size * index.count(start, end)
+                continue
+            for d in index.school_days(start, end):
+                key = d.isoformat() if by == 'date' else d.strftime('%Y-%m')
+                totals[key] = totals.get(key, 0) + size
+        if by == 'total':
+            return totals.get('total', 0)
+        return totals
+
+    def add_term(self, term_name, academic_year, start_date, end_date):
+        result = db.execute_query('''
+            INSERT INTO academic_terms (term_name, academic_year, start_date, end_date)
+            VALUES (?, ?, ?, ?)
+        ''', (term_name, academic_year, start_date, end_date))
+        self.invalidate()
+        return result
+
+    def add_holiday(self, description, start_date, end_date, class_id=None):
+        result = db.execute_query('''
+            INSERT INTO holidays (description, start_date, end_date, class_id)
+            VALUES (?, ?, ?, ?)
+        ''', (description, start_date, end_date, class_id))
+        self.invalidate()
+        return result
+
+    def delete_holiday(self, holiday_id):
+        db.execute_query("DELETE FROM holidays WHERE id = ?", (holiday_id,))
+        self.invalidate()
+
+    def set_class_schedule(self, class_id, days):
+        """Replace a class's school week; an empty list restores the default"""
+        with db.transaction() as cursor:
+            cursor.execute("DELETE FROM class_schedules WHERE class_id = ?", (class_id,))
+            cursor.executemany(
+                "INSERT INTO class_schedules (class_id, day_of_week) VALUES (?, ?)",
+                [(class_id, d) for d in days]
+            )
+        self.invalidate()
+
+
+# Global calendar instance, one per tenant
+school_calendar = TenantScoped(SchoolCalendar)
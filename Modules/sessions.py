@@ -0,0 +1,252 @@
+# modules/sessions.py
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import streamlit as st
+from config import APP_CONFIG
+from database import db
+from tenancy import TenantScoped
+
+TOKEN_PARAM = 'session'
+TENANT_PARAM = 'school'
+# Hot sessions kept in memory per tenant
+SESSION_CACHE_SIZE = 1024
+# A session's expiry is written back at most this often
+TOUCH_INTERVAL = timedelta(minutes=1)
+PURGE_INTERVAL = timedelta(hours=1)
+# Limiter keys kept at most; past that a new key evicts the oldest
+LIMITER_MAX_KEYS = 100000
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _timestamp(value):
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def _hash_token(token):
+    return hashlib.sha256(token.encode('ascii')).hexdigest()
+
+
+def get_query_param(name):
+    """A URL query parameter, on Streamlit 1.28 and on versions with st.query_params"""
+    if hasattr(st, 'query_params'):
+        return st.query_params.get(name)
+    return st.experimental_get_query_params().get(name, [None])[0]
+
+
+def set_query_params(**params):
+    """Replace the URL query parameters; None values are dropped"""
+    params = {name: value for name, value in params.items() if value is not None}
+    if hasattr(st, 'query_params'):
+        st.query_params.clear()
+        st.query_params.update(params)
+    else:
+        st.experimental_set_query_params(**params)
+
+
+def client_ip():
+    """Address of the browser, if known.
+
+    Proxy headers are client-supplied unless a proxy in front of Streamlit
+    overwrites them, so they are only read with trust_proxy_headers set;
+    otherwise the connection's own address is used where Streamlit has it.
+    """
+    try:
+        if not APP_CONFIG.get('trust_proxy_headers'):
+            return getattr(st.context, 'ip_address', None) if hasattr(st, 'context') else None
+        if hasattr(st, 'context'):
+            headers = st.context.headers
+        else:
+            from streamlit.web.server.websocket_headers import _get_websocket_headers
+            headers = _get_websocket_headers()
+    except Exception:
+        return None
+    if not headers:
+        return None
+    forwarded = headers.get('X-Forwarded-For') or headers.get('X-Real-Ip')
+    return forwarded.split(',')[0].strip() if forwarded else None
+
+
+class SessionStore:
+    """Login sessions that survive process restarts.
+
+    The browser holds an opaque random token (in the URL); the sessions
+    table holds its sha256, the user, the address it was opened from and a
+    sliding expiry. A token presented from another address is refused, so
+    a copied URL does not carry the login with it. Recently used
+    sessions are cached in an LRU so a rerun costs no query, and the
+    expiry is written back at most once per TOUCH_INTERVAL.
+    """
+
+    def __init__(self, cache_size=SESSION_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.idle = timedelta(minutes=APP_CONFIG.get('session_idle_minutes', 480))
+        self.max_age = timedelta(days=APP_CONFIG.get('session_max_days', 7))
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._last_purge = datetime.now()
+
+    def _remember(self, token_hash, session):
+        with self._lock:
+            self._cache[token_hash] = session
+            self._cache.move_to_end(token_hash)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _forget(self, token_hashes):
+        with self._lock:
+            for token_hash in token_hashes:
+                self._cache.pop(token_hash, None)
+
+    def create(self, user_id, ip_address=None):
+        """Start a session; returns its token"""
+        token = secrets.token_urlsafe(32)
+        token_hash = _hash_token(token)
+        now = datetime.now()
+        session = {
+            'user_id': user_id, 'ip_address': ip_address, 'created_at': now,
+            'expires_at': min(now + self.idle, now + self.max_age), 'touched_at': now
+        }
+        db.execute_query('''
+            INSERT INTO sessions (token_hash, user_id, created_at, expires_at, ip_address)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (token_hash, user_id, _timestamp(now), _timestamp(session['expires_at']), ip_address))
+        self._remember(token_hash, session)
+        self.purge_expired()
+        return token
+
+    def validate(self, token, ip_address=None):
+        """User id of a live session, extending its expiry; None when unknown,
+        expired or opened from another address"""
+        if not token:
+            return None
+        token_hash = _hash_token(token)
+        with self._lock:
+            session = self._cache.get(token_hash)
+            if session is not None:
+                self._cache.move_to_end(token_hash)
+
+        if session is None:
+            row = db.fetch_one(
+                "SELECT user_id, ip_address, created_at, expires_at FROM sessions WHERE token_hash = ?",
+                (token_hash,)
+            )
+            if not row:
+                return None
+            session = {
+                'user_id': row['user_id'], 'ip_address': row['ip_address'],
+                'created_at': datetime.strptime(str(row['created_at'])[:19], TIMESTAMP_FORMAT),
+                'expires_at': datetime.strptime(str(row['expires_at'])[:19], TIMESTAMP_FORMAT),
+                'touched_at': datetime.min
+            }
+            self._remember(token_hash, session)
+
+        if session['ip_address'] and session['ip_address'] != ip_address:
+            return None
+
+        now = datetime.now()
+        if session['expires_at'] <= now:
+            self.revoke(token)
+            return None
+
+        session['expires_at'] = min(now + self.idle, session['created_at'] + self.max_age)
+        if now - session['touched_at'] >= TOUCH_INTERVAL:
+            session['touched_at'] = now
+            db.execute_query(
+                "UPDATE sessions SET expires_at = ? WHERE token_hash = ?",
+                (_timestamp(session['expires_at']), token_hash)
+            )
+        return session['user_id']
+
+    def revoke(self, token):
+        token_hash = _hash_token(token)
+        self._forget([token_hash])
+        db.execute_query("DELETE FROM sessions WHERE token_hash = ?", (token_hash,))
+
+    def revoke_user(self, user_id):
+        """End every session of a user, e.g. after a password change"""
+        with self._lock:
+            stale = [token_hash for token_hash, s in self._cache.items() if s['user_id'] == user_id]
+        self._forget(stale)
+        db.execute_query("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def purge_expired(self, force=False):
+        """Delete expired sessions, at most once per PURGE_INTERVAL unless forced"""
+        now = datetime.now()
+        with self._lock:
+            if not force and now - self._last_purge < PURGE_INTERVAL:
+                return 0
+            self._last_purge = now
+        return db.execute_many("DELETE FROM sessions WHERE expires_at <= ?", [(_timestamp(now),)]) or 0
+
+
+class LoginLimiter:
+    """Token buckets limiting login attempts per key (username or IP).
+
+    A key holds `burst` attempts and regains one every `refill_seconds`.
+    Each key costs two numbers; buckets that would be full again are
+    dropped, since a missing key behaves like a full bucket, so memory
+    follows the keys active within the last refill period. With max_keys
+    buckets still refilling, a new key evicts the one attempted longest
+    ago, so a flood of new keys cannot lock out real users.
+    """
+
+    def __init__(self, burst=None, refill_seconds=None, max_keys=LIMITER_MAX_KEYS):
+        self.burst = burst or APP_CONFIG.get('login_burst', 5)
+        self.refill_seconds = refill_seconds or APP_CONFIG.get('login_refill_seconds', 60)
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # key -> [tokens, updated], oldest update first
+        self._buckets = OrderedDict()
+
+    def _evict(self, now):
+        """Drop the buckets that have refilled, oldest update first"""
+        full_after = self.burst * self.refill_seconds
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated < full_after:
+                break
+            self._buckets.popitem(last=False)
+
+    def _tokens(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return float(self.burst)
+        return min(self.burst, bucket[0] + (now - bucket[1]) / self.refill_seconds)
+
+    def allow(self, key):
+        """Take one attempt from key's bucket; False when it is empty"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            if key not in self._buckets and len(self._buckets) >= self.max_keys:
+                self._buckets.popitem(last=False)
+            tokens = self._tokens(key, now)
+            if tokens < 1:
+                return False
+            self._buckets[key] = [tokens - 1, now]
+            self._buckets.move_to_end(key)
+            return True
+
+    def retry_after(self, key):
+        """Seconds until key has an attempt left"""
+        with self._lock:
+            missing = 1 - self._tokens(key, time.monotonic())
+        return max(0, int(missing * self.refill_seconds + 0.999))
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# Global session store, one per tenant, and login limiters. Many users
+# share a school's address, so the per-IP bucket is larger.
+session_store = TenantScoped(SessionStore)
+login_limiter = LoginLimiter()
+ip_limiter = LoginLimiter(APP_CONFIG.get('login_ip_burst', 100), APP_CONFIG.get('login_ip_refill_seconds', 1))
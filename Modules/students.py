@@ -3,6 +3,8 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, date
 from database import db
+from modules.id_allocator import id_allocator
+from modules.dedup import dedup_engine
 
 def show_students(translator, auth):
     """Display students management"""
@@ -83,7 +85,10 @@ def show_students(translator, auth):
             col1, col2 = st.columns(2)
             
             with col1:
-                student_id = st.text_input("Student ID*", value=f"STU{datetime.now().strftime('%Y%m%d%H%M%S')}")
+                student_id = st.text_input(
+                    "Student ID (blank to auto-generate)",
+                    placeholder=id_allocator.peek('STU')
+                )
                 full_name = st.text_input("Full Name*")
                 date_of_birth = st.date_input("Date of Birth*", min_value=date(2000, 1, 1))
                 gender = st.selectbox("Gender*", ["Male", "Female", "Other"])
@@ -103,7 +108,8 @@ def show_students(translator, auth):
                 status = st.selectbox("Status", ["Active", "Inactive", "Graduated", "Transferred"])
             
             if st.form_submit_button("Add Student"):
-                if all([student_id, full_name, parent_name, parent_phone]):
+                if all([full_name, parent_name, parent_phone]):
+                    student_id = student_id.strip() or id_allocator.next_id('STU')
                     query = '''
                         INSERT INTO students 
                         (student_id, full_name, date_of_birth, gender, address, 
@@ -113,12 +119,15 @@ def show_students(translator, auth):
                     
                     class_id = class_options.get(selected_class)
                     
-                    db.execute_query(query, (
+                    new_id = db.execute_query(query, (
                         student_id, full_name, date_of_birth, gender, address,
                         parent_name, parent_phone, parent_email, class_id, admission_date, status
                     ))
                     
                     st.success("Student added successfully!")
+                    duplicates = dedup_engine.check_records('student', [new_id])
+                    if duplicates:
+                        st.warning(f"{len(duplicates)} possible duplicate record(s) found; review them under Admission > Pending Applications")
                 else:
                     st.error("Please fill all required fields (*)")
     
@@ -134,10 +143,18 @@ def show_students(translator, auth):
             
             if st.button("Import Students"):
                 success_count = 0
+                new_ids = []
+                
+                # IDs for rows without one are reserved together
+                if 'student_id' in df.columns:
+                    missing_ids = df['student_id'].isna() | (df['student_id'].astype(str).str.strip() == '')
+                else:
+                    missing_ids = pd.Series(True, index=df.index)
+                df.loc[missing_ids, 'student_id'] = id_allocator.allocate('STU', int(missing_ids.sum()))
+                
                 for _, row in df.iterrows():
                     try:
-                        # Generate student ID if not provided
-                        student_id = row.get('student_id', f"STU{datetime.now().strftime('%Y%m%d%H%M%S')}{success_count}")
+                        student_id = row['student_id']
                         
                         query = '''
                             INSERT INTO students 
@@ -146,7 +163,7 @@ def show_students(translator, auth):
                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                         '''
                         
-                        db.execute_query(query, (
+                        new_id = db.execute_query(query, (
                             student_id,
                             row.get('full_name', ''),
                             row.get('date_of_birth', date.today()),
@@ -158,8 +175,14 @@ def show_students(translator, auth):
                             row.get('admission_date', date.today()),
                             row.get('status', 'Active')
                         ))
-                        success_count += 1
+                        # execute_query has already shown the error of a failed insert
+                        if new_id is not None:
+                            new_ids.append(new_id)
+                            success_count += 1
                     except Exception as e:
                         st.error(f"Error importing row {_}: {e}")
                 
-                st.success(f"Successfully imported {success_count} students")
\ No newline at end of file
+                st.success(f"Successfully imported {success_count} students")
+                duplicates = dedup_engine.check_records('student', new_ids)
+                if duplicates:
+                    st.warning(f"{len(duplicates)} possible duplicate record(s) found; review them under Admission > Pending Applications")
\ No newline at end of file
@@ -0,0 +1,211 @@
+# modules/summary_cube.py
+import threading
+from database import db
+from tenancy import TenantScoped
+from modules.results_analytics import results_analytics
+from modules.school_calendar import to_date
+
+# Facts produced from each source table. Each query aggregates only the
+# days listed in cube_dirty for that source.
+FACT_QUERIES = {
+    'attendance': [(
+        'attendance',
+        '''
+        SELECT 'attendance', date(a.date), strftime('%Y-%m', a.date), a.class_id, a.status,
+               COUNT(*), 0, 0
+        FROM attendance a
+        WHERE a.date IN (SELECT day FROM cube_dirty WHERE source = 'attendance')
+        GROUP BY date(a.date), a.class_id, a.status
+        '''
+    )],
+    'fees': [(
+        'fees_due',
+        '''
+        SELECT 'fees_due', date(f.due_date), strftime('%Y-%m', f.due_date), s.class_id, f.fee_type,
+               COUNT(*), SUM(f.amount), SUM(f.paid_amount)
+        FROM fees f
+        LEFT JOIN students s ON f.student_id = s.id
+        WHERE f.due_date IN (SELECT day FROM cube_dirty WHERE source = 'fees')
+        GROUP BY date(f.due_date), s.class_id, f.fee_type
+        '''
+    ), (
+        'fees_paid',
+        '''
+        SELECT 'fees_paid', date(f.payment_date), strftime('%Y-%m', f.payment_date), s.class_id, f.fee_type,
+               COUNT(*), SUM(f.paid_amount), 0
+        FROM fees f
+        LEFT JOIN students s ON f.student_id = s.id
+        WHERE f.payment_date IN (SELECT day FROM cube_dirty WHERE source = 'fees')
+            AND f.status IN ('Paid', 'Partial')
+        GROUP BY date(f.payment_date), s.class_id, f.fee_type
+        '''
+    )],
+    'results': [(
+        'results',
+        '''
+        SELECT 'results', date(r.exam_date), strftime('%Y-%m', r.exam_date), r.class_id, r.exam_type,
+               COUNT(*), SUM(CASE WHEN r.percentage >= ? THEN 1 ELSE 0 END), SUM(r.percentage)
+        FROM results r
+        WHERE r.exam_date IN (SELECT day FROM cube_dirty WHERE source = 'results')
+        GROUP BY date(r.exam_date), r.class_id, r.exam_type
+        '''
+    )],
+    'students': [(
+        'admissions',
+        '''
+        SELECT 'admissions', date(s.admission_date), strftime('%Y-%m', s.admission_date), s.class_id, '',
+               COUNT(*), 0, 0
+        FROM students s
+        WHERE s.admission_date IN (SELECT day FROM cube_dirty WHERE source = 'students')
+        GROUP BY date(s.admission_date), s.class_id
+        '''
+    )]
+}
+
+SOURCE_DATES = {
+    'attendance': [('attendance', 'date')],
+    'fees': [('fees', 'due_date'), ('fees', 'payment_date')],
+    'results': [('results', 'exam_date')],
+    'students': [('students', 'admission_date')]
+}
+
+
+class SummaryCube:
+    """Daily facts per (class, dimension) for attendance, fees, results and admissions.
+
+    Triggers on the source tables record changed days in cube_dirty;
+    refresh() re-aggregates just those days and their months in the
+    monthly rollup. Each fact row has a row_count and two measures:
+        attendance  dimension=status    row_count=marks
+        fees_due    dimension=fee_type  value1=amount, value2=paid_amount
+        fees_paid   dimension=fee_type  value1=paid_amount
+        results     dimension=exam_type value1=passed, value2=sum of percentages
+        admissions  dimension=''        row_count=new students
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_empty = False
+
+    def mark_all(self, source=None):
+        """Queue every day of a source (or all sources) for re-aggregation"""
+        sources = [source] if source else list(SOURCE_DATES)
+        with db.transaction() as cursor:
+            for name in sources:
+                for table, column in SOURCE_DATES[name]:
+                    cursor.execute(f'''
+                        INSERT OR IGNORE INTO cube_dirty (source, day)
+                        SELECT DISTINCT ?, {column} FROM {table} WHERE {column} IS NOT NULL
+                    ''', (name,))
+
+    def rebuild(self):
+        """Re-aggregate everything from the source tables"""
+        self.mark_all()
+        return self.refresh()
+
+    def refresh(self):
+        """Apply pending changes; returns the number of dirty days processed"""
+        with self._lock:
+            if not self._checked_empty:
+                # First use on an existing database: build the whole cube
+                self._checked_empty = True
+                if not db.fetch_one("SELECT 1 FROM summary_cube LIMIT 1"):
+                    self.mark_all()
+
+            pending = db.fetch_all("SELECT source, COUNT(*) as days FROM cube_dirty GROUP BY source")
+            if not pending:
+                return 0
+
+            pass_mark = results_analytics.get_pass_mark()
+            with db.transaction() as cursor:
+                cursor.execute('''
+                    CREATE TEMP TABLE IF NOT EXISTS cube_dirty_months (month TEXT PRIMARY KEY)
+                ''')
+                cursor.execute("DELETE FROM cube_dirty_months")
+                cursor.execute('''
+                    INSERT OR IGNORE INTO cube_dirty_months
+                    SELECT DISTINCT strftime('%Y-%m', day) FROM cube_dirty
+                ''')
+                for row in pending:
+                    facts = FACT_QUERIES.get(row['source'], [])
+                    for fact, query in facts:
+                        cursor.execute('''
+                            DELETE FROM summary_cube
+                            WHERE fact = ? AND day IN (SELECT date(day) FROM cube_dirty WHERE source = ?)
+                        ''', (fact, row['source']))
+                        cursor.execute(f'''
+                            INSERT INTO summary_cube
+                            (fact, day, month, class_id, dimension, row_count, value1, value2)
+                            {query}
+                        ''', (pass_mark,) if fact == 'results' else ())
+                    cursor.execute("DELETE FROM cube_dirty WHERE source = ?", (row['source'],))
+                
+                # Roll the touched months up again from the daily rows
+                cursor.execute('''
+                    DELETE FROM summary_cube_monthly
+                    WHERE month IN (SELECT month FROM cube_dirty_months)
+                ''')
+                cursor.execute('''
+                    INSERT INTO summary_cube_monthly
+                    (fact, month, class_id, dimension, row_count, value1, value2)
+                    SELECT fact, month, class_id, dimension,
+                           SUM(row_count), SUM(value1), SUM(value2)
+                    FROM summary_cube
+                    WHERE month IN (SELECT month FROM cube_dirty_months)
+                    GROUP BY fact, month, class_id, dimension
+                ''')
+
+            return sum(row['days'] for row in pending)
+
+    def _facts_query(self, start_date, end_date, group_by, facts=None, class_id=None):
+        """Aggregate over a date range: whole months from the monthly rollup,
+        the partial months at either end from the daily rows"""
+        start_date, end_date = to_date(start_date), to_date(end_date)
+        first_month, last_month = start_date.strftime('%Y-%m'), end_date.strftime('%Y-%m')
+
+        filters = ''
+        filter_params = []
+        if facts:
+            filters += f" AND fact IN ({', '.join('?' for _ in facts)})"
+            filter_params.extend(facts)
+        if class_id:
+            filters += " AND class_id = ?"
+            filter_params.append(class_id)
+
+        query = f'''
+            SELECT {group_by}, SUM(row_count) as row_count,
+                   SUM(value1) as value1, SUM(value2) as value2
+            FROM (
+                SELECT fact, month, dimension, row_count, value1, value2
+                FROM summary_cube_monthly
+                WHERE month > ? AND month < ? {filters}
+                UNION ALL
+                SELECT fact, month, dimension, row_count, value1, value2
+                FROM summary_cube
+                WHERE day BETWEEN ? AND ? AND month IN (?, ?) {filters}
+            )
+            GROUP BY {group_by}
+        '''
+        params = [first_month, last_month] + filter_params + [
+            start_date.isoformat(), end_date.isoformat(), first_month, last_month
+        ] + filter_params
+        return query, params
+
+    def totals(self, start_date, end_date, class_id=None):
+        """{(fact, dimension): (row_count, value1, value2)} for a date range"""
+        self.refresh()
+        query, params = self._facts_query(start_date, end_date, 'fact, dimension', class_id=class_id)
+        return {
+            (r['fact'], r['dimension']): (r['row_count'] or 0, r['value1'] or 0, r['value2'] or 0)
+            for r in db.fetch_all(query, params)
+        }
+
+    def monthly(self, facts, start_date, end_date, class_id=None):
+        """Per-month rows for the given facts as a DataFrame"""
+        self.refresh()
+        query, params = self._facts_query(start_date, end_date, 'fact, month, dimension', facts, class_id)
+        return db.get_dataframe(query + " ORDER BY month", params)
+
+
+# Global cube instance, one per tenant
+summary_cube = TenantScoped(SummaryCube)
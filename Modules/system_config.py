@@ -3,24 +3,29 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from database import db
-from modules.auth import auth
+from auth import auth
+from modules.credentials import password_hasher
+from modules.school_calendar import school_calendar, DAYS
+from modules.summary_cube import summary_cube
+from modules.results_analytics import results_analytics
+from modules.user_directory import user_directory
+from modules.transcripts import transcript_engine
 
 def show_system_config(translator, auth_instance):
     """Display system configuration"""
     st.title(translator.t('system_config'))
     
-    # Check if user has permission (only developer and super_admin)
-    user_role = auth_instance.get_user_role()
-    if user_role not in ['developer', 'super_admin']:
+    if not auth_instance.has_permission('system_config'):
         st.error("Access denied. Only developers and super admins can access system configuration.")
         return
     
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
         "School Information",
         "Academic Settings",
         "User Management",
         "Database Management",
-        "System Logs"
+        "System Logs",
+        "School Calendar"
     ])
     
     with tab1:
@@ -112,12 +117,35 @@ def show_system_config(translator, auth_instance):
                 value=40
             )
             
+            st.markdown("**Attendance Alerts**")
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                absence_window_days = st.number_input(
+                    "Alert Window (school days)", min_value=1, max_value=62, value=20
+                )
+                absence_streak_threshold = st.number_input(
+                    "Consecutive Absences Threshold", min_value=1, max_value=62, value=3
+                )
+            
+            with col2:
+                absence_window_threshold = st.number_input(
+                    "Absences in Window Threshold", min_value=1, max_value=62, value=5
+                )
+                late_threshold = st.number_input(
+                    "Late Marks in Window Threshold", min_value=1, max_value=62, value=5
+                )
+            
             if st.form_submit_button("Save Academic Settings"):
                 configs = [
                     ('academic_year', academic_year, 'Current Academic Year'),
                     ('grading_system', grading_system, 'Grading System Type'),
                     ('attendance_threshold', str(attendance_threshold), 'Minimum Attendance %'),
-                    ('pass_percentage', str(pass_percentage), 'Passing Percentage')
+                    ('pass_percentage', str(pass_percentage), 'Passing Percentage'),
+                    ('absence_window_days', str(absence_window_days), 'Attendance Alert Window (school days)'),
+                    ('absence_streak_threshold', str(absence_streak_threshold), 'Consecutive Absences Alert Threshold'),
+                    ('absence_window_threshold', str(absence_window_threshold), 'Absences in Window Alert Threshold'),
+                    ('late_threshold', str(late_threshold), 'Late Marks in Window Alert Threshold')
                 ]
                 
                 for key, value, desc in configs:
@@ -138,6 +166,9 @@ def show_system_config(translator, auth_instance):
                             VALUES (?, ?, 'academic_settings', ?)
                         ''', (key, value, desc))
                 
+                # Pass counts depend on the passing percentage
+                results_analytics.invalidate()
+                summary_cube.mark_all('results')
                 st.success("Academic settings saved!")
     
     with tab3:
@@ -179,9 +210,7 @@ def show_system_config(translator, auth_instance):
             if st.form_submit_button("Add User"):
                 if all([username, full_name, email, password, confirm_password]):
                     if password == confirm_password:
-                        # Hash password
-                        import hashlib
-                        hashed_password = hashlib.sha256(password.encode()).hexdigest()
+                        hashed_password = password_hasher.hash_async(password).result()
                         
                         query = '''
                             INSERT INTO users 
@@ -193,6 +222,7 @@ def show_system_config(translator, auth_instance):
                             username, hashed_password, full_name, email,
                             phone, role, 1 if is_active else 0
                         ))
+                        user_directory.invalidate()
                         
                         st.success("User added successfully!")
                     else:
@@ -283,4 +313,83 @@ def show_system_config(translator, auth_instance):
         with col2:
             st.write(f"**Processor:** {platform.processor()}")
             st.write(f"**Machine:** {platform.machine()}")
-            st.write(f"**Platform:** {platform.platform()}")
\ No newline at end of file
+            st.write(f"**Platform:** {platform.platform()}")
+    
+    with tab6:
+        st.subheader("Terms")
+        
+        terms_df = db.get_dataframe("SELECT id, term_name, academic_year, start_date, end_date FROM academic_terms ORDER BY start_date")
+        if not terms_df.empty:
+            st.dataframe(terms_df, use_container_width=True)
+        
+        with st.form("add_term_form"):
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                term_name = st.text_input("Term Name*", placeholder="e.g., Term 1")
+                term_year = st.text_input("Academic Year", value=f"{datetime.now().year}-{datetime.now().year + 1}")
+            
+            with col2:
+                term_start = st.date_input("Term Start*")
+                term_end = st.date_input("Term End*")
+            
+            if st.form_submit_button("Add Term"):
+                if term_name and term_start <= term_end:
+                    school_calendar.add_term(term_name, term_year, term_start, term_end)
+                    # Results already entered in these dates move out of "No Term"
+                    transcript_engine.recompute_from(term_start)
+                    st.success("Term added!")
+                    st.rerun()
+                else:
+                    st.error("Please enter a term name and a valid date range")
+        
+        st.markdown("---")
+        st.subheader("Holidays")
+        
+        classes = db.fetch_all("SELECT id, class_name FROM classes")
+        class_options = {"Whole School": None}
+        class_options.update({c['class_name']: c['id'] for c in classes})
+        
+        holidays_df = db.get_dataframe('''
+            SELECT h.id, h.description, h.start_date, h.end_date,
+                   COALESCE(c.class_name, 'Whole School') as applies_to
+            FROM holidays h
+            LEFT JOIN classes c ON h.class_id = c.id
+            ORDER BY h.start_date
+        ''')
+        if not holidays_df.empty:
+            st.dataframe(holidays_df, use_container_width=True)
+        
+        with st.form("add_holiday_form"):
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                holiday_description = st.text_input("Description*", placeholder="e.g., National Day")
+                holiday_class = st.selectbox("Applies To", list(class_options.keys()))
+            
+            with col2:
+                holiday_start = st.date_input("From*")
+                holiday_end = st.date_input("To*")
+            
+            if st.form_submit_button("Add Holiday"):
+                if holiday_description and holiday_start <= holiday_end:
+                    school_calendar.add_holiday(
+                        holiday_description, holiday_start, holiday_end, class_options[holiday_class]
+                    )
+                    st.success("Holiday added!")
+                    st.rerun()
+                else:
+                    st.error("Please enter a description and a valid date range")
+        
+        st.markdown("---")
+        st.subheader("Class Schedules")
+        st.caption("Classes without a schedule follow the Monday to Friday school week.")
+        
+        with st.form("class_schedule_form"):
+            schedule_class = st.selectbox("Class", [name for name in class_options if class_options[name]])
+            school_days = st.multiselect("School Days", DAYS, default=DAYS[:5])
+            
+            if st.form_submit_button("Save Schedule"):
+                if schedule_class:
+                    school_calendar.set_class_schedule(class_options[schedule_class], school_days)
+                    st.success("Class schedule saved!")
@@ -1,8 +1,9 @@
 # modules/teachers.py
 import streamlit as st
 import pandas as pd
-from datetime import datetime, date
+from datetime import date
 from database import db
+from modules.id_allocator import id_allocator
 
 def show_teachers(translator, auth):
     """Display teachers management"""
@@ -73,7 +74,10 @@ def show_teachers(translator, auth):
             col1, col2 = st.columns(2)
             
             with col1:
-                teacher_id = st.text_input("Teacher ID*", value=f"TCH{datetime.now().strftime('%Y%m%d%H%M%S')}")
+                teacher_id = st.text_input(
+                    "Teacher ID (blank to auto-generate)",
+                    placeholder=id_allocator.peek('TCH')
+                )
                 full_name = st.text_input("Full Name*")
                 date_of_birth = st.date_input("Date of Birth", min_value=date(1950, 1, 1))
                 gender = st.selectbox("Gender", ["Male", "Female", "Other"])
@@ -88,7 +92,8 @@ def show_teachers(translator, auth):
                 status = st.selectbox("Status", ["Active", "Inactive", "Retired", "Resigned"])
             
             if st.form_submit_button("Add Teacher"):
-                if all([teacher_id, full_name, phone, email, qualification, specialization]):
+                if all([full_name, phone, email, qualification, specialization]):
+                    teacher_id = teacher_id.strip() or id_allocator.next_id('TCH')
                     query = '''
                         INSERT INTO teachers 
                         (teacher_id, full_name, date_of_birth, gender, address, 
@@ -0,0 +1,134 @@
+# modules/tenant_reports.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, timedelta
+import pandas as pd
+from database import tenant_pool
+from storage import create_backend, Error
+from tenancy import list_tenants, multi_tenant, tenant_database_path
+
+TENANT_WORKERS = 8
+DEFAULT_PERIOD_DAYS = 30
+
+
+def _period(params):
+    end = params.get('end_date') or date.today()
+    start = params.get('start_date') or end - timedelta(days=DEFAULT_PERIOD_DAYS)
+    return str(start), str(end)
+
+
+def _school_overview(params):
+    start, end = _period(params)
+    return '''
+        SELECT
+            (SELECT COUNT(*) FROM students WHERE status = 'Active') as students,
+            (SELECT COUNT(*) FROM teachers WHERE status = 'Active') as teachers,
+            (SELECT COUNT(*) FROM classes) as classes,
+            (SELECT ROUND(100.0 * SUM(CASE WHEN status IN ('Present', 'Late') THEN 1 ELSE 0 END)
+                    / NULLIF(COUNT(*), 0), 1)
+             FROM attendance WHERE date BETWEEN ? AND ?) as attendance_rate,
+            (SELECT COALESCE(SUM(amount), 0) FROM fees WHERE due_date BETWEEN ? AND ?) as fees_due,
+            (SELECT COALESCE(SUM(paid_amount), 0) FROM fees WHERE due_date BETWEEN ? AND ?) as fees_collected,
+            (SELECT COUNT(*) FROM admission_applications
+             WHERE status IN ('Pending', 'Under Review', 'Waitlisted')) as open_applications
+    ''', [start, end, start, end, start, end]
+
+
+def _enrolment_by_grade(params):
+    return '''
+        SELECT c.grade_level, COALESCE(SUM(e.students), 0) as students, SUM(c.capacity) as capacity
+        FROM classes c
+        LEFT JOIN (
+            SELECT class_id, COUNT(*) as students
+            FROM students
+            WHERE status = 'Active'
+            GROUP BY class_id
+        ) e ON e.class_id = c.id
+        GROUP BY c.grade_level
+        ORDER BY c.grade_level
+    ''', []
+
+
+def _fees_by_type(params):
+    start, end = _period(params)
+    return '''
+        SELECT fee_type, COUNT(*) as invoices, SUM(amount) as amount_due,
+               SUM(paid_amount) as amount_paid, SUM(amount - paid_amount) as balance
+        FROM fees
+        WHERE due_date BETWEEN ? AND ?
+        GROUP BY fee_type
+        ORDER BY fee_type
+    ''', [start, end]
+
+
+# Reports run against every school; each builds (query, params) from a params dict
+CROSS_TENANT_REPORTS = {
+    'school_overview': {'label': "School Overview", 'build': _school_overview},
+    'enrolment_by_grade': {'label': "Enrolment by Grade", 'build': _enrolment_by_grade},
+    'fees_by_type': {'label': "Fees by Type", 'build': _fees_by_type},
+}
+
+
+@contextmanager
+def tenant_connection(tenant):
+    """A connection of its own to tenant's database.
+
+    Schools already open in the pool are leased from it; others get a
+    short-lived connection so a report over every school does not evict
+    the schools in use from the pool.
+    """
+    if not multi_tenant() or tenant in tenant_pool.open_tenants():
+        with tenant_pool.lease(tenant) as database:
+            conn = database.connect()
+            try:
+                yield conn
+            finally:
+                conn.close()
+        return
+
+    path = tenant_database_path(tenant)
+    if not os.path.exists(path):
+        raise KeyError(f"Unknown tenant: {tenant}")
+    backend = create_backend(f"sqlite:///{path}")
+    conn = backend.connect()
+    try:
+        yield conn
+    finally:
+        conn.close()
+        backend.dispose()
+
+
+def _query_tenant(tenant, query, params):
+    with tenant_connection(tenant) as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return pd.DataFrame.from_records(cursor.fetchall(), columns=[d[0] for d in cursor.description])
+
+
+def run_cross_tenant_report(report_name, params=None, tenants=None, workers=TENANT_WORKERS):
+    """Run a report against every school in parallel.
+
+    Each worker thread reads one tenant file on its own connection.
+    Returns (DataFrame with a leading school column, {school: error}).
+    """
+    if report_name not in CROSS_TENANT_REPORTS:
+        raise ValueError(f"Unknown report: {report_name}")
+    query, query_params = CROSS_TENANT_REPORTS[report_name]['build'](params or {})
+    tenants = tenants or list_tenants()
+
+    frames = []
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tenants))),
+                            thread_name_prefix='tenant-report') as executor:
+        futures = {tenant: executor.submit(_query_tenant, tenant, query, query_params) for tenant in tenants}
+        for tenant, future in futures.items():
+            try:
+                frame = future.result()
+            except Error + (KeyError,) as e:
+                errors[tenant] = str(e)
+                continue
+            frame.insert(0, 'school', tenant)
+            frames.append(frame)
+
+    return (pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()), errors
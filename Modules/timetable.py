@@ -3,6 +3,10 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from database import db
+from modules.timetable_index import timetable_index
+from modules.timetable_import import import_timetable
+from modules.timetable_views import timetable_views
+from modules.timetable_solver import generate_timetable, save_generated_timetable, DEFAULT_DAYS, DEFAULT_PERIODS
 
 def show_timetable(translator, auth):
     """Display timetable management"""
@@ -11,48 +15,54 @@ def show_timetable(translator, auth):
     tab1, tab2, tab3 = st.tabs(["View Timetable", "Manage Timetable", "Generate Timetable"])
     
     with tab1:
-        # Class selector
-        classes = db.fetch_all("SELECT id, class_name FROM classes")
-        class_options = {c['class_name']: c['id'] for c in classes}
-        selected_class_name = st.selectbox("Select Class", list(class_options.keys()))
-        
-        if selected_class_name:
-            class_id = class_options[selected_class_name]
-            
-            # Get timetable for selected class
-            timetable_df = db.get_dataframe('''
-                SELECT tt.day_of_week, tt.period, tt.start_time, tt.end_time,
-                       s.subject_name, t.full_name as teacher_name, tt.room
-                FROM timetable tt
-                LEFT JOIN subjects s ON tt.subject_id = s.id
-                LEFT JOIN teachers t ON tt.teacher_id = t.id
-                WHERE tt.class_id = ?
-                ORDER BY 
-                    CASE tt.day_of_week
-                        WHEN 'Monday' THEN 1
-                        WHEN 'Tuesday' THEN 2
-                        WHEN 'Wednesday' THEN 3
-                        WHEN 'Thursday' THEN 4
-                        WHEN 'Friday' THEN 5
-                        WHEN 'Saturday' THEN 6
-                        WHEN 'Sunday' THEN 7
-                    END,
-                    tt.period
-            ''', (class_id,))
-            
-            if not timetable_df.empty:
-                # Pivot table for better display
-                pivot_df = timetable_df.pivot_table(
-                    index='period',
-                    columns='day_of_week',
-                    values=['subject_name', 'teacher_name', 'room'],
-                    aggfunc='first'
+        view_by = st.radio("View by", ["Class", "Teacher", "Room"], horizontal=True)
+
+        if view_by == "Class":
+            classes = db.fetch_all("SELECT id, class_name FROM classes")
+            options = {c['class_name']: c['id'] for c in classes}
+        elif view_by == "Teacher":
+            teachers = db.fetch_all("SELECT id, full_name FROM teachers WHERE status = 'Active'")
+            options = {t['full_name']: t['id'] for t in teachers}
+        else:
+            options = {room: room for room in timetable_index.owners('room')}
+
+        selected_name = st.selectbox(f"Select {view_by}", list(options.keys()))
+
+        if selected_name:
+            grid = timetable_views.get_grid(view_by.lower(), options[selected_name])
+            if (grid != '').any().any():
+                st.dataframe(grid, use_container_width=True)
+                st.download_button(
+                    label="Download CSV",
+                    data=grid.to_csv(),
+                    file_name=f"timetable_{selected_name}.csv",
+                    mime="text/csv"
                 )
-                
-                # Display as table
-                st.dataframe(pivot_df, use_container_width=True)
             else:
-                st.info(f"No timetable found for {selected_class_name}")
+                st.info(f"No timetable found for {selected_name}")
+
+        with st.expander("Export All Teacher Timetables"):
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("Prepare Printable HTML"):
+                    st.session_state.teacher_timetables_html = timetable_views.export_teachers_html()
+                if st.session_state.get('teacher_timetables_html'):
+                    st.download_button(
+                        label="Download HTML",
+                        data=st.session_state.teacher_timetables_html,
+                        file_name="teacher_timetables.html",
+                        mime="text/html"
+                    )
+            with col2:
+                if st.button("Prepare CSV Zip"):
+                    st.session_state.teacher_timetables_zip = timetable_views.export_teachers_csv_zip()
+                if st.session_state.get('teacher_timetables_zip'):
+                    st.download_button(
+                        label="Download Zip",
+                        data=st.session_state.teacher_timetables_zip,
+                        file_name="teacher_timetables.zip",
+                        mime="application/zip"
+                    )
     
     with tab2:
         st.subheader("Add/Edit Timetable Entry")
@@ -93,6 +103,7 @@ def show_timetable(translator, auth):
                 
                 room = st.text_input("Room Number", placeholder="e.g., Room 101")
                 academic_year = st.text_input("Academic Year", value="2024-2025")
+                allow_clash = st.checkbox("Allow double booking")
             
             if st.form_submit_button("Save Timetable Entry"):
                 if all([selected_class_name, day_of_week, period, start_time, end_time, 
@@ -102,41 +113,57 @@ def show_timetable(translator, auth):
                     subject_id = subject_options[selected_subject_name]
                     teacher_id = teacher_options[selected_teacher_name]
                     
-                    # Check if entry already exists
-                    existing = db.fetch_one('''
-                        SELECT id FROM timetable 
-                        WHERE class_id = ? AND day_of_week = ? AND period = ?
-                    ''', (class_id, day_of_week, period))
-                    
-                    if existing:
-                        # Update existing entry
-                        query = '''
-                            UPDATE timetable 
-                            SET subject_id = ?, teacher_id = ?, start_time = ?, 
-                                end_time = ?, room = ?, academic_year = ?
-                            WHERE id = ?
-                        '''
-                        db.execute_query(query, (
-                            subject_id, teacher_id, start_time, end_time,
-                            room, academic_year, existing['id']
-                        ))
-                        st.success("Timetable entry updated!")
+                    clashes = timetable_index.find_clashes(class_id, day_of_week, period, teacher_id, room)
+                    if clashes and not allow_clash:
+                        class_names = {v: k for k, v in class_options.items()}
+                        for clash in clashes:
+                            st.error(
+                                f"{clash['clash_type']} already booked for "
+                                f"{class_names.get(clash['class_id'], clash['class_id'])} "
+                                f"on {day_of_week} period {period}"
+                            )
                     else:
-                        # Insert new entry
-                        query = '''
-                            INSERT INTO timetable 
-                            (class_id, day_of_week, period, subject_id, teacher_id, 
-                             start_time, end_time, room, academic_year)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        '''
-                        db.execute_query(query, (
+                        existing = timetable_index.get_class_entry(class_id, day_of_week, period)
+                        timetable_index.save_entry(
                             class_id, day_of_week, period, subject_id, teacher_id,
                             start_time, end_time, room, academic_year
-                        ))
-                        st.success("Timetable entry added!")
+                        )
+                        st.success("Timetable entry updated!" if existing else "Timetable entry added!")
                 else:
                     st.error("Please fill all required fields (*)")
     
+        st.subheader("Bulk Import")
+        st.caption("Upload a filled-in template from the Generate Timetable tab. Rows without a subject are skipped.")
+        uploaded_file = st.file_uploader("Timetable CSV", type=['csv'], key="timetable_import_file")
+        import_year = st.text_input("Academic Year", value="2024-2025", key="import_year")
+        skip_invalid = st.checkbox("Import valid rows and skip rows with problems")
+
+        if uploaded_file is not None and st.button("Import Timetable"):
+            import_df = pd.read_csv(uploaded_file)
+            saved, problems = import_timetable(import_df, import_year, skip_invalid)
+            if saved:
+                st.success(f"Imported {saved} timetable entries!")
+            if problems:
+                st.error(f"{len(problems)} problem(s) found" + ("" if skip_invalid else "; nothing was imported"))
+                st.dataframe(pd.DataFrame(problems), use_container_width=True)
+            elif not saved:
+                st.info("No periods with a subject were found in the file")
+
+        st.subheader("Clash Report")
+        conflicts = timetable_index.conflict_report()
+        if conflicts:
+            class_names = {c['id']: c['class_name'] for c in db.fetch_all("SELECT id, class_name FROM classes")}
+            teacher_names = {t['id']: t['full_name'] for t in db.fetch_all("SELECT id, full_name FROM teachers")}
+            st.dataframe(pd.DataFrame([{
+                'Type': c['clash_type'],
+                'Booked': teacher_names.get(c['owner'], c['owner']) if c['clash_type'] == 'Teacher' else c['owner'],
+                'Day': c['day_of_week'],
+                'Period': c['period'],
+                'Classes': ', '.join(str(class_names.get(i, i)) for i in c['class_ids'])
+            } for c in conflicts]), use_container_width=True)
+        else:
+            st.success("No teacher or room is double-booked")
+
     with tab3:
         st.subheader("Generate Timetable")
         
@@ -187,4 +214,130 @@ def show_timetable(translator, auth):
                     mime="text/csv"
                 )
             else:
-                st.warning(f"No subjects found for {selected_class_name}. Please add subjects first.")
\ No newline at end of file
+                st.warning(f"No subjects found for {selected_class_name}. Please add subjects first.")
+
+        st.markdown("---")
+        st.subheader("Automatic School Timetable")
+
+        with st.expander("Weekly Periods and Rooms per Subject"):
+            subjects_df = db.get_dataframe('''
+                SELECT s.id, c.class_name, s.subject_name, t.full_name as teacher_name,
+                       s.weekly_periods, s.room
+                FROM subjects s
+                JOIN classes c ON s.class_id = c.id
+                LEFT JOIN teachers t ON s.teacher_id = t.id
+                ORDER BY c.class_name, s.subject_name
+            ''')
+
+            if not subjects_df.empty:
+                edited_df = st.data_editor(
+                    subjects_df,
+                    disabled=['id', 'class_name', 'subject_name', 'teacher_name'],
+                    hide_index=True,
+                    use_container_width=True,
+                    key="subject_periods_editor"
+                )
+                if st.button("Save Subject Periods"):
+                    db.execute_many(
+                        "UPDATE subjects SET weekly_periods = ?, room = ? WHERE id = ?",
+                        [
+                            (int(row['weekly_periods'] or 0), row['room'] or None, int(row['id']))
+                            for _, row in edited_df.iterrows()
+                        ]
+                    )
+                    st.success("Subject periods saved!")
+            else:
+                st.info("No subjects found. Please add subjects first.")
+
+        with st.expander("Teacher Unavailability"):
+            with st.form("teacher_unavailability_form"):
+                teachers = db.fetch_all("SELECT id, full_name FROM teachers WHERE status = 'Active'")
+                teacher_options = {t['full_name']: t['id'] for t in teachers}
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    unavailable_teacher = st.selectbox("Teacher", list(teacher_options.keys()))
+                with col2:
+                    unavailable_day = st.selectbox("Day", DEFAULT_DAYS + ["Saturday", "Sunday"])
+                with col3:
+                    unavailable_periods = st.multiselect("Periods", list(range(1, 11)))
+
+                if st.form_submit_button("Mark Unavailable"):
+                    if unavailable_teacher and unavailable_periods:
+                        db.execute_many('''
+                            INSERT OR IGNORE INTO teacher_unavailability (teacher_id, day_of_week, period)
+                            VALUES (?, ?, ?)
+                        ''', [
+                            (teacher_options[unavailable_teacher], unavailable_day, p)
+                            for p in unavailable_periods
+                        ])
+                        st.success("Unavailability saved!")
+                    else:
+                        st.error("Please select a teacher and at least one period")
+
+            unavailability_df = db.get_dataframe('''
+                SELECT tu.id, t.full_name as teacher_name, tu.day_of_week, tu.period
+                FROM teacher_unavailability tu
+                JOIN teachers t ON tu.teacher_id = t.id
+                ORDER BY t.full_name, tu.day_of_week, tu.period
+            ''')
+            if not unavailability_df.empty:
+                st.dataframe(unavailability_df, use_container_width=True)
+                remove_ids = st.multiselect("Remove entries", unavailability_df['id'].tolist())
+                if remove_ids and st.button("Remove Selected"):
+                    db.execute_many("DELETE FROM teacher_unavailability WHERE id = ?", [(i,) for i in remove_ids])
+                    st.rerun()
+
+        col1, col2 = st.columns(2)
+        with col1:
+            generation_days = st.multiselect("School Days", DEFAULT_DAYS + ["Saturday", "Sunday"], default=DEFAULT_DAYS)
+            periods_per_day = st.number_input("Periods per Day", min_value=1, max_value=10, value=DEFAULT_PERIODS)
+            generation_classes = st.multiselect("Classes (leave empty for all)", list(class_options.keys()))
+        with col2:
+            time_budget = st.number_input("Time Budget (seconds)", min_value=5, max_value=300, value=30)
+            workers = st.number_input("Parallel Workers", min_value=1, max_value=8, value=1)
+            generation_year = st.text_input("Academic Year", value="2024-2025", key="generation_year")
+
+        if st.button("Generate School Timetable"):
+            if generation_days:
+                with st.spinner("Searching for a clash-free timetable..."):
+                    st.session_state.generated_timetable = generate_timetable(
+                        days=generation_days,
+                        periods_per_day=int(periods_per_day),
+                        time_budget=int(time_budget),
+                        workers=int(workers),
+                        class_ids=[class_options[c] for c in generation_classes] or None
+                    )
+            else:
+                st.error("Please select at least one school day")
+
+        result = st.session_state.get('generated_timetable')
+        if result:
+            metrics = result['metrics']
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Lessons Placed", metrics['lessons'] - metrics['unplaced'])
+            col2.metric("Unplaced", metrics['unplaced'])
+            col3.metric("Teacher Gaps", metrics['teacher_gaps'])
+            col4.metric("Repeated Subjects", metrics['subject_repeats'])
+            st.caption(f"Searched {metrics['restarts']} restarts in {metrics['seconds']}s")
+
+            for issue in result['issues']:
+                st.warning(issue)
+
+            if result['entries']:
+                class_names = {v: k for k, v in class_options.items()}
+                subject_names = {s['id']: s['subject_name'] for s in db.fetch_all("SELECT id, subject_name FROM subjects")}
+                teacher_names = {t['id']: t['full_name'] for t in db.fetch_all("SELECT id, full_name FROM teachers")}
+                preview_df = pd.DataFrame([{
+                    'Class': class_names.get(e['class_id']),
+                    'Day': e['day_of_week'],
+                    'Period': e['period'],
+                    'Subject': subject_names.get(e['subject_id']),
+                    'Teacher': teacher_names.get(e['teacher_id']),
+                    'Room': e['room']
+                } for e in result['entries']])
+                st.dataframe(preview_df, use_container_width=True)
+
+                if st.button("Save to Timetable"):
+                    saved = save_generated_timetable(result, generation_year)
+                    del st.session_state.generated_timetable
+                    st.success(f"Saved {saved} timetable entries! Existing timetables of these classes were replaced.")
@@ -0,0 +1,155 @@
+# modules/timetable_import.py
+import pandas as pd
+from database import db
+from modules.school_calendar import DAYS
+from modules.timetable_index import timetable_index, room_key
+
+TEMPLATE_COLUMNS = ['Class', 'Day', 'Period', 'Subject', 'Teacher', 'Start Time', 'End Time', 'Room']
+
+
+def _text(value):
+    """Cell value as a stripped string ('' for blanks and NaN)"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ''
+    return str(value).strip()
+
+
+def _load_lookups():
+    """Name -> id maps for classes, subjects and teachers, loaded once per import"""
+    class_rows = db.fetch_all("SELECT id, class_name FROM classes")
+    classes = {c['class_name'].strip().lower(): c['id'] for c in class_rows}
+    class_names = {c['id']: c['class_name'] for c in class_rows}
+
+    subjects = {}
+    for s in db.fetch_all("SELECT id, subject_name, class_id, teacher_id FROM subjects"):
+        subjects[(s['class_id'], s['subject_name'].strip().lower())] = (s['id'], s['teacher_id'])
+
+    teachers = {}
+    for t in db.fetch_all("SELECT id, full_name, teacher_id FROM teachers"):
+        teachers[t['full_name'].strip().lower()] = t['id']
+        teachers[t['teacher_id'].strip().lower()] = t['id']
+
+    return classes, class_names, subjects, teachers
+
+
+def import_timetable(df, academic_year, skip_invalid=False):
+    """Validate and upsert a filled-in timetable template.
+
+    Rows with a blank Subject are free periods and are skipped. Every other
+    row is checked for unknown names, duplicate slots and teacher or room
+    clashes against both the rest of the upload and the existing timetable.
+    Nothing is saved while problems remain unless skip_invalid is set, in
+    which case only the clean rows are saved.
+
+    Returns (saved_count, problems) where problems is a list of dicts with
+    the CSV row number and a description.
+    """
+    missing = [c for c in TEMPLATE_COLUMNS if c not in df.columns and c not in ('Start Time', 'End Time', 'Room')]
+    if missing:
+        return 0, [{'row': None, 'problem': f"Missing columns: {', '.join(missing)}"}]
+
+    classes, class_names, subjects, teachers = _load_lookups()
+    problems = []
+    entries = []
+    slots_seen = {}
+
+    def problem(row_number, message):
+        problems.append({'row': row_number, 'problem': message})
+
+    for position, (_, row) in enumerate(df.iterrows()):
+        # Header is line 1 of the CSV
+        row_number = position + 2
+        subject_name = _text(row.get('Subject'))
+        if not subject_name:
+            continue
+
+        class_id = classes.get(_text(row.get('Class')).lower())
+        if class_id is None:
+            problem(row_number, f"Unknown class '{_text(row.get('Class'))}'")
+            continue
+
+        day = _text(row.get('Day')).capitalize()
+        if day not in DAYS:
+            problem(row_number, f"Invalid day '{_text(row.get('Day'))}'")
+            continue
+
+        try:
+            period = int(float(_text(row.get('Period'))))
+        except ValueError:
+            period = 0
+        if not 1 <= period <= 10:
+            problem(row_number, f"Invalid period '{_text(row.get('Period'))}'")
+            continue
+
+        subject = subjects.get((class_id, subject_name.lower()))
+        if subject is None:
+            problem(row_number, f"Subject '{subject_name}' is not set up for this class")
+            continue
+
+        teacher_name = _text(row.get('Teacher'))
+        if teacher_name:
+            teacher_id = teachers.get(teacher_name.lower())
+            if teacher_id is None:
+                problem(row_number, f"Unknown teacher '{teacher_name}'")
+                continue
+        else:
+            teacher_id = subject[1]
+
+        slot = (class_id, day, period)
+        if slot in slots_seen:
+            problem(row_number, f"Duplicate of row {slots_seen[slot]} for the same class, day and period")
+            continue
+        slots_seen[slot] = row_number
+
+        entries.append({
+            'row': row_number,
+            'class_id': class_id,
+            'day_of_week': day,
+            'period': period,
+            'subject_id': subject[0],
+            'teacher_id': teacher_id,
+            'start_time': _text(row.get('Start Time')) or f"{7 + period}:00",
+            'end_time': _text(row.get('End Time')) or f"{8 + period}:00",
+            'room': _text(row.get('Room')) or None
+        })
+
+    # Existing entries in slots the upload overwrites no longer count
+    replaced = {
+        timetable_index.get_class_entry(e['class_id'], e['day_of_week'], e['period'])
+        for e in entries
+    }
+    uploaded_teachers = {}
+    uploaded_rooms = {}
+    clean = []
+    for e in entries:
+        clashes = [
+            c for c in timetable_index.find_clashes(
+                e['class_id'], e['day_of_week'], e['period'], e['teacher_id'], e['room']
+            )
+            if c['id'] not in replaced
+        ]
+        for c in clashes:
+            problem(e['row'], f"{c['clash_type']} already booked by {class_names.get(c['class_id'])} in the existing timetable")
+
+        teacher_slot = (e['teacher_id'], e['day_of_week'], e['period'])
+        room_slot = (room_key(e['room']), e['day_of_week'], e['period'])
+        if e['teacher_id'] and teacher_slot in uploaded_teachers:
+            problem(e['row'], f"Teacher also booked in row {uploaded_teachers[teacher_slot]}")
+            clashes.append(teacher_slot)
+        if room_slot[0] and room_slot in uploaded_rooms:
+            problem(e['row'], f"Room also booked in row {uploaded_rooms[room_slot]}")
+            clashes.append(room_slot)
+
+        if not clashes:
+            uploaded_teachers.setdefault(teacher_slot, e['row'])
+            uploaded_rooms.setdefault(room_slot, e['row'])
+            clean.append(e)
+
+    problems.sort(key=lambda p: p['row'] or 0)
+    if problems and not skip_invalid:
+        return 0, problems
+    if not clean:
+        return 0, problems
+
+    saved = timetable_index.save_entries(clean, academic_year)
+    return len(saved), problems
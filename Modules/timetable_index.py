@@ -0,0 +1,266 @@
+# modules/timetable_index.py
+import threading
+import streamlit as st
+from database import db
+from storage import Error
+from tenancy import TenantScoped
+
+
+def room_key(room):
+    """Rooms are matched case-insensitively; blank means no room"""
+    room = (room or '').strip()
+    return room.lower() or None
+
+
+class TimetableIndex:
+    """In-memory occupancy of every class, teacher and room slot.
+
+    Built once from the timetable table and kept in step by routing every
+    timetable write through this class, so clash checks are dictionary
+    lookups instead of table scans.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = None
+        self._class_slots = {}
+        self._teacher_slots = {}
+        self._room_slots = {}
+        self._owners = {}
+        self._versions = {}
+        self._generation = 0
+
+    def invalidate(self):
+        """Force a rebuild on next use (e.g. after a direct SQL change)"""
+        with self._lock:
+            self._entries = None
+            self._generation += 1
+
+    def _ensure_loaded(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        self._class_slots = {}
+        self._teacher_slots = {}
+        self._room_slots = {}
+        self._owners = {}
+        for row in db.fetch_all('''
+            SELECT id, class_id, day_of_week, period, subject_id, teacher_id, room
+            FROM timetable
+        '''):
+            self._add(dict(row))
+
+    def _owner_keys(self, entry):
+        keys = [('class', entry['class_id'])]
+        if entry['teacher_id']:
+            keys.append(('teacher', entry['teacher_id']))
+        if room_key(entry['room']):
+            keys.append(('room', room_key(entry['room'])))
+        return keys
+
+    def _touch(self, entry, entry_id, add):
+        """Track which entries belong to each class, teacher and room"""
+        for key in self._owner_keys(entry):
+            ids = self._owners.setdefault(key, set())
+            if add:
+                ids.add(entry_id)
+            else:
+                ids.discard(entry_id)
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _add(self, entry):
+        slot = (entry['day_of_week'], entry['period'])
+        self._entries[entry['id']] = entry
+        self._touch(entry, entry['id'], True)
+        self._class_slots.setdefault((entry['class_id'],) + slot, set()).add(entry['id'])
+        if entry['teacher_id']:
+            self._teacher_slots.setdefault((entry['teacher_id'],) + slot, set()).add(entry['id'])
+        if room_key(entry['room']):
+            self._room_slots.setdefault((room_key(entry['room']),) + slot, set()).add(entry['id'])
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        self._touch(entry, entry_id, False)
+        slot = (entry['day_of_week'], entry['period'])
+        for slots, owner in (
+            (self._class_slots, entry['class_id']),
+            (self._teacher_slots, entry['teacher_id']),
+            (self._room_slots, room_key(entry['room']))
+        ):
+            ids = slots.get((owner,) + slot)
+            if ids:
+                ids.discard(entry_id)
+                if not ids:
+                    del slots[(owner,) + slot]
+
+    def version(self, kind, owner):
+        """Changes whenever an entry of this class, teacher or room changes"""
+        with self._lock:
+            self._ensure_loaded()
+            if kind == 'room':
+                owner = room_key(owner)
+            return (self._generation, self._versions.get((kind, owner), 0))
+
+    def entries_for(self, kind, owner):
+        """Entries of one class, teacher or room ('class', 'teacher', 'room')"""
+        with self._lock:
+            self._ensure_loaded()
+            if kind == 'room':
+                owner = room_key(owner)
+            return [dict(self._entries[i]) for i in self._owners.get((kind, owner), ())]
+
+    def owners(self, kind):
+        """Classes, teachers or rooms that have at least one entry"""
+        with self._lock:
+            self._ensure_loaded()
+            if kind == 'room':
+                rooms = {room_key(e['room']): e['room'].strip() for e in self._entries.values() if room_key(e['room'])}
+                return sorted(rooms.values())
+            return sorted(owner for k, owner in self._owners if k == kind and self._owners[(k, owner)])
+
+    def get_class_entry(self, class_id, day_of_week, period):
+        """Id of the class's entry in a slot, or None"""
+        with self._lock:
+            self._ensure_loaded()
+            ids = self._class_slots.get((class_id, day_of_week, period))
+            return min(ids) if ids else None
+
+    def find_clashes(self, class_id, day_of_week, period, teacher_id=None, room=None):
+        """Entries of other classes that would double-book the teacher or room.
+
+        The class's own entry in the slot is replaced by a save, so it
+        never counts as a clash.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            clashes = []
+            for clash_type, slots, owner in (
+                ('Teacher', self._teacher_slots, teacher_id),
+                ('Room', self._room_slots, room_key(room))
+            ):
+                if not owner:
+                    continue
+                for entry_id in slots.get((owner, day_of_week, period), ()):
+                    entry = self._entries[entry_id]
+                    if entry['class_id'] != class_id:
+                        clashes.append(dict(entry, clash_type=clash_type))
+            return clashes
+
+    def is_teacher_free(self, teacher_id, day_of_week, period):
+        with self._lock:
+            self._ensure_loaded()
+            return not self._teacher_slots.get((teacher_id, day_of_week, period))
+
+    def is_room_free(self, room, day_of_week, period):
+        with self._lock:
+            self._ensure_loaded()
+            return not self._room_slots.get((room_key(room), day_of_week, period))
+
+    def save_entry(self, class_id, day_of_week, period, subject_id, teacher_id,
+                   start_time, end_time, room, academic_year):
+        """Insert or update the class's entry for a slot; returns its id"""
+        ids = self.save_entries([{
+            'class_id': class_id, 'day_of_week': day_of_week, 'period': period,
+            'subject_id': subject_id, 'teacher_id': teacher_id,
+            'start_time': start_time, 'end_time': end_time, 'room': room
+        }], academic_year)
+        return ids[0] if ids else None
+
+    def save_entries(self, entries, academic_year):
+        """Upsert many slot entries in one transaction and return their ids.
+
+        Each entry replaces the class's existing entry for the same slot.
+        The index is only updated once the transaction has committed.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            try:
+                with db.transaction() as cursor:
+                    ids = []
+                    for e in entries:
+                        existing_id = self.get_class_entry(e['class_id'], e['day_of_week'], e['period'])
+                        if existing_id:
+                            cursor.execute('''
+                                UPDATE timetable
+                                SET subject_id = ?, teacher_id = ?, start_time = ?,
+                                    end_time = ?, room = ?, academic_year = ?
+                                WHERE id = ?
+                            ''', (e['subject_id'], e['teacher_id'], e['start_time'], e['end_time'],
+                                  e['room'], academic_year, existing_id))
+                            ids.append(existing_id)
+                        else:
+                            cursor.execute('''
+                                INSERT INTO timetable
+                                (class_id, day_of_week, period, subject_id, teacher_id,
+                                 start_time, end_time, room, academic_year)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ''', (e['class_id'], e['day_of_week'], e['period'], e['subject_id'],
+                                  e['teacher_id'], e['start_time'], e['end_time'], e['room'], academic_year))
+                            ids.append(cursor.lastrowid)
+            except Error as e:
+                st.error(f"Error saving timetable: {e}")
+                return []
+
+            for entry_id, e in zip(ids, entries):
+                self._remove(entry_id)
+                self._add({
+                    'id': entry_id, 'class_id': e['class_id'], 'day_of_week': e['day_of_week'],
+                    'period': e['period'], 'subject_id': e['subject_id'],
+                    'teacher_id': e['teacher_id'], 'room': e['room']
+                })
+            return ids
+
+    def delete_entry(self, entry_id):
+        with self._lock:
+            self._ensure_loaded()
+            db.execute_query("DELETE FROM timetable WHERE id = ?", (entry_id,))
+            self._remove(entry_id)
+
+    def replace_class_timetables(self, class_ids, entries, academic_year):
+        """Swap the full timetables of several classes in one transaction"""
+        with self._lock:
+            self._ensure_loaded()
+            with db.transaction() as cursor:
+                cursor.executemany(
+                    "DELETE FROM timetable WHERE class_id = ?",
+                    [(class_id,) for class_id in class_ids]
+                )
+                cursor.executemany('''
+                    INSERT INTO timetable
+                    (class_id, day_of_week, period, subject_id, teacher_id,
+                     start_time, end_time, room, academic_year)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [
+                    (e['class_id'], e['day_of_week'], e['period'], e['subject_id'], e['teacher_id'],
+                     e['start_time'], e['end_time'], e['room'], academic_year)
+                    for e in entries
+                ])
+            # Ids of the new rows are not returned by executemany
+            self.invalidate()
+            return len(entries)
+
+    def conflict_report(self):
+        """Every double-booked teacher and room slot, found in one pass"""
+        with self._lock:
+            self._ensure_loaded()
+            report = []
+            for clash_type, slots in (('Teacher', self._teacher_slots), ('Room', self._room_slots)):
+                for (owner, day_of_week, period), ids in slots.items():
+                    if len(ids) > 1:
+                        if clash_type == 'Room':
+                            owner = self._entries[min(ids)]['room'].strip()
+                        report.append({
+                            'clash_type': clash_type,
+                            'owner': owner,
+                            'day_of_week': day_of_week,
+                            'period': period,
+                            'entry_ids': sorted(ids),
+                            'class_ids': sorted({self._entries[i]['class_id'] for i in ids})
+                        })
+            return report
+
+
+# Global index instance, one per tenant
+timetable_index = TenantScoped(TimetableIndex)
@@ -0,0 +1,486 @@
+# modules/timetable_solver.py
+import math
+import os
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from database import db
+from modules.timetable_index import timetable_index, room_key
+
+DEFAULT_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+DEFAULT_PERIODS = 8
+
+
+def build_problem(days=None, periods_per_day=DEFAULT_PERIODS, class_ids=None):
+    """Load subjects, teachers, rooms and availability into a solver problem.
+
+    Every weekly period of a subject becomes one lesson that needs a slot.
+    When only some classes are scheduled, the teacher and room slots held
+    by the other classes' saved timetables are blocked.
+    Returns (problem, issues) where issues lists inputs that were skipped.
+    """
+    days = days or DEFAULT_DAYS
+    query = '''
+        SELECT s.id, s.subject_name, s.class_id, s.teacher_id, s.weekly_periods,
+               s.room, c.class_name, c.room as class_room
+        FROM subjects s
+        JOIN classes c ON s.class_id = c.id
+        WHERE s.weekly_periods > 0
+    '''
+    params = []
+    if class_ids:
+        query += f" AND s.class_id IN ({', '.join('?' for _ in class_ids)})"
+        params.extend(class_ids)
+
+    issues = []
+    lessons = []
+    class_load = defaultdict(int)
+    teacher_load = defaultdict(int)
+    for subject in db.fetch_all(query, params):
+        if not subject['teacher_id']:
+            issues.append(f"{subject['class_name']} - {subject['subject_name']}: no teacher assigned")
+            continue
+        for _ in range(subject['weekly_periods']):
+            lessons.append({
+                'class_id': subject['class_id'],
+                'subject_id': subject['id'],
+                'teacher_id': subject['teacher_id'],
+                'room': subject['room'] or subject['class_room'] or None
+            })
+        class_load[subject['class_id']] += subject['weekly_periods']
+        teacher_load[subject['teacher_id']] += subject['weekly_periods']
+
+    slots_per_week = len(days) * periods_per_day
+    for class_id, load in class_load.items():
+        if load > slots_per_week:
+            issues.append(f"Class {class_id}: {load} weekly periods requested but only {slots_per_week} slots")
+
+    teacher_unavailable = defaultdict(set)
+    for row in db.fetch_all("SELECT teacher_id, day_of_week, period FROM teacher_unavailability"):
+        if row['day_of_week'] in days and 1 <= row['period'] <= periods_per_day:
+            teacher_unavailable[row['teacher_id']].add(days.index(row['day_of_week']) * periods_per_day + row['period'] - 1)
+
+    # Slots held by the classes whose timetables are kept: only classes with
+    # lessons to place are replaced, on a whole-school run as well
+    replaced = set(class_load)
+    room_unavailable = defaultdict(set)
+    for row in db.fetch_all("SELECT class_id, teacher_id, day_of_week, period, room FROM timetable"):
+        if row['class_id'] in replaced:
+            continue
+        if row['day_of_week'] in days and 1 <= row['period'] <= periods_per_day:
+            slot = days.index(row['day_of_week']) * periods_per_day + row['period'] - 1
+            if row['teacher_id']:
+                teacher_unavailable[row['teacher_id']].add(slot)
+            if room_key(row['room']):
+                room_unavailable[room_key(row['room'])].add(slot)
+
+    for teacher_id, load in teacher_load.items():
+        available = slots_per_week - len(teacher_unavailable.get(teacher_id, ()))
+        if load > available:
+            issues.append(f"Teacher {teacher_id}: {load} periods assigned but only {available} slots available")
+
+    # Rooms not tied to a class or subject form a shared pool for the rest
+    fixed_rooms = {l['room'] for l in lessons if l['room']}
+    room_pool = [
+        r['room_name'] for r in db.fetch_all("SELECT room_name FROM rooms ORDER BY room_name")
+        if r['room_name'] not in fixed_rooms
+    ]
+
+    floating = sum(1 for l in lessons if not l['room'])
+    if room_pool and floating > len(room_pool) * slots_per_week:
+        issues.append(f"{floating} lessons have no room but the shared rooms only offer {len(room_pool) * slots_per_week} slots")
+
+    problem = {
+        'days': days,
+        'periods': periods_per_day,
+        'lessons': lessons,
+        'teacher_unavailable': dict(teacher_unavailable),
+        'room_unavailable': dict(room_unavailable),
+        'room_pool': room_pool
+    }
+    return problem, issues
+
+
+def _daily_caps(problem):
+    """Most lessons of a class's subject allowed on one day"""
+    weekly = defaultdict(int)
+    for lesson in problem['lessons']:
+        weekly[(lesson['class_id'], lesson['subject_id'])] += 1
+    return {key: math.ceil(count / len(problem['days'])) for key, count in weekly.items()}
+
+
+def _pool_free(problem):
+    """Shared rooms not held by other classes, per slot"""
+    n_slots = len(problem['days']) * problem['periods']
+    busy = problem['room_unavailable']
+    return [
+        sum(1 for room in problem['room_pool'] if s not in busy.get(room_key(room), ()))
+        for s in range(n_slots)
+    ]
+
+
+def _slot_blocked(problem, lesson, s, pool_free):
+    """Whether s is ruled out for a lesson before any other lesson is placed"""
+    if s in problem['teacher_unavailable'].get(lesson['teacher_id'], ()):
+        return True
+    if lesson['room']:
+        return s in problem['room_unavailable'].get(room_key(lesson['room']), ())
+    return bool(problem['room_pool']) and pool_free[s] == 0
+
+
+def evaluate(problem, slots):
+    """Quality metrics for a (possibly partial) assignment"""
+    periods = problem['periods']
+    lessons = problem['lessons']
+    teacher_days = defaultdict(list)
+    class_days = defaultdict(list)
+    subject_days = defaultdict(int)
+
+    for lesson, slot in zip(lessons, slots):
+        if slot is None:
+            continue
+        day, period = divmod(slot, periods)
+        teacher_days[(lesson['teacher_id'], day)].append(period)
+        class_days[(lesson['class_id'], day)].append(period)
+        subject_days[(lesson['class_id'], lesson['subject_id'], day)] += 1
+
+    def gaps(groups):
+        return sum(max(p) - min(p) + 1 - len(p) for p in groups.values())
+
+    unplaced = sum(1 for slot in slots if slot is None)
+    metrics = {
+        'lessons': len(lessons),
+        'unplaced': unplaced,
+        'teacher_gaps': gaps(teacher_days),
+        'class_gaps': gaps(class_days),
+        'subject_repeats': sum(count - 1 for count in subject_days.values() if count > 1)
+    }
+    metrics['penalty'] = metrics['teacher_gaps'] + metrics['class_gaps'] + 2 * metrics['subject_repeats']
+    return metrics
+
+
+def _solve_once(problem, rng, deadline):
+    """Iterative forward search with conflict-directed repair.
+
+    Unassigned lessons are placed in the slot with the fewest conflicts and
+    any lessons in the way are bumped back to the queue. Hard constraints
+    (class, teacher, room, availability, daily subject cap) always hold
+    for the lessons that are placed.
+    """
+    lessons = problem['lessons']
+    periods = problem['periods']
+    n_slots = len(problem['days']) * periods
+    pool_size = len(problem['room_pool'])
+    pool_free = _pool_free(problem)
+    daily_cap = _daily_caps(problem)
+
+    allowed = [
+        [s for s in range(n_slots) if not _slot_blocked(problem, lesson, s, pool_free)]
+        for lesson in lessons
+    ]
+
+    slots = [None] * len(lessons)
+    class_at, teacher_at, room_at = {}, {}, {}
+    floating_at = defaultdict(set)
+    subject_day = defaultdict(set)
+    bumped = [0] * len(lessons)
+    last_slot = [None] * len(lessons)
+    unassigned = set(range(len(lessons)))
+
+    def place(i, s):
+        lesson = lessons[i]
+        slots[i] = s
+        class_at[(lesson['class_id'], s)] = i
+        teacher_at[(lesson['teacher_id'], s)] = i
+        if lesson['room']:
+            room_at[(lesson['room'], s)] = i
+        elif pool_size:
+            floating_at[s].add(i)
+        subject_day[(lesson['class_id'], lesson['subject_id'], s // periods)].add(i)
+        unassigned.discard(i)
+
+    def remove(i):
+        lesson = lessons[i]
+        s = slots[i]
+        del class_at[(lesson['class_id'], s)]
+        del teacher_at[(lesson['teacher_id'], s)]
+        if lesson['room']:
+            del room_at[(lesson['room'], s)]
+        elif pool_size:
+            floating_at[s].discard(i)
+        subject_day[(lesson['class_id'], lesson['subject_id'], s // periods)].discard(i)
+        slots[i] = None
+        last_slot[i] = s
+        bumped[i] += 1
+        unassigned.add(i)
+
+    def conflicts(i, s):
+        lesson = lessons[i]
+        found = set()
+        for key, occupied in (
+            ((lesson['class_id'], s), class_at),
+            ((lesson['teacher_id'], s), teacher_at),
+            ((lesson['room'], s), room_at)
+        ):
+            j = occupied.get(key)
+            if j is not None:
+                found.add(j)
+        if not lesson['room'] and pool_size and len(floating_at[s] - found) >= pool_free[s]:
+            found.add(min(floating_at[s] - found))
+        same_day = subject_day[(lesson['class_id'], lesson['subject_id'], s // periods)] - found
+        if len(same_day) >= daily_cap[(lesson['class_id'], lesson['subject_id'])]:
+            found.add(min(same_day))
+        return found
+
+    max_iterations = 200 * max(len(lessons), 1)
+    iteration = 0
+    while unassigned and iteration < max_iterations:
+        iteration += 1
+        if iteration % 256 == 0 and time.monotonic() > deadline:
+            break
+
+        candidates = rng.sample(sorted(unassigned), min(6, len(unassigned)))
+        i = min(candidates, key=lambda c: len(allowed[c]) - 4 * bumped[c])
+        if not allowed[i]:
+            unassigned.discard(i)
+            continue
+
+        best, best_score = [], None
+        for s in allowed[i]:
+            found = conflicts(i, s)
+            score = len(found) * 10 + (s % periods) * 0.1
+            if found and s == last_slot[i]:
+                score += 5
+            score += sum(bumped[j] for j in found)
+            if best_score is None or score < best_score:
+                best, best_score = [s], score
+            elif score == best_score:
+                best.append(s)
+
+        s = rng.choice(best)
+        for j in conflicts(i, s):
+            remove(j)
+        place(i, s)
+
+    return slots
+
+
+def _improve(problem, slots, rng, deadline):
+    """Hill-climb soft quality with moves and swaps inside each class.
+
+    Only moves that keep every hard constraint and do not raise the
+    penalty (teacher gaps, class gaps, repeated subjects) are accepted.
+    """
+    lessons = problem['lessons']
+    periods = problem['periods']
+    n_slots = len(problem['days']) * periods
+    pool_size = len(problem['room_pool'])
+    pool_free = _pool_free(problem)
+    daily_cap = _daily_caps(problem)
+
+    class_at, teacher_at, room_at = {}, {}, {}
+    floating = defaultdict(int)
+    teacher_days = defaultdict(set)
+    class_days = defaultdict(set)
+    subject_days = defaultdict(int)
+    placed = [i for i, s in enumerate(slots) if s is not None]
+
+    def index(i, s, sign):
+        lesson = lessons[i]
+        day, period = divmod(s, periods)
+        keys = ((class_at, lesson['class_id']), (teacher_at, lesson['teacher_id']), (room_at, lesson['room']))
+        for occupied, owner in keys:
+            if owner is None:
+                continue
+            if sign > 0:
+                occupied[(owner, s)] = i
+            else:
+                del occupied[(owner, s)]
+        if not lesson['room'] and pool_size:
+            floating[s] += sign
+        if sign > 0:
+            teacher_days[(lesson['teacher_id'], day)].add(period)
+            class_days[(lesson['class_id'], day)].add(period)
+        else:
+            teacher_days[(lesson['teacher_id'], day)].discard(period)
+            class_days[(lesson['class_id'], day)].discard(period)
+        subject_days[(lesson['class_id'], lesson['subject_id'], day)] += sign
+
+    for i in placed:
+        index(i, slots[i], 1)
+
+    def gap(periods_used):
+        return max(periods_used) - min(periods_used) + 1 - len(periods_used) if periods_used else 0
+
+    def local_penalty(moved):
+        """Penalty restricted to the groups touched by the moved lessons"""
+        t_keys, c_keys, s_keys = set(), set(), set()
+        for i, s in moved:
+            lesson = lessons[i]
+            day = s // periods
+            t_keys.add((lesson['teacher_id'], day))
+            c_keys.add((lesson['class_id'], day))
+            s_keys.add((lesson['class_id'], lesson['subject_id'], day))
+        return (sum(gap(teacher_days[k]) for k in t_keys)
+                + sum(gap(class_days[k]) for k in c_keys)
+                + 2 * sum(max(subject_days[k] - 1, 0) for k in s_keys))
+
+    def free_for(i, s, ignore):
+        lesson = lessons[i]
+        if _slot_blocked(problem, lesson, s, pool_free):
+            return False
+        for occupied, owner in ((teacher_at, lesson['teacher_id']), (room_at, lesson['room'])):
+            j = occupied.get((owner, s)) if owner is not None else None
+            if j is not None and j not in ignore:
+                return False
+        if not lesson['room'] and pool_size:
+            vacating = sum(1 for j in ignore if not lessons[j]['room'] and slots[j] == s)
+            if floating[s] - vacating >= pool_free[s]:
+                return False
+        return True
+
+    while time.monotonic() < deadline and placed:
+        for _ in range(200):
+            i = rng.choice(placed)
+            si = slots[i]
+            sj = rng.randrange(n_slots)
+            if sj == si:
+                continue
+            j = class_at.get((lessons[i]['class_id'], sj))
+            if j is not None and lessons[j]['subject_id'] == lessons[i]['subject_id']:
+                continue
+            if not free_for(i, sj, {j} - {None}) or (j is not None and not free_for(j, si, {i})):
+                continue
+
+            moved_before = [(i, si), (i, sj)] + ([(j, sj), (j, si)] if j is not None else [])
+            before = local_penalty(moved_before)
+            index(i, si, -1)
+            if j is not None:
+                index(j, sj, -1)
+            index(i, sj, 1)
+            if j is not None:
+                index(j, si, 1)
+            slots[i] = sj
+            if j is not None:
+                slots[j] = si
+
+            over_cap = any(
+                subject_days[(lessons[k]['class_id'], lessons[k]['subject_id'], s // periods)]
+                > daily_cap[(lessons[k]['class_id'], lessons[k]['subject_id'])]
+                for k, s in moved_before[1::2]
+            )
+            if over_cap or local_penalty(moved_before) > before:
+                # Undo
+                index(i, sj, -1)
+                if j is not None:
+                    index(j, si, -1)
+                index(i, si, 1)
+                if j is not None:
+                    index(j, sj, 1)
+                slots[i] = si
+                if j is not None:
+                    slots[j] = sj
+
+    return slots
+
+
+def _assign_pool_rooms(problem, slots):
+    """Hand out shared rooms to lessons without a fixed room, per slot"""
+    busy = problem['room_unavailable']
+    rooms = [lesson['room'] for lesson in problem['lessons']]
+    used = defaultdict(int)
+    for i, lesson in enumerate(problem['lessons']):
+        if slots[i] is not None and not lesson['room'] and problem['room_pool']:
+            free = [room for room in problem['room_pool'] if slots[i] not in busy.get(room_key(room), ())]
+            rooms[i] = free[used[slots[i]]]
+            used[slots[i]] += 1
+    return rooms
+
+
+def solve(problem, seed=0, time_budget=30):
+    """Restart the search with new seeds until the time budget runs out.
+
+    Returns the best assignment found, ranked by unplaced lessons first
+    and soft-constraint penalty second.
+    """
+    rng = random.Random(seed)
+    started = time.monotonic()
+    deadline = started + time_budget
+    # Half the budget goes to restarts, the rest to polishing the best one
+    restart_deadline = started + time_budget / 2
+    best = None
+    restarts = 0
+
+    while True:
+        slots = _solve_once(problem, rng, deadline)
+        metrics = evaluate(problem, slots)
+        restarts += 1
+        if best is None or (metrics['unplaced'], metrics['penalty']) < (best['metrics']['unplaced'], best['metrics']['penalty']):
+            best = {'slots': slots, 'metrics': metrics}
+        if not problem['lessons'] or best['metrics']['penalty'] == 0 and best['metrics']['unplaced'] == 0:
+            break
+        if time.monotonic() > (restart_deadline if best['metrics']['unplaced'] == 0 else deadline):
+            break
+
+    if best['metrics']['unplaced'] == 0 and time.monotonic() < deadline:
+        best['slots'] = _improve(problem, best['slots'], rng, deadline)
+        best['metrics'] = evaluate(problem, best['slots'])
+
+    best['rooms'] = _assign_pool_rooms(problem, best['slots'])
+    best['metrics']['restarts'] = restarts
+    best['metrics']['seed'] = seed
+    return best
+
+
+def generate_timetable(days=None, periods_per_day=DEFAULT_PERIODS, time_budget=30,
+                       workers=1, seed=None, class_ids=None):
+    """Build and solve a whole-school timetable.
+
+    With workers > 1 independent restarts run in a process pool and the
+    best result wins. Returns a dict with the solution entries, quality
+    metrics and any input issues.
+    """
+    problem, issues = build_problem(days, periods_per_day, class_ids)
+    seed = random.randrange(1 << 30) if seed is None else seed
+    started = time.monotonic()
+
+    if workers > 1 and problem['lessons']:
+        workers = min(workers, os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(solve, problem, seed + i, time_budget) for i in range(workers)]
+            results = [f.result() for f in futures]
+        best = min(results, key=lambda r: (r['metrics']['unplaced'], r['metrics']['penalty']))
+        best['metrics']['restarts'] = sum(r['metrics']['restarts'] for r in results)
+    else:
+        best = solve(problem, seed, time_budget)
+
+    best['metrics']['seconds'] = round(time.monotonic() - started, 2)
+
+    entries = []
+    for lesson, slot, room in zip(problem['lessons'], best['slots'], best['rooms']):
+        if slot is None:
+            continue
+        day, period = divmod(slot, periods_per_day)
+        entries.append({
+            'class_id': lesson['class_id'],
+            'day_of_week': problem['days'][day],
+            'period': period + 1,
+            'subject_id': lesson['subject_id'],
+            'teacher_id': lesson['teacher_id'],
+            'start_time': f"{8 + period}:00",
+            'end_time': f"{9 + period}:00",
+            'room': room
+        })
+
+    return {
+        'entries': entries,
+        'metrics': best['metrics'],
+        'issues': issues,
+        'class_ids': sorted({l['class_id'] for l in problem['lessons']})
+    }
+
+
+def save_generated_timetable(result, academic_year):
+    """Replace the timetables of the scheduled classes in one transaction"""
+    return timetable_index.replace_class_timetables(result['class_ids'], result['entries'], academic_year)
@@ -0,0 +1,122 @@
+# modules/timetable_views.py
+import io
+import html
+import zipfile
+import threading
+import pandas as pd
+from database import db
+from tenancy import TenantScoped
+from modules.school_calendar import DAYS, DEFAULT_SCHOOL_WEEK
+from modules.timetable_index import timetable_index
+
+
+class TimetableViews:
+    """Period x day grids for classes, teachers and rooms.
+
+    Grids are built from the in-memory timetable index and cached with the
+    index version of their class, teacher or room, so a grid is only
+    rebuilt after one of its own entries changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._grids = {}
+
+    def invalidate(self):
+        with self._lock:
+            self._grids = {}
+
+    def _names(self):
+        return {
+            'class': {c['id']: c['class_name'] for c in db.fetch_all("SELECT id, class_name FROM classes")},
+            'subject': {s['id']: s['subject_name'] for s in db.fetch_all("SELECT id, subject_name FROM subjects")},
+            'teacher': {t['id']: t['full_name'] for t in db.fetch_all("SELECT id, full_name FROM teachers")}
+        }
+
+    def _cell(self, kind, entry, names):
+        subject = names['subject'].get(entry['subject_id'], '')
+        teacher = names['teacher'].get(entry['teacher_id'], '')
+        class_name = names['class'].get(entry['class_id'], '')
+        room = (entry['room'] or '').strip()
+        if kind == 'class':
+            parts = [subject, teacher, room]
+        elif kind == 'teacher':
+            parts = [class_name, subject, room]
+        else:
+            parts = [class_name, subject, teacher]
+        return ' / '.join(p for p in parts if p)
+
+    def _build(self, kind, owner, names):
+        entries = timetable_index.entries_for(kind, owner)
+        days = list(DEFAULT_SCHOOL_WEEK)
+        days += [d for d in DAYS if d not in days and any(e['day_of_week'] == d for e in entries)]
+        max_period = max([e['period'] for e in entries] + [1])
+
+        grid = pd.DataFrame('', index=range(1, max_period + 1), columns=days)
+        grid.index.name = 'Period'
+        for e in sorted(entries, key=lambda e: e['id']):
+            if e['day_of_week'] not in grid.columns:
+                continue
+            cell = self._cell(kind, e, names)
+            current = grid.at[e['period'], e['day_of_week']]
+            # A double-booked teacher or room shows both lessons
+            grid.at[e['period'], e['day_of_week']] = f"{current} | {cell}" if current else cell
+        return grid
+
+    def get_grid(self, kind, owner, names=None):
+        """Cached grid for kind 'class', 'teacher' or 'room'"""
+        version = timetable_index.version(kind, owner)
+        key = (kind, owner.strip().lower() if kind == 'room' else owner)
+        with self._lock:
+            cached = self._grids.get(key)
+            if cached and cached[0] == version:
+                return cached[1]
+
+        grid = self._build(kind, owner, names or self._names())
+        with self._lock:
+            self._grids[key] = (version, grid)
+        return grid
+
+    def export_teachers_html(self, teacher_ids=None):
+        """One printable HTML document with a page per teacher"""
+        names = self._names()
+        teacher_ids = teacher_ids or timetable_index.owners('teacher')
+        pages = []
+        for teacher_id in teacher_ids:
+            grid = self.get_grid('teacher', teacher_id, names)
+            title = html.escape(names['teacher'].get(teacher_id, str(teacher_id)))
+            pages.append(f'<section class="page"><h2>{title}</h2>{grid.to_html(escape=True)}</section>')
+
+        return f'''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Teacher Timetables</title>
+<style>
+    body {{ font-family: Arial, sans-serif; }}
+    table {{ border-collapse: collapse; width: 100%; }}
+    th, td {{ border: 1px solid #999; padding: 6px; font-size: 12px; vertical-align: top; }}
+    .page {{ page-break-after: always; }}
+</style>
+</head>
+<body>
+{''.join(pages)}
+</body>
+</html>'''
+
+    def export_teachers_csv_zip(self, teacher_ids=None):
+        """Zip archive bytes with one CSV grid per teacher"""
+        names = self._names()
+        teacher_ids = teacher_ids or timetable_index.owners('teacher')
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for teacher_id in teacher_ids:
+                grid = self.get_grid('teacher', teacher_id, names)
+                name = names['teacher'].get(teacher_id, str(teacher_id))
+                safe_name = ''.join(ch if ch.isalnum() else '_' for ch in name)
+                archive.writestr(f"timetable_{safe_name}_{teacher_id}.csv", grid.to_csv())
+        return buffer.getvalue()
+
+
+# Global view cache, one per tenant
+timetable_views = TenantScoped(TimetableViews)
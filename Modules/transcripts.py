@@ -0,0 +1,207 @@
+# modules/transcripts.py
+import bisect
+import numpy as np
+import pandas as pd
+from database import db
+from modules.grading import load_scale, grade_percentages
+from modules.school_calendar import to_date
+
+SCOPE_EXAM = 'exam'
+SCOPE_TERM = 'term'
+SCOPE_CUMULATIVE = 'cumulative'
+
+UPSERT_SUMMARY = '''
+    INSERT INTO gpa_summary
+    (student_id, scope_type, scope_key, scope_label, total_points, total_weight,
+     total_percentage, result_count, gpa)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(student_id, scope_type, scope_key) DO UPDATE SET
+        total_points = gpa_summary.total_points + excluded.total_points,
+        total_weight = gpa_summary.total_weight + excluded.total_weight,
+        total_percentage = gpa_summary.total_percentage + excluded.total_percentage,
+        result_count = gpa_summary.result_count + excluded.result_count,
+        gpa = CASE WHEN gpa_summary.total_weight + excluded.total_weight > 0
+                   THEN (gpa_summary.total_points + excluded.total_points)
+                        / (gpa_summary.total_weight + excluded.total_weight)
+              END,
+        updated_at = CURRENT_TIMESTAMP
+'''
+
+
+class TranscriptEngine:
+    """Weighted GPA per exam, term and overall, kept in gpa_summary.
+
+    Each new result adds its weighted grade point to three running totals,
+    so transcripts and honor rolls read one summary row per scope instead
+    of re-aggregating historical results. recompute_all() rebuilds the
+    totals when the grading scale or subject weights change, and
+    recompute_from() the students affected when a term is added.
+    """
+
+    def _terms(self):
+        terms = db.fetch_all('''
+            SELECT id, term_name, academic_year, start_date, end_date
+            FROM academic_terms ORDER BY start_date
+        ''')
+        return [dict(t) for t in terms]
+
+    def _term(self, terms, term_starts, exam_date):
+        """The term an exam date falls in, if any"""
+        if exam_date:
+            d = to_date(exam_date)
+            i = bisect.bisect_right(term_starts, d) - 1
+            if i >= 0 and d <= to_date(terms[i]['end_date']):
+                return terms[i]
+        return None
+
+    def _scopes(self, term, exam_type):
+        """(scope_type, scope_key, scope_label) rows a result counts towards"""
+        term_key = str(term['id']) if term else 'none'
+        term_label = f"{term['term_name']} {term['academic_year'] or ''}".strip() if term else 'No Term'
+        exam_type = exam_type or 'Exam'
+        return [
+            (SCOPE_EXAM, f"{term_key}:{exam_type}", f"{exam_type} - {term_label}"),
+            (SCOPE_TERM, term_key, term_label),
+            (SCOPE_CUMULATIVE, 'all', 'Cumulative')
+        ]
+
+    def _summary_rows(self, results_df):
+        """Aggregate result rows into gpa_summary parameter tuples"""
+        if results_df.empty:
+            return []
+
+        terms = self._terms()
+        term_starts = [to_date(t['start_date']) for t in terms]
+        result_terms = [self._term(terms, term_starts, exam_date) for exam_date in results_df['exam_date']]
+
+        # Each result is graded on the scale of its term's academic year
+        years = [term['academic_year'] if term else None for term in result_terms]
+        points = np.zeros(len(results_df))
+        for year in set(years):
+            mask = np.array([y == year for y in years])
+            _, points[mask] = grade_percentages(results_df['percentage'].to_numpy()[mask], load_scale(year))
+
+        results_df = results_df.assign(
+            weight=results_df['credit_hours'].fillna(1.0),
+            percentage=results_df['percentage'].fillna(0.0)
+        )
+        results_df['points'] = points * results_df['weight']
+
+        rows = []
+        for record, term in zip(results_df.to_dict('records'), result_terms):
+            for scope_type, scope_key, label in self._scopes(term, record['exam_type']):
+                rows.append({
+                    'student_id': record['student_id'], 'scope_type': scope_type,
+                    'scope_key': scope_key, 'scope_label': label,
+                    'points': record['points'], 'weight': record['weight'],
+                    'percentage': record['percentage']
+                })
+
+        grouped = pd.DataFrame(rows).groupby(
+            ['student_id', 'scope_type', 'scope_key', 'scope_label'], as_index=False
+        ).agg(
+            total_points=('points', 'sum'),
+            total_weight=('weight', 'sum'),
+            total_percentage=('percentage', 'sum'),
+            result_count=('percentage', 'count')
+        )
+        grouped['gpa'] = (grouped['total_points'] / grouped['total_weight'].where(grouped['total_weight'] > 0))
+
+        return [
+            (int(r['student_id']), r['scope_type'], r['scope_key'], r['scope_label'],
+             float(r['total_points']), float(r['total_weight']), float(r['total_percentage']),
+             int(r['result_count']), None if pd.isna(r['gpa']) else float(r['gpa']))
+            for r in grouped.to_dict('records')
+        ]
+
+    def _load_results(self, where='', params=()):
+        return db.get_dataframe(f'''
+            SELECT r.student_id, r.exam_type, r.exam_date, r.percentage, sub.credit_hours
+            FROM results r
+            LEFT JOIN subjects sub ON r.subject_id = sub.id
+            {where}
+        ''', params)
+
+    def record_results(self, result_ids):
+        """Add newly inserted results to the running totals"""
+        if not result_ids:
+            return 0
+        if not db.fetch_one("SELECT 1 FROM gpa_summary LIMIT 1"):
+            # First use: the full rebuild already includes the new results
+            return self.recompute_all()
+        placeholders = ', '.join('?' for _ in result_ids)
+        rows = self._summary_rows(self._load_results(f"WHERE r.id IN ({placeholders})", list(result_ids)))
+        return db.execute_many(UPSERT_SUMMARY, rows)
+
+    def recompute_all(self):
+        """Rebuild every summary row from the results table"""
+        rows = self._summary_rows(self._load_results())
+        with db.transaction() as cursor:
+            cursor.execute("DELETE FROM gpa_summary")
+            cursor.executemany(UPSERT_SUMMARY, rows)
+        return len(rows)
+
+    def recompute_from(self, start_date):
+        """Rebuild the students whose results on or after start_date may have
+        moved term, e.g. after a term is added"""
+        if not db.fetch_one("SELECT 1 FROM gpa_summary LIMIT 1"):
+            return 0
+        affected = "student_id IN (SELECT student_id FROM results WHERE exam_date >= ?)"
+        rows = self._summary_rows(self._load_results(f"WHERE r.{affected}", (start_date,)))
+        with db.transaction() as cursor:
+            cursor.execute(f"DELETE FROM gpa_summary WHERE {affected}", (start_date,))
+            cursor.executemany(UPSERT_SUMMARY, rows)
+        return len(rows)
+
+    def ensure_populated(self):
+        """Build the summary once for databases that already hold results"""
+        if not db.fetch_one("SELECT 1 FROM gpa_summary LIMIT 1") and db.fetch_one("SELECT 1 FROM results LIMIT 1"):
+            self.recompute_all()
+
+    def get_transcript(self, student_id):
+        """Summary rows for one student: every exam, term and the cumulative GPA"""
+        self.ensure_populated()
+        return db.get_dataframe('''
+            SELECT scope_type, scope_label, gpa,
+                   ROUND(total_percentage / result_count, 2) as average_percentage,
+                   result_count, total_weight
+            FROM gpa_summary
+            WHERE student_id = ?
+            ORDER BY CASE scope_type WHEN 'cumulative' THEN 3 WHEN 'term' THEN 2 ELSE 1 END, scope_key
+        ''', (student_id,))
+
+    def get_scopes(self, scope_type):
+        """(scope_key, scope_label) pairs that have GPA rows"""
+        self.ensure_populated()
+        return db.fetch_all('''
+            SELECT DISTINCT scope_key, scope_label FROM gpa_summary
+            WHERE scope_type = ? ORDER BY scope_key
+        ''', (scope_type,))
+
+    def honor_roll(self, scope_type=SCOPE_CUMULATIVE, scope_key='all', min_gpa=3.5, class_id=None):
+        """Students at or above min_gpa for a scope, best first"""
+        self.ensure_populated()
+        query = '''
+            SELECT s.full_name, s.student_id, c.class_name, g.gpa,
+                   ROUND(g.total_percentage / g.result_count, 2) as average_percentage
+            FROM gpa_summary g
+            JOIN students s ON g.student_id = s.id
+            LEFT JOIN classes c ON s.class_id = c.id
+            WHERE g.scope_type = ? AND g.scope_key = ? AND g.gpa >= ?
+        '''
+        params = [scope_type, scope_key, min_gpa]
+
+        if class_id:
+            query += " AND s.class_id = ?"
+            params.append(class_id)
+
+        query += " ORDER BY g.gpa DESC, s.full_name"
+        return db.get_dataframe(query, params)
+
+
+# Global transcript engine
+transcript_engine = TranscriptEngine()
+
+if __name__ == "__main__":
+    # Bulk recompute, e.g. after the grading scale changes
+    print(f"Recomputed {transcript_engine.recompute_all()} GPA summary rows")
@@ -0,0 +1,89 @@
+# modules/user_directory.py
+import threading
+import time
+import pandas as pd
+from database import db
+from tenancy import TenantScoped
+
+PAGE_SIZE = 50
+# Seconds a total is reused; changes made through auth clear it sooner
+COUNT_TTL = 60
+
+LIST_COLUMNS = ['id', 'username', 'email', 'full_name', 'role', 'phone', 'is_active', 'last_login', 'created_at']
+
+
+def user_filters(role=None, is_active=None, search=None):
+    """WHERE clause and params for the directory filters.
+
+    role and is_active match idx_users_role_active / idx_users_active;
+    search is a username prefix (a range on the unique username index)
+    or an exact email address.
+    """
+    where = []
+    params = []
+
+    if role:
+        where.append("role = ?")
+        params.append(role)
+
+    if is_active is not None:
+        where.append("is_active = ?")
+        params.append(1 if is_active else 0)
+
+    if search:
+        where.append("((username >= ? AND username < ?) OR email = ?)")
+        params.extend([search, search + '\U0010ffff', search])
+
+    return (" WHERE " + " AND ".join(where)) if where else "", params
+
+
+def directory_query(role=None, is_active=None, search=None):
+    """(query, params) listing matching users by username"""
+    where, params = user_filters(role, is_active, search)
+    return f"SELECT {', '.join(LIST_COLUMNS)} FROM users{where} ORDER BY username", params
+
+
+class UserDirectory:
+    """Paged user listing for user management.
+
+    Only one page of users is read and formatted per rerun; the total
+    behind the pager is cached per filter combination.
+    """
+
+    def __init__(self, count_ttl=COUNT_TTL):
+        self.count_ttl = count_ttl
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def count(self, role=None, is_active=None, search=None):
+        key = (role, is_active, search)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._counts.get(key)
+        if cached and now - cached[1] < self.count_ttl:
+            return cached[0]
+
+        where, params = user_filters(role, is_active, search)
+        row = db.fetch_one(f"SELECT COUNT(*) as total FROM users{where}", params)
+        total = row['total'] if row else 0
+        with self._lock:
+            self._counts[key] = (total, now)
+        return total
+
+    def get_page(self, page=1, page_size=PAGE_SIZE, **filters):
+        """One page of users ordered by username, dates formatted for display"""
+        query, params = directory_query(**filters)
+        df = db.get_dataframe(f"{query} LIMIT ? OFFSET ?", params + [page_size, (max(page, 1) - 1) * page_size])
+        if not df.empty:
+            df['last_login'] = pd.to_datetime(df['last_login'], errors='coerce').dt.strftime('%Y-%m-%d %H:%M')
+            df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce').dt.strftime('%Y-%m-%d')
+        return df
+
+    def invalidate(self):
+        """Forget cached totals after users are added, edited or removed"""
+        with self._lock:
+            self._counts.clear()
+
+
+# Global directory, one per tenant
+user_directory = TenantScoped(UserDirectory)
@@ -1,9 +1,12 @@
 import streamlit as st
-import pandas as pd
 from database import db
 from auth import auth
 from utils import lang_manager, validate_email, validate_phone
 from config import ROLES
+from modules.permissions import permission_registry
+from modules.user_directory import user_directory, PAGE_SIZE
+from modules.report_jobs import report_jobs
+from modules.reports import show_report_job
 
 class UserManagementModule:
     """User management module"""
@@ -12,17 +15,18 @@ class UserManagementModule:
         """Display user management interface"""
         text = lang_manager.get_text
         
-        if not auth.has_permission(ROLES['ADMIN']):
+        if not auth.has_permission('manage_users'):
             st.warning(text('no_permission'))
             return
         
         st.title(text('user_management'))
         
         # Tabs for different operations
-        tab1, tab2, tab3 = st.tabs([
+        tab1, tab2, tab3, tab4 = st.tabs([
             text('view_users'),
             text('add_user'),
-            text('edit_user')
+            text('edit_user'),
+            text('permissions')
         ])
         
         with tab1:
@@ -33,53 +37,58 @@ class UserManagementModule:
         
         with tab3:
             self.display_edit_user_form()
+        
+        with tab4:
+            self.display_permissions()
     
     def display_users_list(self):
-        """Display list of all users"""
+        """Display users a page at a time, filtered by role, status and name"""
         text = lang_manager.get_text
         
-        users = auth.get_all_users()
+        # Filters
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            role = st.selectbox(text('role'), [''] + list(ROLES.values()),
+                                format_func=lambda value: value or text('all'))
+        with col2:
+            status = st.selectbox(text('status'), ['all', 'active', 'inactive'], format_func=text)
+        with col3:
+            search = st.text_input(text('search_users')).strip()
         
-        if users:
-            # Convert to DataFrame for display
-            df = pd.DataFrame(users)
-            if 'last_login' in df.columns:
-                df['last_login'] = pd.to_datetime(df['last_login'], errors='coerce').dt.strftime('%Y-%m-%d %H:%M')
-            if 'created_at' in df.columns:
-                df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce').dt.strftime('%Y-%m-%d')
-            
-            # Rename columns for display
-            display_cols = ['username', 'email', 'full_name', 'role', 'phone', 'is_active']
-            if 'last_login' in df.columns:
-                display_cols.append('last_login')
-            if 'created_at' in df.columns:
-                display_cols.append('created_at')
-            
-            df_display = df[display_cols]
-            df_display.columns = [
-                text('username'), text('email'), text('full_name'), text('role'),
-                text('phone'), text('status')
-            ]
-            
-            # Add last_login and created_at if they exist
-            if 'last_login' in df.columns:
-                df_display[text('last_login')] = df['last_login']
-            if 'created_at' in df.columns:
-                df_display[text('created_at')] = df['created_at']
-            
-            st.dataframe(df_display, use_container_width=True)
-            
-            # Export option
-            if st.button(text('export')):
-                csv = df_display.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label=text('download_csv'),
-                    data=csv,
-                    file_name='users.csv',
-                    mime='text/csv'
-                )
-        else:
+        filters = {
+            'role': role or None,
+            'is_active': None if status == 'all' else status == 'active',
+            'search': search or None
+        }
+        total = user_directory.count(**filters)
+        pages = max(1, -(-total // PAGE_SIZE))
+        
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            page = st.number_input(text('page'), min_value=1, max_value=pages, value=1, key="users_page")
+        with col2:
+            st.caption(f"{total} {text('users_found')} - {text('page')} {page} / {pages}")
+        
+        df = user_directory.get_page(page, **filters)
+        if df.empty:
             st.info(text('no_data'))
+            return
+        
+        df_display = df[['username', 'email', 'full_name', 'role', 'phone', 'is_active', 'last_login', 'created_at']]
+        df_display.columns = [
+            text('username'), text('email'), text('full_name'), text('role'),
+            text('phone'), text('status'), text('last_login'), text('created_at')
+        ]
+        st.dataframe(df_display, use_container_width=True)
+        
+        # The full list is written by a background job only when asked for
+        if st.button(text('export')):
+            st.session_state['users_export_job'] = report_jobs.enqueue(
+                'user_directory', filters, requested_by=auth.get_current_user()['id']
+            )
+        
+        if 'users_export_job' in st.session_state:
+            show_report_job(st.session_state['users_export_job'], preview_rows=0)
     
     def display_add_user_form(self):
         """Display form to add new user"""
@@ -212,4 +221,56 @@ class UserManagementModule:
                             st.success(message)
                             st.rerun()
                         else:
-                            st.error(message)
\ No newline at end of file
+                            st.error(message)
+    
+    def display_permissions(self):
+        """Edit what each role may do and per-user exceptions"""
+        text = lang_manager.get_text
+        
+        permissions = {p['code']: p['description'] for p in permission_registry.get_permissions()}
+        roles = [r['name'] for r in permission_registry.get_roles()]
+        
+        st.subheader(text('role_permissions'))
+        role = st.selectbox(
+            text('role'), options=roles,
+            format_func=lambda x: x.replace('_', ' ').title(), key="permissions_role"
+        )
+        with st.form("role_permissions_form"):
+            selected = st.multiselect(
+                text('permissions'), options=list(permissions),
+                default=permission_registry.role_permissions(role),
+                format_func=lambda code: f"{code} - {permissions[code]}"
+            )
+            if st.form_submit_button(text('save')):
+                permission_registry.set_role_permissions(role, selected)
+                st.success(text('permissions_saved'))
+        
+        st.divider()
+        st.subheader(text('user_permissions'))
+        users = auth.get_all_users()
+        if not users:
+            st.info(text('no_users_found'))
+            return
+        
+        user_options = {f"{u['full_name']} ({u['username']})": u['user_id'] for u in users}
+        selected_user = st.selectbox(text('select_user'), options=list(user_options), key="permissions_user")
+        user_id = user_options[selected_user]
+        overrides = permission_registry.user_overrides(user_id)
+        
+        with st.form("user_permissions_form"):
+            granted = st.multiselect(
+                text('extra_permissions'), options=list(permissions),
+                default=[code for code, allowed in overrides.items() if allowed and code in permissions]
+            )
+            revoked = st.multiselect(
+                text('revoked_permissions'), options=list(permissions),
+                default=[code for code, allowed in overrides.items() if not allowed and code in permissions]
+            )
+            if st.form_submit_button(text('save')):
+                if set(granted) & set(revoked):
+                    st.error(text('permission_conflict'))
+                else:
+                    permission_registry.set_user_overrides(
+                        user_id, {**{code: True for code in granted}, **{code: False for code in revoked}}
+                    )
+                    st.success(text('permissions_saved'))
\ No newline at end of file
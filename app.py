@@ -2,15 +2,19 @@ import streamlit as st
 from streamlit_option_menu import option_menu
 import pandas as pd
 import plotly.graph_objects as go
+import plotly.express as px
 from datetime import datetime
 import time
 import os
 
 # Import modules
-from config import APP_CONFIG, LANGUAGES, ROLES
+from config import APP_CONFIG, LANGUAGES
 from utils import lang_manager, init_session_state
 from auth import auth
-from database import db
+from database import db, tenant_pool
+from tenancy import DEFAULT_TENANT, list_tenants, set_tenant, validate_tenant
+from modules.sessions import get_query_param, TENANT_PARAM
+from modules.report_jobs import report_jobs
 
 # Import modules
 from modules.dashboard import DashboardModule
@@ -49,6 +53,14 @@ class SchoolManagementSystem:
         """Initialize application"""
         self.set_page_config()
         init_session_state()
+        # Every script run works on the school chosen at login, or the one
+        # in the URL when a saved session is restored
+        school = get_query_param(TENANT_PARAM)
+        if not st.session_state['authenticated'] and school in list_tenants():
+            st.session_state['tenant'] = school
+        set_tenant(st.session_state['tenant'])
+        # Background report workers and the scheduler serving every school
+        report_jobs.start()
         self.lang_manager = lang_manager
         self.text = self.lang_manager.get_text
         
@@ -104,6 +116,17 @@ class SchoolManagementSystem:
             with st.form("login_form"):
                 st.subheader(self.text('login'))
                 
+                # School selector, shown when one process serves several schools
+                tenants = list_tenants()
+                school = DEFAULT_TENANT
+                if len(tenants) > 1:
+                    current = st.session_state.get('tenant', DEFAULT_TENANT)
+                    school = st.selectbox(
+                        self.text('school'),
+                        options=tenants,
+                        index=tenants.index(current) if current in tenants else 0
+                    )
+                
                 username = st.text_input(self.text('username'))
                 password = st.text_input(self.text('password'), type="password")
                 
@@ -121,6 +144,10 @@ class SchoolManagementSystem:
                     language_code = LANGUAGES[language]
                     self.lang_manager.set_language(language_code)
                     
+                    # Users are looked up in the selected school's database
+                    st.session_state['tenant'] = school
+                    set_tenant(school)
+                    
                     # Attempt login
                     with st.spinner(self.text('logging_in')):
                         success, message = auth.login(username, password)
@@ -144,6 +171,7 @@ class SchoolManagementSystem:
                         <h3>{text('welcome')}</h3>
                         <h4>{st.session_state.get('full_name', '')}</h4>
                         <p><small>{st.session_state.get('role', '').replace('_', ' ').title()}</small></p>
+                        <p><small>{text('school')}: {st.session_state.get('tenant', DEFAULT_TENANT)}</small></p>
                     </div>
                 """, unsafe_allow_html=True)
                 
@@ -160,50 +188,50 @@ class SchoolManagementSystem:
             
             st.divider()
             
-            # Menu options based on role
+            # Menu options based on the user's permissions (one bit test each)
             menu_options = []
             
             # Dashboard - Available to all
             menu_options.append({"icon": "📊", "label": text("dashboard"), "key": "dashboard"})
             
-            # User Management - Admin and above
-            if auth.has_permission(ROLES['ADMIN']):
+            # User Management
+            if auth.has_permission('manage_users'):
                 menu_options.append({"icon": "👥", "label": text("user_management"), "key": "user_management"})
             
-            # Attendance - Teacher and above
-            if auth.has_permission(ROLES['TEACHER']):
+            # Attendance
+            if auth.has_permission('take_attendance'):
                 menu_options.append({"icon": "✅", "label": text("attendance"), "key": "attendance"})
             
-            # Classes - Teacher and above
-            if auth.has_permission(ROLES['TEACHER']):
+            # Classes
+            if auth.has_permission('manage_classes'):
                 menu_options.append({"icon": "🏫", "label": text("classes"), "key": "classes"})
             
-            # Admission - Admin and above
-            if auth.has_permission(ROLES['ADMIN']):
+            # Admission
+            if auth.has_permission('manage_admissions'):
                 menu_options.append({"icon": "📝", "label": text("admission"), "key": "admission"})
             
-            # Timetable - Teacher and above
-            if auth.has_permission(ROLES['TEACHER']):
+            # Timetable
+            if auth.has_permission('manage_timetable'):
                 menu_options.append({"icon": "📅", "label": text("timetable"), "key": "timetable"})
             
-            # Results - Teacher and above
-            if auth.has_permission(ROLES['TEACHER']):
+            # Results
+            if auth.has_permission('manage_results'):
                 menu_options.append({"icon": "📈", "label": text("results"), "key": "results"})
             
-            # Fees - Admin and above
-            if auth.has_permission(ROLES['ADMIN']):
+            # Fees
+            if auth.has_permission('manage_fees'):
                 menu_options.append({"icon": "💰", "label": text("fees"), "key": "fees"})
             
-            # System Configuration - Super Admin and above
-            if auth.has_permission(ROLES['SUPER_ADMIN']):
+            # System Configuration
+            if auth.has_permission('system_config'):
                 menu_options.append({"icon": "⚙️", "label": text("system_config"), "key": "system_config"})
             
-            # Reports - Teacher and above
-            if auth.has_permission(ROLES['TEACHER']):
+            # Reports
+            if auth.has_permission('view_reports'):
                 menu_options.append({"icon": "📋", "label": text("reports"), "key": "reports"})
             
-            # Developer Console - Developer only
-            if auth.has_permission(ROLES['DEVELOPER']):
+            # Developer Console
+            if auth.has_permission('developer_console'):
                 menu_options.append({"icon": "💻", "label": text("developer_console"), "key": "developer"})
             
             # Create menu
@@ -231,6 +259,7 @@ class SchoolManagementSystem:
             if st.session_state.get('authenticated'):
                 if st.button(text('logout'), use_container_width=True):
                     auth.logout()
+                    st.rerun()
     
     def developer_console(self):
         """Developer console page"""
@@ -238,11 +267,12 @@ class SchoolManagementSystem:
         
         st.title(text('developer_console'))
         
-        tab1, tab2, tab3, tab4 = st.tabs([
+        tab1, tab2, tab3, tab4, tab5 = st.tabs([
             text('database_status'),
             text('system_logs'),
             text('performance'),
-            text('backup')
+            text('backup'),
+            text('schools')
         ])
         
         with tab1:
@@ -256,6 +286,9 @@ class SchoolManagementSystem:
         
         with tab4:
             self.display_backup_restore()
+        
+        with tab5:
+            self.display_schools()
     
     def display_database_status(self):
         """Display database status information"""
@@ -276,25 +309,15 @@ class SchoolManagementSystem:
         # Table statistics
         st.subheader(text('table_statistics'))
         
-        query = """
-            SELECT 
-                name as table_name,
-                (SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%') as table_count
-            FROM sqlite_master 
-            WHERE type='table' AND name NOT LIKE 'sqlite_%'
-            ORDER BY name
-        """
-        
         try:
-            tables = db.execute_query(query, fetch_all=True)
+            tables = db.table_names()
             if tables:
                 # Get row counts for each table
                 table_data = []
                 for table in tables:
-                    count_query = f"SELECT COUNT(*) as row_count FROM {table['table_name']}"
-                    count_result = db.execute_query(count_query, fetch_one=True)
+                    count_result = db.fetch_one(f"SELECT COUNT(*) as row_count FROM {table}")
                     table_data.append({
-                        'table_name': table['table_name'],
+                        'table_name': table,
                         'row_count': count_result['row_count'] if count_result else 0
                     })
                 
@@ -306,28 +329,28 @@ class SchoolManagementSystem:
                 
                 col1, col2, col3 = st.columns(3)
                 
-                with col1:
-                    if st.button(text('optimize_database')):
-                        success, msg = db.vacuum_database()
-                        if success:
-                            st.success(msg)
-                        else:
-                            st.error(msg)
-                
-                with col2:
-                    if st.button(text('check_integrity')):
-                        integrity_query = "PRAGMA integrity_check"
-                        result = db.execute_query(integrity_query, fetch_one=True)
-                        if result and result['integrity_check'] == 'ok':
-                            st.success("✅ Database integrity check passed")
-                        else:
-                            st.error("❌ Database integrity check failed")
+                # VACUUM and the integrity check are SQLite maintenance;
+                # PostgreSQL runs autovacuum itself
+                if db.dialect.name == 'sqlite':
+                    with col1:
+                        if st.button(text('optimize_database')):
+                            success, msg = db.vacuum_database()
+                            if success:
+                                st.success(msg)
+                            else:
+                                st.error(msg)
+                    
+                    with col2:
+                        if st.button(text('check_integrity')):
+                            if not db.integrity_check():
+                                st.success("✅ Database integrity check passed")
+                            else:
+                                st.error("❌ Database integrity check failed")
                 
                 with col3:
                     if st.button(text('export_schema')):
-                        schema_query = "SELECT sql FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
-                        schemas = db.execute_query(schema_query, fetch_all=True)
-                        schema_text = "\n\n".join([s['sql'] for s in schemas])
+                        schemas = [db.table_ddl(table) for table in tables]
+                        schema_text = "\n\n".join(s for s in schemas if s)
                         st.download_button(
                             label="Download Schema",
                             data=schema_text,
@@ -402,30 +425,11 @@ class SchoolManagementSystem:
         
         # Get some database metrics
         try:
-            # Table sizes
-            size_query = """
-                SELECT name as table_name, 
-                       (pgsize/1024.0/1024.0) as size_mb
-                FROM dbstat 
-                WHERE name NOT LIKE 'sqlite_%'
-                ORDER BY pgsize DESC
-            """
-            
-            # Note: dbstat requires SQLite 3.15.0+
-            # Fallback to simpler query
-            table_query = """
-                SELECT name as table_name FROM sqlite_master 
-                WHERE type='table' AND name NOT LIKE 'sqlite_%'
-            """
-            
-            tables = db.execute_query(table_query, fetch_all=True)
-            
             metrics_data = []
-            for table in tables:
-                count_query = f"SELECT COUNT(*) as count FROM {table['table_name']}"
-                count_result = db.execute_query(count_query, fetch_one=True)
+            for table in db.table_names():
+                count_result = db.fetch_one(f"SELECT COUNT(*) as count FROM {table}")
                 metrics_data.append({
-                    'table_name': table['table_name'],
+                    'table_name': table,
                     'row_count': count_result['count'] if count_result else 0
                 })
             
@@ -467,6 +471,36 @@ class SchoolManagementSystem:
         except Exception as e:
             st.error(f"Error fetching performance metrics: {e}")
     
+    def display_schools(self):
+        """List the schools served by this process and add new ones"""
+        text = self.text
+        
+        tenants = list_tenants()
+        open_tenants = tenant_pool.open_tenants()
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric(text('schools'), len(tenants))
+        with col2:
+            st.metric(text('open_databases'), f"{len(open_tenants)} / {tenant_pool.max_open}")
+        
+        st.dataframe(pd.DataFrame({
+            text('school'): tenants,
+            text('open_databases'): [tenant in open_tenants for tenant in tenants]
+        }), use_container_width=True)
+        
+        with st.form("new_school_form"):
+            st.subheader(text('add_school'))
+            new_school = st.text_input(text('school_id'), help=text('school_id_help'))
+            
+            if st.form_submit_button(text('add_school'), type="primary"):
+                try:
+                    tenant_pool.create_tenant(validate_tenant(new_school.strip().lower()))
+                    st.success(text('school_added'))
+                    st.rerun()
+                except (ValueError, KeyError) as e:
+                    st.error(str(e))
+    
     def display_backup_restore(self):
         """Display backup and restore interface"""
         text = lang_manager.get_text
@@ -556,8 +590,8 @@ class SchoolManagementSystem:
         """Run the main application"""
         text = self.text
         
-        # Check authentication
-        if not st.session_state.get('authenticated'):
+        # Check authentication, restoring or extending the saved session
+        if not auth.resume_session():
             self.login_page()
             return
         
@@ -569,7 +603,7 @@ class SchoolManagementSystem:
         
         # Developer console special handling
         if current_page == 'developer':
-            if auth.has_permission(ROLES['DEVELOPER']):
+            if auth.has_permission('developer_console'):
                 self.developer_console()
             else:
                 st.warning(text('no_permission'))
@@ -0,0 +1,185 @@
+# auth.py
+from datetime import datetime
+import streamlit as st
+from database import db
+from utils import lang_manager
+from modules.credentials import password_hasher
+from modules.permissions import permission_registry
+from modules.user_directory import user_directory
+from modules.sessions import (
+    session_store, login_limiter, ip_limiter, client_ip, get_query_param, set_query_params, TOKEN_PARAM, TENANT_PARAM
+)
+from tenancy import current_tenant
+
+USER_COLUMNS = 'id as user_id, username, email, full_name, phone, role, is_active, last_login, created_at'
+SESSION_KEYS = ['authenticated', 'user', 'user_id', 'username', 'full_name', 'role', 'permissions', 'session_token']
+
+
+class Auth:
+    """Login, session user and user accounts.
+
+    Passwords are stored as salted KDF hashes (see modules.credentials);
+    accounts still holding a plaintext or sha256 password are rehashed the
+    next time they log in. Permissions are compiled into a bitset at login
+    and kept in the session (see modules.permissions). A login also opens a
+    persistent session whose token is kept in the URL, so reloading the page
+    or restarting the server does not log the user out (see modules.sessions).
+    """
+
+    def login(self, username, password):
+        """Check credentials and start the session; returns (success, message)"""
+        text = lang_manager.get_text
+        username = (username or '').strip()
+        ip_address = client_ip()
+        user_key = f"{current_tenant()}:{username.lower()}"
+        if ip_address and not ip_limiter.allow(ip_address):
+            return False, f"{text('too_many_attempts')} ({ip_limiter.retry_after(ip_address)} s)"
+        if not login_limiter.allow(user_key):
+            return False, f"{text('too_many_attempts')} ({login_limiter.retry_after(user_key)} s)"
+
+        user = db.fetch_one("SELECT * FROM users WHERE username = ?", (username,))
+
+        # Unknown users are checked against a dummy hash so both failures take as long
+        stored = user['password'] if user else password_hasher.dummy_hash()
+        if not password_hasher.check(password, stored) or not user:
+            return False, text('invalid_credentials')
+        if not user['is_active']:
+            return False, text('account_inactive')
+
+        if password_hasher.needs_rehash(stored):
+            db.execute_query(
+                "UPDATE users SET password = ? WHERE id = ?",
+                (password_hasher.hash_async(password).result(), user['id'])
+            )
+        db.execute_query("UPDATE users SET last_login = ? WHERE id = ?", (datetime.now(), user['id']))
+        login_limiter.reset(user_key)
+
+        token = session_store.create(user['id'], ip_address)
+        set_query_params(**{TOKEN_PARAM: token, TENANT_PARAM: current_tenant()})
+        self._start_session(user, token)
+        return True, text('login_successful')
+
+    def _start_session(self, user, token):
+        st.session_state['authenticated'] = True
+        st.session_state['user'] = {
+            'id': user['id'], 'username': user['username'], 'full_name': user['full_name'],
+            'email': user['email'], 'role': user['role']
+        }
+        st.session_state['user_id'] = user['id']
+        st.session_state['username'] = user['username']
+        st.session_state['full_name'] = user['full_name']
+        st.session_state['role'] = user['role']
+        st.session_state['permissions'] = permission_registry.compile(user['id'])
+        st.session_state['session_token'] = token
+
+    def resume_session(self):
+        """Check the session token at the start of a script run.
+
+        Restores the login from the URL token after a reload or restart,
+        extends the session's expiry, and logs out a session that has
+        expired or been revoked. Returns whether the user is logged in.
+        """
+        token = st.session_state.get('session_token') or get_query_param(TOKEN_PARAM)
+        user_id = session_store.validate(token, client_ip())
+        if user_id is None:
+            if self.is_authenticated() or token:
+                self.logout()
+            return False
+        if not self.is_authenticated():
+            user = db.fetch_one("SELECT * FROM users WHERE id = ? AND is_active = 1", (user_id,))
+            if not user:
+                self.logout()
+                return False
+            self._start_session(user, token)
+        return True
+
+    def logout(self):
+        token = st.session_state.get('session_token')
+        if token:
+            session_store.revoke(token)
+        set_query_params()
+        for key in SESSION_KEYS:
+            st.session_state.pop(key, None)
+        st.session_state['authenticated'] = False
+
+    def is_authenticated(self):
+        return bool(st.session_state.get('authenticated'))
+
+    def get_current_user(self):
+        return st.session_state.get('user')
+
+    def get_user_role(self):
+        return st.session_state.get('role')
+
+    def has_permission(self, permission):
+        """Whether the session user holds permission: a permission code, or
+        a role name meaning that role or a higher one"""
+        # Called many times per rerun: one session read, a version compare and a bit test
+        compiled = st.session_state.get('permissions')
+        if compiled is None:
+            return False
+        if compiled.version != permission_registry.version(compiled.user_id):
+            compiled = st.session_state['permissions'] = permission_registry.compile(compiled.user_id)
+            st.session_state['role'] = compiled.role
+            st.session_state['user']['role'] = compiled.role
+        return permission_registry.allows(compiled.mask, permission)
+
+    def get_all_users(self):
+        return [dict(row) for row in db.fetch_all(f"SELECT {USER_COLUMNS} FROM users ORDER BY username")]
+
+    def get_user(self, user_id):
+        row = db.fetch_one(f"SELECT {USER_COLUMNS} FROM users WHERE id = ?", (user_id,))
+        return dict(row) if row else None
+
+    def create_user(self, username, email, password, role, full_name, phone=None):
+        """Add an account; returns (success, message)"""
+        text = lang_manager.get_text
+        if db.fetch_one("SELECT id FROM users WHERE username = ?", (username,)):
+            return False, text('username_exists')
+
+        user_id = db.execute_query('''
+            INSERT INTO users (username, password, full_name, email, phone, role)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (username, password_hasher.hash_async(password).result(), full_name, email, phone, role))
+        if user_id is None:
+            return False, text('error')
+        user_directory.invalidate()
+        return True, text('user_created')
+
+    def update_user(self, user_id, username, email, role, full_name, phone=None, is_active=True):
+        """Update account details (not the password); returns (success, message)"""
+        text = lang_manager.get_text
+        if db.fetch_one("SELECT id FROM users WHERE username = ? AND id != ?", (username, user_id)):
+            return False, text('username_exists')
+
+        db.execute_query('''
+            UPDATE users SET username = ?, email = ?, role = ?, full_name = ?, phone = ?, is_active = ?
+            WHERE id = ?
+        ''', (username, email, role, full_name, phone, 1 if is_active else 0, user_id))
+        # The user's sessions pick up the new role on their next check
+        permission_registry.invalidate_user(user_id)
+        user_directory.invalidate()
+        if not is_active:
+            session_store.revoke_user(user_id)
+        return True, text('user_updated')
+
+    def set_password(self, user_id, password):
+        db.execute_query(
+            "UPDATE users SET password = ? WHERE id = ?",
+            (password_hasher.hash_async(password).result(), user_id)
+        )
+        # Other sessions of the user end; this one continues with a new token
+        session_store.revoke_user(user_id)
+        if user_id == st.session_state.get('user_id'):
+            token = session_store.create(user_id, client_ip())
+            st.session_state['session_token'] = token
+            set_query_params(**{TOKEN_PARAM: token, TENANT_PARAM: current_tenant()})
+        return True, lang_manager.get_text('password_changed')
+
+    def create_default_admin(self):
+        """Make sure the default accounts exist"""
+        db.create_default_users()
+
+
+# Global auth instance
+auth = Auth()
@@ -1,13 +1,24 @@
 # database.py
-import sqlite3
-from sqlite3 import Error
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, date
 import pandas as pd
 import streamlit as st
+from config import APP_CONFIG, ROLE_LEVELS, PERMISSIONS, DEFAULT_ROLE_PERMISSIONS
+from storage import create_backend, Error
+from modules.credentials import password_hasher
+from tenancy import DEFAULT_TENANT, current_tenant, multi_tenant, tenant_database_path, validate_tenant
 
 class Database:
-    def __init__(self, db_file='school_management.db'):
+    def __init__(self, db_file='school_management.db', url=None):
+        """url is a SQLAlchemy database URL; a SQLite file at db_file by default"""
         self.db_file = db_file
+        self.backend = create_backend(
+            url or f"sqlite:///{db_file}", pool_size=APP_CONFIG.get('database_pool_size', 5)
+        )
+        self.dialect = self.backend.dialect
         self.conn = None
         self.create_connection()
         self.create_tables()
@@ -15,13 +26,28 @@ class Database:
     def create_connection(self):
         """Create a database connection"""
         try:
-            self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
-            self.conn.row_factory = sqlite3.Row
+            self.conn = self.backend.connect()
             return self.conn
         except Error as e:
             st.error(f"Error connecting to database: {e}")
             return None
     
+    def connect(self):
+        """A separate connection, e.g. for a worker thread; close() releases it"""
+        return self.backend.connect()
+    
+    @contextmanager
+    def _connection(self):
+        """The shared connection, or one checked out of a pooled backend"""
+        if not self.backend.pooled:
+            yield self.conn
+            return
+        conn = self.backend.connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+    
     def create_tables(self):
         """Create all necessary tables"""
         try:
@@ -257,14 +283,438 @@ class Database:
                 )
             ''')
             
+            # Per-student rolling attendance state, maintained on every register save
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS attendance_student_state (
+                    student_id INTEGER PRIMARY KEY,
+                    class_id INTEGER,
+                    last_date DATE,
+                    absence_streak INTEGER DEFAULT 0,
+                    absence_mask INTEGER DEFAULT 0,
+                    late_mask INTEGER DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (student_id) REFERENCES students (id),
+                    FOREIGN KEY (class_id) REFERENCES classes (id)
+                )
+            ''')
+            
+            # Attendance alert queue
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS attendance_alerts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    student_id INTEGER NOT NULL,
+                    class_id INTEGER,
+                    alert_type TEXT NOT NULL,
+                    alert_value INTEGER,
+                    threshold INTEGER,
+                    alert_date DATE,
+                    status TEXT DEFAULT 'Open',
+                    acknowledged_by INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (student_id) REFERENCES students (id),
+                    FOREIGN KEY (class_id) REFERENCES classes (id),
+                    FOREIGN KEY (acknowledged_by) REFERENCES users (id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_attendance_alerts_status
+                ON attendance_alerts (status, alert_date)
+            ''')
+            
+            # Register coverage lookups by (date, class)
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_attendance_date_class
+                ON attendance (date, class_id)
+            ''')
+            
+            # Foreign keys used to join tables in custom reports
+            for index_name, table, columns in [
+                ('idx_students_class', 'students', 'class_id'),
+                ('idx_fees_student', 'fees', 'student_id'),
+                ('idx_results_student', 'results', 'student_id'),
+                ('idx_results_class_exam', 'results', 'class_id, exam_type')
+            ]:
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})")
+            
+            # User directory filters, each ending in username so a page is read in order
+            for index_name, columns in [
+                ('idx_users_role_active', 'role, is_active, username'),
+                ('idx_users_active', 'is_active, username'),
+                ('idx_users_email', 'email')
+            ]:
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON users ({columns})")
+            
+            # Academic terms
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS academic_terms (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    term_name TEXT NOT NULL,
+                    academic_year TEXT,
+                    start_date DATE NOT NULL,
+                    end_date DATE NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Holidays (class_id NULL means the whole school is closed)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS holidays (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    description TEXT NOT NULL,
+                    start_date DATE NOT NULL,
+                    end_date DATE NOT NULL,
+                    class_id INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (class_id) REFERENCES classes (id)
+                )
+            ''')
+            
+            # Per-class school week (classes without rows use the school default)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS class_schedules (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    class_id INTEGER NOT NULL,
+                    day_of_week TEXT NOT NULL,
+                    FOREIGN KEY (class_id) REFERENCES classes (id),
+                    UNIQUE(class_id, day_of_week)
+                )
+            ''')
+            
+            # Timetable generator inputs
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS rooms (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    room_name TEXT UNIQUE NOT NULL,
+                    capacity INTEGER,
+                    room_type TEXT DEFAULT 'Classroom',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS teacher_unavailability (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    teacher_id INTEGER NOT NULL,
+                    day_of_week TEXT NOT NULL,
+                    period INTEGER NOT NULL,
+                    FOREIGN KEY (teacher_id) REFERENCES teachers (id),
+                    UNIQUE(teacher_id, day_of_week, period)
+                )
+            ''')
+            
+            # GPA totals per student for each exam, term and overall
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS gpa_summary (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    student_id INTEGER NOT NULL,
+                    scope_type TEXT NOT NULL,
+                    scope_key TEXT NOT NULL,
+                    scope_label TEXT,
+                    total_points REAL DEFAULT 0,
+                    total_weight REAL DEFAULT 0,
+                    total_percentage REAL DEFAULT 0,
+                    result_count INTEGER DEFAULT 0,
+                    gpa REAL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (student_id) REFERENCES students (id),
+                    UNIQUE(student_id, scope_type, scope_key)
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_gpa_summary_scope
+                ON gpa_summary (scope_type, scope_key, gpa)
+            ''')
+            
+            # Pre-aggregated daily facts per class for the analytics dashboard
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS summary_cube (
+                    fact TEXT NOT NULL,
+                    day DATE NOT NULL,
+                    month TEXT NOT NULL,
+                    class_id INTEGER,
+                    dimension TEXT,
+                    row_count INTEGER DEFAULT 0,
+                    value1 REAL DEFAULT 0,
+                    value2 REAL DEFAULT 0
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_summary_cube_day
+                ON summary_cube (day, fact)
+            ''')
+            
+            # Monthly rollup of summary_cube, so long ranges read few rows
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS summary_cube_monthly (
+                    fact TEXT NOT NULL,
+                    month TEXT NOT NULL,
+                    class_id INTEGER,
+                    dimension TEXT,
+                    row_count INTEGER DEFAULT 0,
+                    value1 REAL DEFAULT 0,
+                    value2 REAL DEFAULT 0
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_summary_cube_monthly_month
+                ON summary_cube_monthly (month, fact)
+            ''')
+            
+            # Days whose source rows changed since the cube was last refreshed
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS cube_dirty (
+                    source TEXT NOT NULL,
+                    day DATE NOT NULL,
+                    PRIMARY KEY (source, day)
+                )
+            ''')
+            
+            for source, table, date_columns in (
+                ('attendance', 'attendance', ['date']),
+                ('fees', 'fees', ['due_date', 'payment_date']),
+                ('results', 'results', ['exam_date']),
+                ('students', 'students', ['admission_date'])
+            ):
+                for event, rows in (('INSERT', ['NEW']), ('UPDATE', ['OLD', 'NEW']), ('DELETE', ['OLD'])):
+                    marks = ' '.join(
+                        f"INSERT OR IGNORE INTO cube_dirty (source, day) "
+                        f"SELECT '{source}', {row}.{column} WHERE {row}.{column} IS NOT NULL;"
+                        for row in rows for column in date_columns
+                    )
+                    for statement in self.dialect.row_trigger(f"trg_cube_{table}_{event.lower()}", table, event, marks):
+                        cursor.execute(statement)
+            
+            # Next number per ID prefix and year, handed out in blocks
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS id_sequences (
+                    prefix TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    next_value INTEGER NOT NULL DEFAULT 1,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (prefix, year)
+                )
+            ''')
+            
+            # Blocking keys and scored pairs for duplicate detection
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS dedup_keys (
+                    record_type TEXT NOT NULL,
+                    record_id INTEGER NOT NULL,
+                    block_key TEXT NOT NULL,
+                    PRIMARY KEY (record_type, record_id, block_key)
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_dedup_keys_block
+                ON dedup_keys (block_key)
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS duplicate_candidates (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    record_type_a TEXT NOT NULL,
+                    record_id_a INTEGER NOT NULL,
+                    record_type_b TEXT NOT NULL,
+                    record_id_b INTEGER NOT NULL,
+                    score REAL NOT NULL,
+                    status TEXT DEFAULT 'open',
+                    reviewed_by INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(record_type_a, record_id_a, record_type_b, record_id_b),
+                    FOREIGN KEY (reviewed_by) REFERENCES users (id)
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_duplicate_candidates_status
+                ON duplicate_candidates (status, score)
+            ''')
+            
+            # Parquet archive progress and months changed since their export
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS archive_watermarks (
+                    table_name TEXT PRIMARY KEY,
+                    last_id INTEGER DEFAULT 0,
+                    last_created_at TIMESTAMP,
+                    updated_at TIMESTAMP
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS archive_dirty (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name TEXT NOT NULL,
+                    month TEXT NOT NULL
+                )
+            ''')
+            
+            # New rows are picked up by id; updates and deletes mark their months
+            for table, column in (('attendance', 'date'), ('results', 'exam_date'), ('fees', 'due_date')):
+                for event, rows in (('UPDATE', ['OLD', 'NEW']), ('DELETE', ['OLD'])):
+                    marks = ' '.join(
+                        f"INSERT INTO archive_dirty (table_name, month) "
+                        f"VALUES ('{table}', COALESCE(strftime('%Y-%m', {row}.{column}), 'unknown'));"
+                        for row in rows
+                    )
+                    for statement in self.dialect.row_trigger(f"trg_archive_{table}_{event.lower()}", table, event, marks):
+                        cursor.execute(statement)
+            
+            # Background report jobs and their output files
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS report_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    report_name TEXT NOT NULL,
+                    params TEXT,
+                    format TEXT DEFAULT 'csv',
+                    status TEXT DEFAULT 'queued',
+                    requested_by INTEGER,
+                    schedule_id INTEGER,
+                    file_path TEXT,
+                    row_count INTEGER,
+                    file_size INTEGER,
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    FOREIGN KEY (requested_by) REFERENCES users (id),
+                    FOREIGN KEY (schedule_id) REFERENCES report_schedules (id)
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_report_jobs_status
+                ON report_jobs (status, created_at)
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_report_jobs_report
+                ON report_jobs (report_name, created_at)
+            ''')
+            
+            # Recurring report jobs
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS report_schedules (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    report_name TEXT NOT NULL,
+                    params TEXT,
+                    format TEXT DEFAULT 'csv',
+                    frequency TEXT NOT NULL,
+                    run_time TEXT NOT NULL,
+                    run_day INTEGER DEFAULT 0,
+                    next_run_at TIMESTAMP NOT NULL,
+                    last_run_at TIMESTAMP,
+                    is_active BOOLEAN DEFAULT 1,
+                    created_by INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (created_by) REFERENCES users (id)
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_report_schedules_due
+                ON report_schedules (is_active, next_run_at)
+            ''')
+            
+            # Roles, permissions and per-user grants, compiled into a bitset per session
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS roles (
+                    name TEXT PRIMARY KEY,
+                    level INTEGER NOT NULL DEFAULT 0,
+                    description TEXT
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS permissions (
+                    code TEXT PRIMARY KEY,
+                    bit INTEGER UNIQUE NOT NULL,
+                    description TEXT
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS role_permissions (
+                    role TEXT NOT NULL,
+                    permission TEXT NOT NULL,
+                    PRIMARY KEY (role, permission),
+                    FOREIGN KEY (permission) REFERENCES permissions (code)
+                )
+            ''')
+            
+            # granted = 0 revokes a permission the user's role has
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_permissions (
+                    user_id INTEGER NOT NULL,
+                    permission TEXT NOT NULL,
+                    granted BOOLEAN NOT NULL DEFAULT 1,
+                    PRIMARY KEY (user_id, permission),
+                    FOREIGN KEY (user_id) REFERENCES users (id),
+                    FOREIGN KEY (permission) REFERENCES permissions (code)
+                )
+            ''')
+            
+            # Login sessions; only a hash of each token is stored
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    token_hash TEXT PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    created_at TIMESTAMP NOT NULL,
+                    expires_at TIMESTAMP NOT NULL,
+                    ip_address TEXT,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_sessions_expires
+                ON sessions (expires_at)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_sessions_user
+                ON sessions (user_id)
+            ''')
+            
+            self.add_column_if_missing(cursor, 'users', 'last_login', 'TIMESTAMP')
+            self.add_column_if_missing(cursor, 'subjects', 'weekly_periods', 'INTEGER DEFAULT 0')
+            self.add_column_if_missing(cursor, 'subjects', 'room', 'TEXT')
+            self.add_column_if_missing(cursor, 'classes', 'room', 'TEXT')
+            self.add_column_if_missing(cursor, 'subjects', 'credit_hours', 'REAL DEFAULT 1')
+            self.add_column_if_missing(cursor, 'students', 'admission_number', 'TEXT')
+            self.add_column_if_missing(cursor, 'admission_applications', 'student_id', 'INTEGER')
+            
+            # Application queue pages and admission number lookups
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_admission_applications_status
+                ON admission_applications (status, application_date)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_students_admission_number
+                ON students (admission_number)
+            ''')
+            # Admission records and reports filter on the admission date range
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_students_admission_date
+                ON students (admission_date, class_id)
+            ''')
+            
             self.conn.commit()
             
             # Insert default users if not exists
             self.create_default_users()
+            self.create_default_permissions()
             
         except Error as e:
             st.error(f"Error creating tables: {e}")
     
+    def add_column_if_missing(self, cursor, table, column, definition):
+        """Add a column to an existing table created by an older schema"""
+        if column not in [name for name, _ in self.dialect.table_columns(cursor, table)]:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
     def create_default_users(self):
         """Create default users for the system"""
         try:
@@ -276,7 +726,7 @@ class Database:
                 cursor.execute('''
                     INSERT INTO users (username, password, full_name, email, role)
                     VALUES (?, ?, ?, ?, ?)
-                ''', ('developer', 'dev123', 'System Developer', 'developer@school.com', 'developer'))
+                ''', ('developer', password_hasher.hash('dev123'), 'System Developer', 'developer@school.com', 'developer'))
             
             # Check if super admin exists
             cursor.execute("SELECT COUNT(*) FROM users WHERE username = 'superadmin'")
@@ -284,30 +734,165 @@ class Database:
                 cursor.execute('''
                     INSERT INTO users (username, password, full_name, email, role)
                     VALUES (?, ?, ?, ?, ?)
-                ''', ('superadmin', 'admin123', 'Super Administrator', 'superadmin@school.com', 'super_admin'))
+                ''', ('superadmin', password_hasher.hash('admin123'), 'Super Administrator', 'superadmin@school.com', 'super_admin'))
             
             self.conn.commit()
             
         except Error as e:
             st.error(f"Error creating default users: {e}")
     
-    def execute_query(self, query, params=()):
-        """Execute a query"""
+    def create_default_permissions(self):
+        """Add missing roles and permissions; a new role gets its default grants"""
         try:
             cursor = self.conn.cursor()
-            cursor.execute(query, params)
+            
+            # Bits are stable once assigned; new permissions take the next free bit
+            cursor.execute("SELECT code, bit FROM permissions")
+            bits = {row[0]: row[1] for row in cursor.fetchall()}
+            next_bit = max(bits.values(), default=-1) + 1
+            descriptions = {role: f"{role.replace('_', ' ').title()} role" for role in ROLE_LEVELS}
+            descriptions.update(PERMISSIONS)
+            for code, description in descriptions.items():
+                if code not in bits:
+                    cursor.execute(
+                        "INSERT INTO permissions (code, bit, description) VALUES (?, ?, ?)",
+                        (code, next_bit, description)
+                    )
+                    next_bit += 1
+            
+            cursor.execute("SELECT name FROM roles")
+            existing = {row[0] for row in cursor.fetchall()}
+            for role, level in ROLE_LEVELS.items():
+                if role in existing:
+                    continue
+                cursor.execute("INSERT INTO roles (name, level) VALUES (?, ?)", (role, level))
+                grants = [lower for lower, lower_level in ROLE_LEVELS.items() if lower_level <= level]
+                grants += DEFAULT_ROLE_PERMISSIONS.get(role, [])
+                cursor.executemany(
+                    "INSERT INTO role_permissions (role, permission) VALUES (?, ?)",
+                    [(role, permission) for permission in dict.fromkeys(grants)]
+                )
+            
             self.conn.commit()
-            return cursor.lastrowid
+            
+        except Error as e:
+            st.error(f"Error creating default permissions: {e}")
+    
+    def execute_query(self, query, params=()):
+        """Execute a query"""
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                conn.commit()
+                return cursor.lastrowid
         except Error as e:
             st.error(f"Error executing query: {e}")
             return None
     
+    def execute_many(self, query, params_seq):
+        """Execute a query once for every parameter tuple"""
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(query, params_seq)
+                conn.commit()
+                return cursor.rowcount
+        except Error as e:
+            st.error(f"Error executing query: {e}")
+            return None
+    
+    @contextmanager
+    def transaction(self):
+        """Yield a cursor whose statements commit together or not at all"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    def bulk_insert(self, table, columns, rows, cursor=None):
+        """Insert many rows at once (COPY on PostgreSQL), inside cursor's
+        transaction when given"""
+        if cursor is not None:
+            self.backend.bulk_insert(cursor, table, columns, rows)
+            return
+        with self.transaction() as cursor:
+            self.backend.bulk_insert(cursor, table, columns, rows)
+    
+    def stream_cursor(self, conn=None, chunk_size=5000):
+        """Cursor for large result sets, read in chunk_size batches"""
+        return self.backend.stream_cursor(conn or self.conn, chunk_size)
+    
+    def table_columns(self, table):
+        """(name, type) of each column of table"""
+        with self._connection() as conn:
+            return self.dialect.table_columns(conn.cursor(), table)
+    
+    def table_names(self):
+        """Names of the application's tables"""
+        with self._connection() as conn:
+            return self.dialect.table_names(conn.cursor())
+    
+    def table_ddl(self, table):
+        """CREATE TABLE statement of table, for schema exports"""
+        with self._connection() as conn:
+            return self.dialect.table_ddl(conn.cursor(), table)
+    
+    def check_connection(self):
+        """(connected, message) for the developer dashboard"""
+        try:
+            with self._connection() as conn:
+                conn.cursor().execute("SELECT 1")
+            return True, f"{self.dialect.name} database {self.backend.database}"
+        except Error as e:
+            return False, str(e)
+    
+    def get_database_size(self):
+        """Size of the database, formatted for display"""
+        try:
+            with self._connection() as conn:
+                size = self.dialect.database_size(conn.cursor())
+        except Error:
+            return "-"
+        for unit in ('B', 'KB', 'MB'):
+            if size < 1024:
+                return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+            size /= 1024
+        return f"{size:.1f} GB"
+    
+    def vacuum_database(self):
+        """Rebuild a SQLite file to reclaim free pages; (success, message)"""
+        if self.dialect.name != 'sqlite':
+            return False, "Optimisation is only available for SQLite"
+        try:
+            with self._connection() as conn:
+                conn.commit()
+                conn.cursor().execute("VACUUM")
+            return True, "Database optimised"
+        except Error as e:
+            return False, str(e)
+    
+    def integrity_check(self):
+        """Problems reported by SQLite's integrity check, empty when sound;
+        None on engines without one"""
+        if self.dialect.name != 'sqlite':
+            return None
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA integrity_check")
+            return [row[0] for row in cursor.fetchall() if row[0] != 'ok']
+    
     def fetch_all(self, query, params=()):
         """Fetch all rows from a query"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(query, params)
-            return cursor.fetchall()
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                return cursor.fetchall()
         except Error as e:
             st.error(f"Error fetching data: {e}")
             return []
@@ -315,9 +900,10 @@ class Database:
     def fetch_one(self, query, params=()):
         """Fetch one row from a query"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(query, params)
-            return cursor.fetchone()
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                return cursor.fetchone()
         except Error as e:
             st.error(f"Error fetching data: {e}")
             return None
@@ -325,7 +911,15 @@ class Database:
     def get_dataframe(self, query, params=()):
         """Get query results as pandas DataFrame"""
         try:
-            return pd.read_sql_query(query, self.conn, params=params)
+            with self._connection() as conn:
+                pandas_conn = self.backend.dataframe_connection(conn)
+                if pandas_conn is not None:
+                    return pd.read_sql_query(query, pandas_conn, params=params)
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                return pd.DataFrame.from_records(
+                    cursor.fetchall(), columns=[d[0] for d in cursor.description]
+                )
         except Error as e:
             st.error(f"Error getting dataframe: {e}")
             return pd.DataFrame()
@@ -334,6 +928,121 @@ class Database:
         """Close the database connection"""
         if self.conn:
             self.conn.close()
+        self.backend.dispose()
+
+class TenantPool:
+    """Open databases of the most recently used tenants.
+
+    Each school has its own SQLite file. At most max_open are kept open;
+    opening another closes the least recently used one as soon as no
+    call is still using it.
+    """
+
+    def __init__(self, max_open=16):
+        self.max_open = max(1, max_open)
+        self._open = OrderedDict()
+        self._leases = {}
+        self._retired = []
+        self._lock = threading.RLock()
+
+    def _create(self, tenant):
+        if not multi_tenant():
+            if tenant != DEFAULT_TENANT:
+                raise KeyError(f"Tenants need SQLite storage: {tenant}")
+            return Database(APP_CONFIG['database_path'], APP_CONFIG.get('database_url'))
+        path = tenant_database_path(tenant)
+        if tenant != DEFAULT_TENANT and not os.path.exists(path):
+            raise KeyError(f"Unknown tenant: {tenant}")
+        return Database(path)
+
+    def get(self, tenant):
+        with self._lock:
+            database = self._open.get(tenant)
+            if database is not None:
+                self._open.move_to_end(tenant)
+                return database
+            database = self._open[tenant] = self._create(tenant)
+            self._leases.setdefault(database, 0)
+            while len(self._open) > self.max_open:
+                _, evicted = self._open.popitem(last=False)
+                self._retired.append(evicted)
+            self._close_retired()
+            return database
+
+    def _close_retired(self):
+        for database in [d for d in self._retired if not self._leases.get(d)]:
+            self._retired.remove(database)
+            self._leases.pop(database, None)
+            database.close()
+
+    @contextmanager
+    def lease(self, tenant=None):
+        """The database of tenant (the current one by default), kept open
+        until the block ends"""
+        with self._lock:
+            database = self.get(tenant or current_tenant())
+            self._leases[database] = self._leases.get(database, 0) + 1
+        try:
+            yield database
+        finally:
+            with self._lock:
+                self._leases[database] -= 1
+                self._close_retired()
+
+    def create_tenant(self, tenant):
+        """Create the database of a new school"""
+        path = tenant_database_path(validate_tenant(tenant))
+        if not multi_tenant():
+            raise KeyError("Tenants need SQLite storage")
+        if tenant == DEFAULT_TENANT or os.path.exists(path):
+            raise ValueError(f"Tenant already exists: {tenant}")
+        os.makedirs(APP_CONFIG['tenants_dir'], exist_ok=True)
+        # Database() creates the file with its tables and default users
+        Database(path).close()
+        return self.get(tenant)
+
+    def open_tenants(self):
+        with self._lock:
+            return list(self._open)
+
+    def close(self):
+        with self._lock:
+            self._retired.extend(self._open.values())
+            self._open.clear()
+            self._close_retired()
+
+
+class TenantDatabase:
+    """The database of the current tenant, with the Database interface"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def for_tenant(self, tenant=None):
+        return self.pool.get(tenant or current_tenant())
+
+    @contextmanager
+    def transaction(self):
+        with self.pool.lease() as database:
+            with database.transaction() as cursor:
+                yield cursor
+
+    def lease(self):
+        """The current tenant's Database, kept open until the block ends, e.g.
+        while a stream_cursor is read; single calls on db lease it themselves"""
+        return self.pool.lease()
+
+    def __getattr__(self, name):
+        attr = getattr(self.for_tenant(), name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self.pool.lease() as database:
+                return getattr(database, name)(*args, **kwargs)
+        return call
+
 
-# Global database instance
-db = Database()
\ No newline at end of file
+# Global database instance, routed to the current tenant
+tenant_pool = TenantPool(APP_CONFIG.get('tenant_pool_size', 16))
+db = TenantDatabase(tenant_pool)
\ No newline at end of file
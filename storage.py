@@ -0,0 +1,387 @@
+# storage.py
+import csv
+import io
+import re
+import sqlite3
+import threading
+import uuid
+from collections.abc import Mapping
+from functools import lru_cache
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import make_url
+
+try:
+    import psycopg2
+    import psycopg2.extras
+    POSTGRES_AVAILABLE = True
+except ImportError:
+    POSTGRES_AVAILABLE = False
+
+# DB-API errors of every available driver, for except clauses
+Error = (sqlite3.Error, psycopg2.Error) if POSTGRES_AVAILABLE else (sqlite3.Error,)
+
+POOL_SIZE = 5
+MAX_OVERFLOW = 10
+STREAM_CHUNK_SIZE = 5000
+SQLITE_TIMEOUT = 30
+
+# String literals and ? placeholders, so placeholders inside quotes are left alone
+_PLACEHOLDER = re.compile(r"'(?:[^']|'')*'|\?")
+_INSERT_OR_IGNORE = re.compile(r"INSERT\s+OR\s+IGNORE\s+INTO\s+([^;]*?)(\s*;|\s*$)", re.IGNORECASE | re.DOTALL)
+_STRFTIME = re.compile(r"strftime\('([^']*)',\s*([\w.]+|\?)\)", re.IGNORECASE)
+_TABLE_DDL = re.compile(r"^\s*(CREATE\s+TABLE|ALTER\s+TABLE)", re.IGNORECASE)
+_INSERT_TABLE = re.compile(r"^\s*INSERT\s+INTO\s+(\w+)", re.IGNORECASE)
+
+# SQLite column definitions and their PostgreSQL equivalents. Booleans
+# stay integers because queries compare flags with 1 and 0.
+_POSTGRES_TYPES = [
+    (re.compile(r"\bINTEGER\s+PRIMARY\s+KEY\s+AUTOINCREMENT\b", re.IGNORECASE), "SERIAL PRIMARY KEY"),
+    (re.compile(r"\bBOOLEAN\b", re.IGNORECASE), "INTEGER"),
+    (re.compile(r"\bREAL\b", re.IGNORECASE), "DOUBLE PRECISION"),
+    (re.compile(r"\bBLOB\b", re.IGNORECASE), "BYTEA")
+]
+# SQLite does not enforce foreign keys here (the pragma is off), and tables
+# are created before some of the tables they reference, which PostgreSQL
+# rejects; the constraints are dropped there to keep the same behaviour
+# (the custom report builder keeps its own list of the relationships)
+_FOREIGN_KEY = re.compile(r",\s*FOREIGN\s+KEY\s*\([^)]*\)\s*REFERENCES\s+\w+\s*(\([^)]*\))?", re.IGNORECASE)
+_TO_CHAR_FORMATS = [('%Y', 'YYYY'), ('%m', 'MM'), ('%d', 'DD'), ('%H', 'HH24'), ('%M', 'MI'), ('%S', 'SS')]
+
+
+class SQLiteDialect:
+    """SQL fragments that differ between database engines.
+
+    Queries in this codebase are written for SQLite with ? placeholders;
+    compile() rewrites them for engines with another SQL flavour. The
+    helpers return fragments that still use ? for their parameter.
+    """
+    name = 'sqlite'
+
+    DATE_TRUNC_FORMATS = {
+        'day': "date({})",
+        'week': "date({}, '-6 days', 'weekday 1')",
+        'month': "strftime('%Y-%m-01', {})",
+        'year': "strftime('%Y-01-01', {})"
+    }
+
+    def compile(self, query):
+        return query
+
+    def ilike(self, expression):
+        """Case-insensitive pattern match against one parameter"""
+        # SQLite's LIKE is already case-insensitive for ASCII
+        return f"{expression} LIKE ?"
+
+    def date_trunc(self, unit, expression):
+        """The date at the start of the day/week/month/year holding expression"""
+        if unit not in self.DATE_TRUNC_FORMATS:
+            raise ValueError(f"Unsupported date unit: {unit}")
+        return self.DATE_TRUNC_FORMATS[unit].format(expression)
+
+    def date_diff(self, later, earlier):
+        """Whole days from the date earlier to the date later"""
+        return f"CAST(julianday({later}) - julianday({earlier}) AS INTEGER)"
+
+    def table_columns(self, cursor, table):
+        """(name, declared type) of each column, in table order"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        return [(row[1], row[2]) for row in cursor.fetchall()]
+
+    def table_names(self, cursor):
+        """Names of the application's tables"""
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
+        return [row[0] for row in cursor.fetchall()]
+
+    def table_ddl(self, cursor, table):
+        """CREATE TABLE statement of table"""
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def database_size(self, cursor):
+        """Size of the database in bytes"""
+        cursor.execute("PRAGMA page_count")
+        pages = cursor.fetchone()[0]
+        cursor.execute("PRAGMA page_size")
+        return pages * cursor.fetchone()[0]
+
+    def row_trigger(self, name, table, event, body):
+        """Statements creating an AFTER trigger running body for each row"""
+        return [f'''
+            CREATE TRIGGER IF NOT EXISTS {name}
+            AFTER {event} ON {table}
+            BEGIN {body} END
+        ''']
+
+
+@lru_cache(maxsize=1024)
+def _compile_postgres(query):
+    if _TABLE_DDL.match(query):
+        for pattern, replacement in _POSTGRES_TYPES:
+            query = pattern.sub(replacement, query)
+        query = _FOREIGN_KEY.sub('', query)
+
+    query = _INSERT_OR_IGNORE.sub(r"INSERT INTO \1 ON CONFLICT DO NOTHING\2", query)
+
+    def to_char(match):
+        fmt = match.group(1)
+        for strftime_code, pg_code in _TO_CHAR_FORMATS:
+            fmt = fmt.replace(strftime_code, pg_code)
+        return f"to_char({match.group(2)}, '{fmt}')"
+    query = _STRFTIME.sub(to_char, query)
+
+    # %s placeholders; literal percent signs must be doubled
+    return _PLACEHOLDER.sub(lambda m: '%s' if m.group() == '?' else m.group(), query.replace('%', '%%'))
+
+
+class PostgreSQLDialect(SQLiteDialect):
+    name = 'postgresql'
+
+    def compile(self, query):
+        return _compile_postgres(query)
+
+    def ilike(self, expression):
+        return f"{expression} ILIKE ?"
+
+    def date_trunc(self, unit, expression):
+        if unit not in self.DATE_TRUNC_FORMATS:
+            raise ValueError(f"Unsupported date unit: {unit}")
+        return f"CAST(DATE_TRUNC('{unit}', {expression}) AS DATE)"
+
+    def date_diff(self, later, earlier):
+        # Subtracting dates gives whole days
+        return f"(CAST({later} AS DATE) - CAST({earlier} AS DATE))"
+
+    def table_columns(self, cursor, table):
+        cursor.execute('''
+            SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = ?
+            ORDER BY ordinal_position
+        ''', (table,))
+        return [(row[0], row[1].upper()) for row in cursor.fetchall()]
+
+    def table_names(self, cursor):
+        cursor.execute('''
+            SELECT table_name FROM information_schema.tables
+            WHERE table_schema = current_schema() AND table_type = 'BASE TABLE'
+            ORDER BY table_name
+        ''')
+        return [row[0] for row in cursor.fetchall()]
+
+    def table_ddl(self, cursor, table):
+        # PostgreSQL keeps no statement text; the columns are listed instead
+        columns = self.table_columns(cursor, table)
+        if not columns:
+            return None
+        return f"CREATE TABLE {table} (\n" + ",\n".join(f"    {name} {type_}" for name, type_ in columns) + "\n)"
+
+    def database_size(self, cursor):
+        cursor.execute("SELECT pg_database_size(current_database())")
+        return cursor.fetchone()[0]
+
+    def row_trigger(self, name, table, event, body):
+        return [
+            f'''
+                CREATE OR REPLACE FUNCTION {name}() RETURNS trigger AS $$
+                BEGIN {body} RETURN NULL; END
+                $$ LANGUAGE plpgsql
+            ''',
+            f"DROP TRIGGER IF EXISTS {name} ON {table}",
+            f"CREATE TRIGGER {name} AFTER {event} ON {table} FOR EACH ROW EXECUTE FUNCTION {name}()"
+        ]
+
+
+DIALECTS = {
+    'sqlite': SQLiteDialect(),
+    'postgresql': PostgreSQLDialect()
+}
+
+
+class SQLiteBackend:
+    """SQLite file through a SQLAlchemy engine; the default backend.
+
+    SQLite allows one writer at a time, so the application shares one
+    connection and only background workers open their own.
+    """
+    dialect = DIALECTS['sqlite']
+    pooled = False
+
+    def __init__(self, url):
+        self.engine = create_engine(url, connect_args={
+            'check_same_thread': False, 'timeout': SQLITE_TIMEOUT
+        })
+        event.listen(self.engine, 'connect', self._on_connect)
+        self.database = self.engine.url.database
+
+    @staticmethod
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.row_factory = sqlite3.Row
+
+    def connect(self):
+        """A DB-API connection from the engine's pool; close() returns it"""
+        return self.engine.raw_connection()
+
+    def stream_cursor(self, conn, chunk_size=STREAM_CHUNK_SIZE):
+        """Cursor for large reads; SQLite cursors already step through results"""
+        cursor = conn.cursor()
+        cursor.arraysize = chunk_size
+        return cursor
+
+    def bulk_insert(self, cursor, table, columns, rows):
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            rows
+        )
+
+    def dataframe_connection(self, conn):
+        """Connection pandas reads from without warnings"""
+        return getattr(conn, 'driver_connection', conn)
+
+    def dispose(self):
+        self.engine.dispose()
+
+
+def _positional(params):
+    """Parameters as a tuple; the dialect only translates ? placeholders"""
+    if isinstance(params, Mapping):
+        raise TypeError("Named parameters are not supported, use ? placeholders")
+    return tuple(params or ())
+
+
+class PostgreSQLCursor:
+    """Cursor accepting the SQLite-flavoured SQL used in the codebase.
+
+    Statements are compiled by the PostgreSQL dialect, and INSERTs into
+    tables with an id column return it so lastrowid works as in sqlite3.
+    """
+
+    def __init__(self, backend, cursor):
+        self._backend = backend
+        self._cursor = cursor
+        self.lastrowid = None
+
+    def execute(self, query, params=()):
+        sql = self._backend.dialect.compile(query)
+        match = _INSERT_TABLE.match(sql)
+        returning = bool(match) and 'RETURNING' not in sql.upper() and self._backend.has_id(match.group(1))
+        if returning:
+            sql = sql.rstrip().rstrip(';') + " RETURNING id"
+        # Always pass a sequence so psycopg2 un-doubles literal percent signs
+        self._cursor.execute(sql, _positional(params))
+        if returning:
+            row = self._cursor.fetchone()
+            self.lastrowid = row[0] if row else None
+        return self
+
+    def executemany(self, query, params_seq):
+        self._cursor.executemany(self._backend.dialect.compile(query), [_positional(p) for p in params_seq])
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class PostgreSQLConnection:
+    """Pooled psycopg2 connection with the sqlite3 connection interface"""
+
+    def __init__(self, backend, pooled_connection):
+        self._backend = backend
+        self._connection = pooled_connection
+
+    def cursor(self, name=None):
+        if name:
+            # Named cursors are server-side: rows arrive in batches
+            return PostgreSQLCursor(self._backend, self._connection.driver_connection.cursor(
+                name=name, cursor_factory=psycopg2.extras.DictCursor
+            ))
+        return PostgreSQLCursor(self._backend, self._connection.cursor())
+
+    def execute(self, query, params=()):
+        return self.cursor().execute(query, params)
+
+    def executemany(self, query, params_seq):
+        return self.cursor().executemany(query, params_seq)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        # Returns the connection to the pool
+        self._connection.close()
+
+
+class PostgreSQLBackend:
+    """PostgreSQL through a pooled SQLAlchemy engine.
+
+    Every Database call checks a connection out of the pool, so requests
+    from different sessions run concurrently. Large reads use server-side
+    cursors and bulk inserts use COPY.
+    """
+    dialect = DIALECTS['postgresql']
+    pooled = True
+
+    def __init__(self, url, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW):
+        if not POSTGRES_AVAILABLE:
+            raise RuntimeError("psycopg2 is required for PostgreSQL storage")
+        self.engine = create_engine(
+            url,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_pre_ping=True,
+            connect_args={'cursor_factory': psycopg2.extras.DictCursor}
+        )
+        self.database = self.engine.url.database
+        self._lock = threading.Lock()
+        self._id_tables = {}
+
+    def connect(self):
+        return PostgreSQLConnection(self, self.engine.raw_connection())
+
+    def has_id(self, table):
+        """Whether table has an id column to return from INSERTs"""
+        with self._lock:
+            if table not in self._id_tables:
+                inspector = inspect(self.engine)
+                if not inspector.has_table(table):
+                    # Not committed yet; check again next time
+                    return False
+                self._id_tables[table] = any(c['name'] == 'id' for c in inspector.get_columns(table))
+            return self._id_tables[table]
+
+    def stream_cursor(self, conn, chunk_size=STREAM_CHUNK_SIZE):
+        cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+        cursor.itersize = chunk_size
+        return cursor
+
+    def bulk_insert(self, cursor, table, columns, rows):
+        # COPY takes the rows as one CSV stream instead of one INSERT each
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(['\\N' if value is None else value for value in row])
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+        )
+
+    def dataframe_connection(self, conn):
+        return None
+
+    def dispose(self):
+        self.engine.dispose()
+
+
+def create_backend(url, pool_size=POOL_SIZE):
+    """Backend for a SQLAlchemy database URL"""
+    backend = make_url(url).get_backend_name()
+    if backend == 'sqlite':
+        return SQLiteBackend(url)
+    if backend == 'postgresql':
+        return PostgreSQLBackend(url, pool_size=pool_size)
+    raise ValueError(f"Unsupported database backend: {backend}")
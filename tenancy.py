@@ -0,0 +1,112 @@
+# tenancy.py
+import contextvars
+import os
+import re
+import threading
+from contextlib import contextmanager
+from config import APP_CONFIG
+
+# The school served by a single-school install, stored at database_path
+DEFAULT_TENANT = 'default'
+TENANT_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]{0,62}$')
+
+_current_tenant = contextvars.ContextVar('tenant', default=DEFAULT_TENANT)
+
+
+def validate_tenant(tenant):
+    if not tenant or not TENANT_PATTERN.match(tenant):
+        raise ValueError(f"Invalid tenant name: {tenant!r}")
+    return tenant
+
+
+def current_tenant():
+    """Tenant whose database the current thread works on"""
+    return _current_tenant.get()
+
+
+def set_tenant(tenant):
+    """Route this thread to tenant, e.g. at the start of a script run"""
+    _current_tenant.set(validate_tenant(tenant or DEFAULT_TENANT))
+
+
+@contextmanager
+def use_tenant(tenant):
+    token = _current_tenant.set(validate_tenant(tenant))
+    try:
+        yield tenant
+    finally:
+        _current_tenant.reset(token)
+
+
+def bind_tenant(func, tenant=None):
+    """func running under tenant (the current one by default), for worker threads,
+    which do not inherit the tenant of the thread that started them"""
+    tenant = tenant or current_tenant()
+
+    def run(*args, **kwargs):
+        with use_tenant(tenant):
+            return func(*args, **kwargs)
+    return run
+
+
+def multi_tenant():
+    """Tenant files are only used with SQLite storage"""
+    return not APP_CONFIG.get('database_url')
+
+
+def list_tenants():
+    """The default tenant and those with a database file in the tenants directory"""
+    tenants_dir = APP_CONFIG['tenants_dir']
+    tenants = []
+    if multi_tenant() and os.path.isdir(tenants_dir):
+        tenants = sorted(
+            name[:-3] for name in os.listdir(tenants_dir)
+            if name.endswith('.db') and TENANT_PATTERN.match(name[:-3]) and name[:-3] != DEFAULT_TENANT
+        )
+    return [DEFAULT_TENANT] + tenants
+
+
+def tenant_database_path(tenant):
+    if validate_tenant(tenant) == DEFAULT_TENANT:
+        return APP_CONFIG['database_path']
+    return os.path.join(APP_CONFIG['tenants_dir'], f"{tenant}.db")
+
+
+def tenant_path(directory):
+    """Per-tenant location of a directory of generated files.
+
+    The default tenant keeps the original location; other tenants use
+    <tenants_dir>/<tenant>/<directory>, beside their database, so no
+    school's files end up inside another school's directories.
+    """
+    tenant = current_tenant()
+    if tenant == DEFAULT_TENANT:
+        return directory
+    return os.path.join(APP_CONFIG['tenants_dir'], tenant, directory)
+
+
+class TenantScoped:
+    """One instance of a service per tenant.
+
+    Attribute access goes to the instance of the current tenant, created
+    on first use, so caches and other state held by the service never
+    mix data of different schools.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def for_tenant(self, tenant=None):
+        tenant = tenant or current_tenant()
+        instance = self._instances.get(tenant)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(tenant)
+                if instance is None:
+                    instance = self._instances[tenant] = self._factory()
+        return instance
+
+    def __getattr__(self, name):
+        return getattr(self.for_tenant(), name)
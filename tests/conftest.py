@@ -0,0 +1,20 @@
+# tests/conftest.py
+import importlib.util
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The app imports the Modules directory as `modules`, which only resolves
+# by itself on case-insensitive file systems
+if importlib.util.find_spec('modules') is None:
+    package = types.ModuleType('modules')
+    package.__path__ = [os.path.join(ROOT, 'Modules')]
+    sys.modules['modules'] = package
+
+from config import APP_CONFIG
+
+# Default users are created with every new database; keep their hashing cheap
+APP_CONFIG['password_iterations'] = 10000
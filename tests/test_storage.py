@@ -0,0 +1,166 @@
+# tests/test_storage.py
+import os
+import pytest
+from storage import PostgreSQLCursor, PostgreSQLDialect, SQLiteDialect, POSTGRES_AVAILABLE
+
+postgres = PostgreSQLDialect()
+
+# Set to a scratch PostgreSQL database to run the round trip there as well
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+
+def test_placeholders_become_pyformat():
+    assert postgres.compile("SELECT * FROM users WHERE id = ? AND role = ?") == \
+        "SELECT * FROM users WHERE id = %s AND role = %s"
+
+
+def test_placeholders_in_string_literals_are_kept():
+    assert postgres.compile("SELECT '?', 'it''s ?' FROM t WHERE a = ?") == \
+        "SELECT '?', 'it''s ?' FROM t WHERE a = %s"
+
+
+def test_percent_signs_are_doubled():
+    assert postgres.compile("SELECT * FROM t WHERE name LIKE '%a%' AND id = ?") == \
+        "SELECT * FROM t WHERE name LIKE '%%a%%' AND id = %s"
+
+
+def test_insert_or_ignore():
+    assert postgres.compile("INSERT OR IGNORE INTO roles (name) VALUES (?)") == \
+        "INSERT INTO roles (name) VALUES (%s) ON CONFLICT DO NOTHING"
+
+
+def test_strftime_becomes_to_char():
+    assert postgres.compile("SELECT strftime('%Y-%m', f.due_date) FROM fees f") == \
+        "SELECT to_char(f.due_date, 'YYYY-MM') FROM fees f"
+
+
+def test_table_ddl_types():
+    sql = postgres.compile('''
+        CREATE TABLE IF NOT EXISTS t (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            score REAL,
+            active BOOLEAN,
+            parent_id INTEGER,
+            FOREIGN KEY (parent_id) REFERENCES t (id)
+        )
+    ''')
+    assert "SERIAL PRIMARY KEY" in sql
+    assert "DOUBLE PRECISION" in sql
+    assert "active INTEGER" in sql
+    assert "FOREIGN KEY" not in sql
+
+
+def test_sqlite_queries_are_unchanged():
+    query = "INSERT OR IGNORE INTO roles (name) VALUES (?)"
+    assert SQLiteDialect().compile(query) == query
+
+
+def test_date_diff():
+    assert postgres.date_diff('?', 'f.due_date') == "(CAST(? AS DATE) - CAST(f.due_date AS DATE))"
+    assert "julianday" in SQLiteDialect().date_diff('?', 'f.due_date')
+
+
+class _RecordingCursor:
+    """psycopg2 cursor double that records statements"""
+
+    def __init__(self, row=(42,)):
+        self.statements = []
+        self.row = row
+
+    def execute(self, sql, params):
+        self.statements.append((sql, params))
+
+    def fetchone(self):
+        return self.row
+
+
+class _Backend:
+    dialect = postgres
+
+    def __init__(self, tables_with_id):
+        self.tables_with_id = tables_with_id
+
+    def has_id(self, table):
+        return table in self.tables_with_id
+
+
+def test_lastrowid_from_returning():
+    inner = _RecordingCursor()
+    cursor = PostgreSQLCursor(_Backend({'users'}), inner)
+    cursor.execute("INSERT INTO users (username) VALUES (?)", ('a',))
+    assert inner.statements == [("INSERT INTO users (username) VALUES (%s) RETURNING id", ('a',))]
+    assert cursor.lastrowid == 42
+
+
+def test_no_returning_without_id_column():
+    inner = _RecordingCursor()
+    cursor = PostgreSQLCursor(_Backend(set()), inner)
+    cursor.execute("INSERT INTO role_permissions (role, permission) VALUES (?, ?)", ('admin', 'view_reports'))
+    assert "RETURNING" not in inner.statements[0][0]
+    assert cursor.lastrowid is None
+
+
+def test_named_parameters_rejected():
+    inner = _RecordingCursor()
+    cursor = PostgreSQLCursor(_Backend(set()), inner)
+    with pytest.raises(TypeError):
+        cursor.execute("SELECT * FROM results WHERE percentage >= :pass_mark", {'pass_mark': 40})
+    assert inner.statements == []
+
+
+DATABASE_URLS = [
+    pytest.param(None, id='sqlite'),
+    pytest.param(TEST_DATABASE_URL, id='postgresql', marks=pytest.mark.skipif(
+        not (TEST_DATABASE_URL and POSTGRES_AVAILABLE), reason="TEST_DATABASE_URL and psycopg2 needed"
+    ))
+]
+
+
+@pytest.mark.parametrize('url', DATABASE_URLS)
+def test_database_round_trip(tmp_path, url):
+    from database import Database
+    database = Database(str(tmp_path / 'school.db'), url)
+    try:
+        class_id = database.execute_query(
+            "INSERT INTO classes (class_name, capacity) VALUES (?, ?)", ("Round Trip 1", 30)
+        )
+        assert class_id
+        database.execute_query(
+            "INSERT OR IGNORE INTO roles (name, level) VALUES (?, ?)", ('teacher', 1)
+        )
+        row = database.fetch_one("SELECT class_name, capacity FROM classes WHERE id = ?", (class_id,))
+        assert (row['class_name'], row['capacity']) == ("Round Trip 1", 30)
+
+        with database.transaction() as cursor:
+            cursor.execute("UPDATE classes SET capacity = ? WHERE id = ?", (35, class_id))
+        df = database.get_dataframe(
+            "SELECT capacity, strftime('%Y', CURRENT_TIMESTAMP) as year FROM classes WHERE id = ?", (class_id,)
+        )
+        assert df['capacity'].tolist() == [35]
+        assert len(df['year'][0]) == 4
+
+        with pytest.raises(RuntimeError):
+            with database.transaction() as cursor:
+                cursor.execute("UPDATE classes SET capacity = ? WHERE id = ?", (99, class_id))
+                raise RuntimeError("rolled back")
+        assert database.fetch_one("SELECT capacity FROM classes WHERE id = ?", (class_id,))['capacity'] == 35
+    finally:
+        database.execute_query("DELETE FROM classes WHERE class_name = ?", ("Round Trip 1",))
+        database.close()
+
+
+@pytest.mark.parametrize('url', DATABASE_URLS)
+def test_database_introspection(tmp_path, url):
+    from database import Database
+    database = Database(str(tmp_path / 'school.db'), url)
+    try:
+        assert database.check_connection()[0]
+        tables = database.table_names()
+        assert 'students' in tables and not any(t.startswith('sqlite_') for t in tables)
+        assert 'class_name' in database.table_ddl('classes')
+        assert database.get_database_size() != '-'
+        if database.dialect.name == 'sqlite':
+            assert database.integrity_check() == []
+            assert database.vacuum_database()[0]
+    finally:
+        database.close()
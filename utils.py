@@ -4,6 +4,7 @@ from typing import Dict, Any
 import arabic_reshaper
 from bidi.algorithm import get_display
 from config import LANGUAGES
+from tenancy import DEFAULT_TENANT
 import os
 from datetime import datetime, date
 
@@ -62,6 +63,8 @@ def init_session_state():
         st.session_state['page'] = 'dashboard'
     if 'theme' not in st.session_state:
         st.session_state['theme'] = 'light'
+    if 'tenant' not in st.session_state:
+        st.session_state['tenant'] = DEFAULT_TENANT
 
 def format_date(date_obj, format_str="%Y-%m-%d"):
     """Format date object to string"""